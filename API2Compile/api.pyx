@@ -1,11 +1,19 @@
 from enum import Enum
 from PySide6 import QtWidgets, QtCore, QtGui
 from typing import *
-import os, sys, json, importlib, re, platform, asyncio, time, functools
+import os, sys, json, importlib, re, platform, asyncio, time, functools, mmap, codecs, bisect, threading, heapq, math, selectors
+from re import _parser as sre_parse
+from array import array
+from concurrent.futures import ThreadPoolExecutor, CancelledError
 import importlib.util
 import inspect
 
 cimport cython
+from cpython.buffer cimport PyObject_CheckBuffer
+
+MMAP_THRESHOLD = 4 * 1024 * 1024
+MIN_BLOCK = 64 * 1024
+MAX_BLOCK = 4 * 1024 * 1024
 
 cdef object findMatch(list lst, object obj):
     return [i for i in lst if i == obj][0]
@@ -69,28 +77,478 @@ class Color(str, Enum):
     SUCCESS = "#61a600"
     BLUE = "#4034eb"
 
+class GuiInvoker(QtCore.QObject):
+    """
+    Calls functions in the thread the invoker was created in (the GUI thread).
+    Calls from other threads go through a queued signal.
+    """
+    called = QtCore.Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.called.connect(self._call, QtCore.Qt.ConnectionType.QueuedConnection)
+
+    def _call(self, function):
+        try:
+            function()
+        except Exception as e:
+            print(f"[runOnGui error] {function} raised: {e}")
+
+    def call(self, function, *args, **kwargs):
+        if QtCore.QThread.currentThread() == self.thread():
+            function(*args, **kwargs)
+        else:
+            self.called.emit(functools.partial(function, *args, **kwargs))
+
+_invoker = None
+_taskPool = None
+TASK_WORKERS = min(4, os.cpu_count() or 1)
+
+cdef object invoker():
+    global _invoker
+    if _invoker is None:
+        _invoker = GuiInvoker()
+        app = QtCore.QCoreApplication.instance()
+        if app is not None:
+            _invoker.moveToThread(app.thread())
+    return _invoker
+
+cdef object taskPool():
+    global _taskPool
+    if _taskPool is None:
+        _taskPool = ThreadPoolExecutor(max_workers=TASK_WORKERS, thread_name_prefix="vt-task")
+    return _taskPool
+
+class AsyncLoop(QtCore.QObject):
+    """
+    asyncio event loop driven by the Qt event loop.
+    Every timer tick runs one iteration of the loop, so coroutines share the GUI thread with Qt events.
+    The next tick is due when the loop has ready callbacks or its nearest timer expires, at most maxInterval ms later
+    while tasks are unfinished; with nothing to do the timer stops. Sockets of the loop's selector (its self-pipe included,
+    so call_soon_threadsafe too) wake it through socket notifiers.
+    Tasks are tracked per window and are cancelled when the window closes.
+    """
+    maxInterval = 50
+    woken = QtCore.Signal()
+
+    def __init__(self):
+        super().__init__()
+        self.loop = asyncio.new_event_loop()
+        self.tasks = {}
+        self.notifiers = {}
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.woken.connect(self.wake, QtCore.Qt.ConnectionType.QueuedConnection)
+        self._watch()
+
+    def tick(self):
+        if self.loop.is_running() or self.loop.is_closed():
+            return
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+        self._watch()
+        self._schedule()
+
+    def _schedule(self):
+        if self.loop._ready:
+            # Колбэки завершившихся задач и call_soon выполняются на следующей итерации
+            delay = 0
+        elif self.loop._scheduled:
+            delay = min(self.maxInterval, math.ceil(max(0, self.loop._scheduled[0].when() - self.loop.time()) * 1000))
+        elif asyncio.all_tasks(self.loop):
+            # Задачу может разбудить future, завершенный не через цикл
+            delay = self.maxInterval
+        else:
+            self.timer.stop()
+            return
+        self.timer.start(delay)
+
+    def _watch(self):
+        """Keeps a socket notifier for every file descriptor registered in the loop's selector."""
+        selector = getattr(self.loop, "_selector", None)
+        if selector is None:
+            # ProactorEventLoop (Windows): ввод-вывод проверяется на тиках таймера
+            return
+        wanted = set()
+        for key in selector.get_map().values():
+            if key.events & selectors.EVENT_READ:
+                wanted.add((key.fd, QtCore.QSocketNotifier.Type.Read))
+            if key.events & selectors.EVENT_WRITE:
+                wanted.add((key.fd, QtCore.QSocketNotifier.Type.Write))
+        for watched in set(self.notifiers) - wanted:
+            notifier = self.notifiers.pop(watched)
+            notifier.setEnabled(False)
+            notifier.deleteLater()
+        for fd, kind in wanted - set(self.notifiers):
+            notifier = QtCore.QSocketNotifier(fd, kind, self)
+            notifier.activated.connect(self.wake)
+            self.notifiers[(fd, kind)] = notifier
+
+    def wake(self, *args):
+        if not self.loop.is_closed() and (not self.timer.isActive() or self.timer.remainingTime() > 0):
+            self.timer.start(0)
+
+    def spawn(self, coro, window=None):
+        task = self.loop.create_task(coro)
+        tasks = self.tasks.setdefault(window.id if window is not None else "", set())
+        tasks.add(task)
+        task.add_done_callback(functools.partial(self._done, tasks, window))
+        self.wake()
+        return task
+
+    def spawnThreadsafe(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self.woken.emit()
+        return future
+
+    def _done(self, tasks, window, task):
+        tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        if window is not None:
+            window.setLogMsg(window.translate("Found error in '{}' - '{}'").format(task.get_name(), task.exception()), Color.ERROR)
+        else:
+            print(f"[async error] {task.get_name()} raised: {task.exception()}")
+
+    def windowTasks(self, window=None):
+        # Завершенные задачи убираются из self.tasks только на следующей итерации цикла
+        if window is None:
+            return [task for tasks in self.tasks.values() for task in tasks if not task.done()]
+        return [task for task in self.tasks.get(window.id, ()) if not task.done()]
+
+    def cancel(self, window=None):
+        for task in self.windowTasks(window):
+            task.cancel()
+
+    def close(self):
+        self.cancel()
+        self.timer.stop()
+        for notifier in self.notifiers.values():
+            notifier.setEnabled(False)
+        self.notifiers.clear()
+        if not self.loop.is_closed():
+            self.loop.call_soon(self.loop.stop)
+            self.loop.run_forever()
+            self.loop.close()
+
+_asyncLoop = None
+
+cdef object asyncLoop():
+    global _asyncLoop
+    if _asyncLoop is None:
+        _asyncLoop = AsyncLoop()
+        app = QtCore.QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(_asyncLoop.close)
+    return _asyncLoop
+
+class Task(QtCore.QObject):
+    """
+    Work running on the shared background pool.
+    Cancellation is cooperative: the work checks isCancelled(). Signals are always emitted in the GUI thread.
+    """
+    progressChanged = QtCore.Signal(int, str)
+    finished = QtCore.Signal(object)
+    failed = QtCore.Signal(object)
+
+    def __init__(self, name=""):
+        super().__init__()
+        self.name = name
+        self.future = None
+        self.progress = 0
+        self.text = ""
+        self.value = None
+        self.error = None
+        self._cancelled = threading.Event()
+
+    def start(self, function, *args, **kwargs):
+        self.future = taskPool().submit(self._run, function, args, kwargs)
+        self.future.add_done_callback(self._done)
+        return self
+
+    def spawn(self, coro, window=None):
+        self.future = asyncLoop().spawn(coro, window)
+        self.future.add_done_callback(self._done)
+        return self
+
+    def _run(self, function, args, kwargs):
+        if self._cancelled.is_set():
+            raise CancelledError()
+        value = function(*args, **kwargs)
+        if asyncio.iscoroutine(value):
+            value = asyncio.run(value)
+        return value
+
+    def _done(self, future):
+        if future.cancelled():
+            self.error = CancelledError()
+        else:
+            self.error = future.exception()
+            if self.error is None:
+                self.value = future.result()
+        if self.error is None:
+            invoker().call(self.finished.emit, self.value)
+        else:
+            invoker().call(self.failed.emit, self.error)
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def isCancelled(self):
+        return self._cancelled.is_set()
+
+    def isDone(self):
+        return self.future is not None and self.future.done()
+
+    def result(self, timeout=None):
+        if isinstance(self.future, asyncio.Future):
+            return self.future.result()
+        return self.future.result(timeout)
+
+    def setProgress(self, value, text=""):
+        self.progress, self.text = value, text
+        invoker().call(self.progressChanged.emit, int(value), text)
+
+cdef class RegionArray:
+    """
+    Fixed-size array of regions stored as flat (begin, end) int64 pairs.
+    Any writable int64 buffer (array('q'), numpy, flat or (N, 2) C-contiguous) is wrapped
+    without copying; read-only buffers and raw bytes are copied. Slices share memory
+    with the parent, and shifts run as one C loop.
+    """
+    cdef long long[:] data
+
+    def __cinit__(self, regions=None):
+        cdef const long long[:] checked
+        if regions is None:
+             regions = ()
+        if isinstance(regions, RegionArray):
+             self.data = (<RegionArray>regions).data
+        elif PyObject_CheckBuffer(regions):
+             view = memoryview(regions)
+             if view.format == "B":
+                 view = view.cast("q")
+             elif view.ndim == 2 and view.shape[1] == 2 and view.c_contiguous:
+                 # Массив (N, 2): те же пары подряд в памяти
+                 view = view.cast("B").cast(view.format)
+             if view.readonly:
+                 # shift и adjust пишут в буфер: берем копию
+                 checked = view
+                 self.data = array("q", view.tobytes())
+             else:
+                 self.data = view
+        else:
+             flat = array("q")
+             for region in regions:
+                 flat.extend(Selection._bounds(region))
+             self.data = flat
+        if self.data.shape[0] % 2:
+             raise ValueError("RegionArray buffer must hold (begin, end) pairs")
+
+    def __len__(self):
+        return self.data.shape[0] // 2
+
+    def __getitem__(self, index):
+        cdef Py_ssize_t n = self.data.shape[0] // 2
+        if isinstance(index, slice):
+             start, stop, step = index.indices(n)
+             if step == 1:
+                 result = RegionArray.__new__(RegionArray)
+                 (<RegionArray>result).data = self.data[2 * start:2 * max(start, stop)]
+                 return result
+             return RegionArray([self[i] for i in range(start, stop, step)])
+        i = index + n if index < 0 else index
+        if not 0 <= i < n:
+             raise IndexError("RegionArray index out of range")
+        return Region(self.data[2 * i], self.data[2 * i + 1])
+
+    def __iter__(self):
+        cdef Py_ssize_t i
+        for i in range(0, self.data.shape[0], 2):
+             yield Region(self.data[i], self.data[i + 1])
+
+    cpdef list pairs(self):
+        cdef Py_ssize_t i
+        return [(min(self.data[i], self.data[i + 1]), max(self.data[i], self.data[i + 1])) for i in range(0, self.data.shape[0], 2)]
+
+    cpdef object buffer(self):
+        """Flat int64 memoryview of (begin, end) pairs without copying; numpy.asarray(...).reshape(-1, 2) works on it."""
+        view = <object>self.data
+        return memoryview(view)
+
+    cpdef Py_ssize_t bisect(self, long long point):
+        """Number of regions beginning before point; the regions must be sorted."""
+        cdef long long[:] data = self.data
+        cdef Py_ssize_t lo = 0, hi = data.shape[0] // 2, mid
+        while lo < hi:
+             mid = (lo + hi) // 2
+             if data[2 * mid] < point:
+                 lo = mid + 1
+             else:
+                 hi = mid
+        return lo
+
+    cpdef object copy(self):
+        return RegionArray(array("q", self.buffer().tobytes()))
+
+    cpdef void shift(self, long long delta, long long start=0):
+        """Adds delta to every position at or after start."""
+        cdef long long[:] data = self.data
+        cdef Py_ssize_t i
+        with nogil:
+             for i in range(data.shape[0]):
+                 if data[i] >= start:
+                     data[i] += delta
+
+    cpdef void adjust(self, long long begin, long long end, long long length):
+        """Moves positions after the edit replacing [begin, end) with length characters; positions inside it collapse to begin."""
+        cdef long long[:] data = self.data
+        cdef long long delta = length - (end - begin)
+        cdef Py_ssize_t i
+        with nogil:
+             for i in range(data.shape[0]):
+                 if data[i] >= end and data[i] > begin:
+                     data[i] += delta
+                 elif data[i] > begin:
+                     data[i] = begin
+
 cdef class Selection:
-    cdef list regions
+    """
+    Sorted set of regions stored as two int64 arrays of begins and ends.
+    Overlapping or touching regions are merged, so lookups are binary searches
+    and set operations are single merge passes.
+    """
+    cdef object starts
+    cdef object ends
+
     def __cinit__(self, regions=None):
-        self.regions = regions or []
+        self.starts = array("q")
+        self.ends = array("q")
+        if regions:
+             self.addAll(regions)
+
+    @staticmethod
+    def _bounds(region):
+        if isinstance(region, tuple):
+             return min(region), max(region)
+        return region.begin(), region.end()
+
+    cdef void _assign(self, pairs):
+        """Merges sorted (begin, end) pairs into the arrays."""
+        starts, ends = array("q"), array("q")
+        for b, e in pairs:
+             if ends and b <= ends[-1]:
+                 if e > ends[-1]:
+                     ends[-1] = e
+             else:
+                 starts.append(b)
+                 ends.append(e)
+        self.starts, self.ends = starts, ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for b, e in zip(self.starts, self.ends):
+             yield Region(b, e)
+
+    def __getitem__(self, int i):
+        return Region(self.starts[i], self.ends[i])
+
+    cpdef list regions(self):
+        return list(self)
+
+    cpdef list pairs(self):
+        return list(zip(self.starts, self.ends))
 
     cpdef void clear(self):
-        self.regions = []
-    
+        self.starts, self.ends = array("q"), array("q")
+
     cpdef void add(self, object region):
-        self.regions.append(region)
-    
-    cpdef void subtract(self, object region):
-        self.regions = [r for r in self.regions if r != region]
-    
-    cpdef cython.bint contains(self, object point):
-        for region in self.regions:
-            if region.contains(point):
-                return True
-        return False
+        b, e = Selection._bounds(region)
+        i = bisect.bisect_left(self.ends, b)
+        j = bisect.bisect_right(self.starts, e)
+        if i < j:
+             b, e = min(b, self.starts[i]), max(e, self.ends[j - 1])
+        self.starts[i:j] = array("q", [b])
+        self.ends[i:j] = array("q", [e])
+
+    cpdef void addAll(self, object regions):
+        """Adds many regions with one sort and one merge pass."""
+        if isinstance(regions, (Selection, RegionArray)):
+             new = regions.pairs()
+        else:
+             new = [Selection._bounds(r) for r in regions]
+        new.sort()
+        self._assign(heapq.merge(zip(self.starts, self.ends), new))
 
-    cpdef str text(self, object view, object region):
-        return view.__tab.toPlainText()[region.begin():region.end()]
+    cpdef void subtract(self, object region):
+        b, e = Selection._bounds(region)
+        i = bisect.bisect_left(self.ends, b)
+        j = bisect.bisect_right(self.starts, e)
+        if b == e:
+             # Пустой регион (курсор) убирает только такой же курсор
+             if i < j and self.starts[i] == self.ends[i] == b:
+                 del self.starts[i]
+                 del self.ends[i]
+             return
+        starts, ends = array("q"), array("q")
+        for k in range(i, j):
+             s, t = self.starts[k], self.ends[k]
+             if s < b:
+                 starts.append(s)
+                 ends.append(min(t, b))
+             if t > e:
+                 starts.append(max(s, e))
+                 ends.append(t)
+        self.starts[i:j] = starts
+        self.ends[i:j] = ends
+
+    cpdef cython.bint contains(self, long long point):
+        i = bisect.bisect_right(self.starts, point) - 1
+        return i >= 0 and point <= self.ends[i]
+
+    cpdef object union(self, Selection other):
+        result = Selection()
+        result._assign(heapq.merge(zip(self.starts, self.ends), zip(other.starts, other.ends)))
+        return result
+
+    cpdef object intersection(self, Selection other):
+        result = Selection()
+        pairs = []
+        i = j = 0
+        while i < len(self.starts) and j < len(other.starts):
+             s1, e1, s2, e2 = self.starts[i], self.ends[i], other.starts[j], other.ends[j]
+             lo, hi = max(s1, s2), min(e1, e2)
+             if lo < hi or lo == hi and (s1 == e1 or s2 == e2):
+                 pairs.append((lo, hi))
+             if e1 < e2:
+                 i += 1
+             else:
+                 j += 1
+        result._assign(pairs)
+        return result
+
+    cpdef object regionArray(self):
+        """Regions as a RegionArray of interleaved (begin, end) pairs."""
+        flat = array("q", bytes(16 * len(self.starts)))
+        flat[0::2] = self.starts
+        flat[1::2] = self.ends
+        return RegionArray(flat)
+
+    cpdef list texts(self, object view):
+        """Text of every region, reading the document once."""
+        text = view.getText()
+        return [text[b:e] for b, e in zip(self.starts, self.ends)]
+
+    cpdef str text(self, object view, object region=None):
+        if region is None:
+             return "\n".join(self.texts(view))
+        return view.substr(region)
 
 cdef class Region:
     cdef int a
@@ -139,7 +597,7 @@ cdef class Settings:
     
     @classmethod
     def fromFile(cls, f: "VtAPI.File"):
-        content = "".join(f.read())
+        content = f.readAll()
         settings = json.loads(content)
         return cls(settings)
 
@@ -266,6 +724,76 @@ cdef class File:
                     lines.append(chunk_data)
         return lines
 
+    cpdef object readAll(self, progress=None):
+        """Reads the whole file into one buffer without building a chunk list.
+        Files bigger than MMAP_THRESHOLD are decoded straight from a memory map.
+        progress(done, total) is called with byte counts."""
+        if not self.exists():
+            return b"" if self.encoding == "binary" else ""
+        cdef Py_ssize_t total = os.path.getsize(self.path)
+        if progress: progress(0, total)
+        with open(self.path, "rb") as file:
+            if total >= MMAP_THRESHOLD:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = mm[:] if self.encoding == "binary" else str(mm, self.encoding, "ignore")
+            else:
+                data = file.read()
+                if self.encoding != "binary":
+                    data = data.decode(self.encoding, "ignore")
+        if progress: progress(total, total)
+        return data
+
+    def blocks(self, progress=None):
+        """Lazily yields decoded blocks of the file. Blocks start at MIN_BLOCK bytes
+        and double up to MAX_BLOCK, so small files cost one read and large ones few.
+        Multibyte characters split between blocks are kept whole.
+        Plain buffered reads, not mmap: the caller may run the event loop between
+        blocks, and a file truncated meanwhile must end the read, not raise SIGBUS."""
+        if not self.exists():
+            return
+        total = os.path.getsize(self.path)
+        decoder = None if self.encoding == "binary" else codecs.getincrementaldecoder(self.encoding)("ignore")
+        block = MIN_BLOCK
+        done = 0
+        with open(self.path, "rb") as file:
+            while True:
+                data = file.read(block)
+                if not data:
+                    break
+                done += len(data)
+                total = max(total, done)
+                if progress: progress(done, total)
+                if decoder is None:
+                    yield data
+                else:
+                    text = decoder.decode(data)
+                    if text:
+                        yield text
+                block = min(block * 2, MAX_BLOCK)
+        if decoder is not None:
+            text = decoder.decode(b"", True)
+            if text:
+                yield text
+
+    def lines(self, progress=None, keepends=False):
+        """Lazily yields the lines of the file, reading it block by block."""
+        binary = self.encoding == "binary"
+        sep, cr = (b"\n", b"\r") if binary else ("\n", "\r")
+        tail = sep[:0]
+        for block in self.blocks(progress):
+            parts = (tail + block).split(sep)
+            tail = parts.pop()
+            for line in parts:
+                if keepends:
+                    yield line + sep
+                else:
+                    yield line[:-1] if line.endswith(cr) else line
+        if tail:
+            yield tail
+
+    cpdef Py_ssize_t size(self):
+        return os.path.getsize(self.path) if self.exists() else 0
+
     cpdef void write(self, content, chunk=1024):
         cdef int total_length = len(content)
         with open(self.path, 'w', encoding=self.encoding) as file:
@@ -273,6 +801,13 @@ cdef class File:
                 chunkk = content[i:i + chunk]
                 file.write(str(chunkk))
 
+    async def readAsync(self, progress=None):
+        """readAll() in the background pool, awaitable from the Qt asyncio loop."""
+        return await asyncio.get_running_loop().run_in_executor(taskPool(), self.readAll, progress)
+
+    async def writeAsync(self, content, chunk=1024):
+        await asyncio.get_running_loop().run_in_executor(taskPool(), self.write, content, chunk)
+
     cpdef bint exists(self):
         return os.path.isfile(self.path)
 
@@ -314,13 +849,26 @@ class Plugin:
         window._Window__mw.pl.plugins.pop(self.name)
 
     class ApplicationCommand(QtCore.QObject):
+        background = False # True - run() выполняется в фоновом пуле потоков
+
         def __init__(self, api):
              super().__init__()
              self.api = api
+             self.task = None
 
         def run(self):
              raise NotImplementedError("You must rewrite 'run' function of your command")
 
+        def isCancelled(self):
+             return self.task is not None and self.task.isCancelled()
+
+        def setProgress(self, value, text=""):
+             if self.task is not None:
+                 self.task.setProgress(value, text)
+
+        def runOnGui(self, function, *args, **kwargs):
+             invoker().call(function, *args, **kwargs)
+
         def description(self):
              pass
 
@@ -344,8 +892,8 @@ class Plugin:
              self.view = view
 
 cdef class Point:
-    cdef int x
-    cdef int y
+    cdef public int x
+    cdef public int y
     def __cinit__(self, x=0, y=0):
         """Инициализация точки с координатами x и y."""
         self.x = x
@@ -405,6 +953,34 @@ class Widgets:
     class Process(QtCore.QProcess):
         def __init__(self):
              super().__init__()
+
+        async def runAsync(self, program, arguments=None, input=None):
+             """Starts the process and waits for it without blocking the GUI.
+             Returns (exitCode, stdout, stderr). Cancelling the awaiting task kills the process."""
+             done = asyncio.get_running_loop().create_future()
+             def finished(code, status):
+                 if not done.done(): done.set_result(code)
+                 asyncLoop().wake()
+             def failed(error):
+                 if error == QtCore.QProcess.ProcessError.FailedToStart and not done.done():
+                     done.set_exception(OSError(self.errorString()))
+                 asyncLoop().wake()
+             self.finished.connect(finished)
+             self.errorOccurred.connect(failed)
+             try:
+                 self.start(program, list(arguments or []))
+                 if input is not None:
+                     self.write(input.encode() if isinstance(input, str) else input)
+                     self.closeWriteChannel()
+                 code = await done
+             except asyncio.CancelledError:
+                 self.kill()
+                 self.waitForFinished(1000)
+                 raise
+             finally:
+                 self.finished.disconnect(finished)
+                 self.errorOccurred.disconnect(failed)
+             return code, bytes(self.readAllStandardOutput()), bytes(self.readAllStandardError())
     
     class ToolBar(QtWidgets.QToolBar):
         def __init__(self, *args, **kwargs):
@@ -417,38 +993,84 @@ class Widgets:
     class Signal(QtCore.QObject):
         """
         Custom signal with priority support.
+        Slots are kept sorted by priority on connect/disconnect, and the number of
+        arguments each slot accepts is resolved once, so emit is a plain loop of calls.
         """
         def __init__(self, *args, **kwargs):
              super().__init__()
              self._signal = QtCore.Signal(*args)
-             self._queue = []
+             self._slots = ()
+             self._order = 0
              self._timer = QtCore.QTimer(self)
+             self._timer.setSingleShot(True)
+             self._timer.setInterval(kwargs.get("interval", 0))
+             self._timer.timeout.connect(self._emitPending)
              self._args = []
              self._kwargs = {}
 
+        @staticmethod
+        def _arity(slot):
+             """Returns (min, max) positional arguments the slot accepts; max is None for *args."""
+             try:
+                 params = inspect.signature(slot).parameters.values()
+             except (TypeError, ValueError):
+                 return 0, None
+             positional = [p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+             required = sum(1 for p in positional if p.default is p.empty)
+             if any(p.kind == p.VAR_POSITIONAL for p in params):
+                 return required, None
+             return required, len(positional)
+
         def connect(self, slot, priority=1):
              """
              Connects a slot to the signal with a specified priority.
              """
-             self._queue.append((priority, slot))
+             low, high = self._arity(slot)
+             self._order += 1
+             slots = list(self._slots)
+             # Больший приоритет раньше, при равном - порядок подключения
+             bisect.insort(slots, (-priority, self._order, slot, low, high), key=lambda s: (s[0], s[1]))
+             self._slots = tuple(slots)
 
         def emit(self, *args, **kwargs):
             """Emits the signal, calling all connected slots in order of priority. """
-            for priority, slot in sorted(self._queue, key=lambda x: x[0], reverse=True):
+            self.dispatch(self._slots, *args, **kwargs)
+
+        def dispatch(self, slots, *args, **kwargs):
+            """Calls the given slot entries (taken from _slots) with the signal arguments."""
+            count = len(args)
+            for _, _, slot, low, high in slots:
                 try:
-                    sig = inspect.signature(slot)
-                    try:
-                        sig.bind(*args, **kwargs)
+                    if kwargs or (low <= count and (high is None or count <= high)):
                         slot(*args, **kwargs)
-                    except TypeError:
+                    else:
                         slot()
                 except Exception as e:
                     print(f"[Signal emit error] {slot} raised: {e}")
 
+        def emitQueued(self, *args, **kwargs):
+            """Emits the signal on the next pass of the event loop."""
+            QtCore.QTimer.singleShot(0, functools.partial(self.emit, *args, **kwargs))
+
+        def emitCoalesced(self, *args, **kwargs):
+            """Emits the signal once per timer interval with the arguments of the latest call."""
+            self._args, self._kwargs = list(args), kwargs
+            if not self._timer.isActive():
+                self._timer.start()
+
+        def setInterval(self, msec):
+            self._timer.setInterval(msec)
+
+        def _emitPending(self):
+            args, kwargs = self._args, self._kwargs
+            self._args, self._kwargs = [], {}
+            self.emit(*args, **kwargs)
+
+        def slotCount(self):
+            return len(self._slots)
+
         def disconnect(self, slot):
-             for sl in self._queue:
-                 if sl[1] == slot:
-                     self._queue.remove(sl)
+             self._slots = tuple(s for s in self._slots if s[2] != slot)
 
 class Signals(QtCore.QObject):
     def __init__(self, w):
@@ -481,6 +1103,7 @@ class Signals(QtCore.QObject):
 
         self.addSignal("fileTagAdded", VtAPI.Widgets.Signal(object, str))
         self.addSignal("fileTagRemoved", VtAPI.Widgets.Signal(object, str))
+        self.addSignal("tagFilesFound", VtAPI.Widgets.Signal(str, list))
 
     def __getattr__(self, name):
         if name in self._signals:
@@ -520,6 +1143,336 @@ class Signals(QtCore.QObject):
         e = self.__windowApi.activeWindow.activeView.getEncoding()
         self.__window.statusBar().encodingLabel.setText(e.upper())
 
+class TextEdits:
+    """
+    Batch of edits to a view, like a piece table over the text as it was when the batch started:
+    every edit is a (begin, end, text) piece in those original coordinates, kept sorted.
+    apply() turns the pieces into cursor operations on the QTextDocument (itself a piece table),
+    last piece first, in a single undo step, so the cost is O(size of the edits), not of the document.
+    """
+    def __init__(self, view):
+        self.view = view
+        self.pieces = []
+        self._order = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        if excType is None:
+            self.apply()
+        return False
+
+    def replace(self, region, str string):
+        begin, end = (region, region) if isinstance(region, int) else (region.begin(), region.end())
+        if begin < 0 or end < begin:
+            raise ValueError(f"Invalid edit region ({begin}, {end})")
+        self._order += 1
+        i = bisect.bisect_right(self.pieces, (begin, end, self._order), key=lambda p: p[:3])
+        # Вставки в одну точку допустимы, пересечения изменяемых диапазонов - нет
+        if i > 0 and self.pieces[i - 1][1] > begin or i < len(self.pieces) and self.pieces[i][0] < end:
+            raise ValueError(f"Edit ({begin}, {end}) overlaps another edit in the batch")
+        self.pieces.insert(i, (begin, end, self._order, string))
+
+    def insert(self, int point, str string):
+        self.replace(point, string)
+
+    def erase(self, region):
+        self.replace(region, "")
+
+    def apply(self):
+        pieces, self.pieces = self.pieces, []
+        if pieces:
+            self.view.applyEdits([(begin, end, text) for begin, end, _, text in pieces])
+
+@functools.lru_cache(maxsize=128)
+def compilePattern(str pattern, int flags=0, cython.bint literal=False):
+    """Compiled pattern cache shared by all views."""
+    return re.compile(re.escape(pattern) if literal else pattern, flags)
+
+cdef bint _classMatchesNewline(list items):
+    cdef bint negate = False, hit = False
+    for op, av in items:
+        if op is sre_parse.NEGATE:
+            negate = True
+        elif op is sre_parse.LITERAL:
+            hit = hit or av == 10
+        elif op is sre_parse.RANGE:
+            hit = hit or av[0] <= 10 <= av[1]
+        elif op is sre_parse.CATEGORY:
+            hit = hit or av in (sre_parse.CATEGORY_SPACE, sre_parse.CATEGORY_NOT_DIGIT, sre_parse.CATEGORY_NOT_WORD, sre_parse.CATEGORY_LINEBREAK)
+    return hit != negate
+
+cdef bint _matchesNewline(object subpattern, bint dotall):
+    """Whether some atom of a parsed pattern, lookarounds included, can match "\\n"."""
+    for op, av in subpattern:
+        if op is sre_parse.LITERAL:
+            if av == 10:
+                return True
+        elif op is sre_parse.NOT_LITERAL:
+            if av != 10:
+                return True
+        elif op is sre_parse.ANY:
+            if dotall:
+                return True
+        elif op is sre_parse.IN:
+            if _classMatchesNewline(av):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            # (?s:...) и (?-s:...) меняют DOTALL только внутри группы
+            if _matchesNewline(av[3], (dotall or av[1] & re.DOTALL) and not av[2] & re.DOTALL):
+                return True
+        elif any(_matchesNewline(sub, dotall) for sub in _subpatterns(av)):
+            return True
+    return False
+
+def _subpatterns(av):
+    for item in (av if isinstance(av, tuple) else (av,)):
+        for sub in (item if isinstance(item, list) else (item,)):
+            if isinstance(sub, sre_parse.SubPattern):
+                yield sub
+
+cdef tuple _lookarounds(object subpattern):
+    """Summed widths of the lookbehinds and of the lookaheads of a parsed pattern."""
+    behind = ahead = 0
+    for op, av in subpattern:
+        if op is sre_parse.ASSERT or op is sre_parse.ASSERT_NOT:
+            if av[0] < 0:
+                behind += av[1].getwidth()[1]
+            else:
+                ahead += av[1].getwidth()[1]
+        for sub in _subpatterns(av):
+            b, a = _lookarounds(sub)
+            behind, ahead = behind + b, ahead + a
+    return behind, ahead
+
+@functools.lru_cache(maxsize=128)
+def lineLocal(pattern):
+    """Whether no match of a compiled pattern can contain or look across a line break."""
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    return not _matchesNewline(parsed, parsed.state.flags & re.DOTALL)
+
+@functools.lru_cache(maxsize=128)
+def patternReach(pattern):
+    """(behind, ahead): how far before and after its start a match attempt of a compiled pattern reads text; ahead is -1 if unbounded."""
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    behind, ahead = _lookarounds(parsed)
+    ahead += parsed.getwidth()[1]
+    return behind, ahead if ahead < sre_parse.MAXREPEAT else -1
+
+class Finder:
+    """
+    Search state of one document: the compiled pattern, its matches as a sorted RegionArray
+    and the current match. The match index follows edits through the document's contentsChange:
+    positions after the edit are shifted in one C loop, and the text around the edit is searched again
+    through windows of whole blocks that grow until the search meets the old index again after it.
+    """
+    def __init__(self, view, textEdit):
+        self.view = view
+        self.textEdit = textEdit
+        self.pattern = None
+        self.literal = None
+        self._flags = 0
+        self.matches = None
+        self.index = -1
+        self._text = None
+        self._revision = None
+        self._count = textEdit.document().characterCount()
+        textEdit.document().contentsChange.connect(self._contentsChanged)
+
+    def _getText(self):
+        revision = self.textEdit.document().revision()
+        if self._text is None or revision != self._revision or self.textEdit.largeFile:
+            self._text, self._revision = self.view.getText(), revision
+        return self._text
+
+    def _scan(self, str text):
+        flat = array("q")
+        for match in self.pattern.finditer(text):
+            flat.extend(match.span())
+        return flat
+
+    def find(self, str pattern, int flags=0, cython.bint literal=False):
+        """Finds all matches. Typing more of a literal pattern only re-checks the text around the previous matches."""
+        compiled = compilePattern(pattern, flags, literal)
+        text = self._getText()
+        previous, matches = self.literal, self.matches
+        self.pattern, self.literal = compiled, pattern if literal else None
+        if literal and previous and matches is not None and pattern != previous and pattern.startswith(previous) \
+                and self._flags == flags:
+            # Каждое вхождение нового шаблона начинается внутри одного из прошлых непересекающихся совпадений
+            flat = array("q")
+            done = 0
+            for begin, _ in matches.pairs():
+                for point in range(max(begin, done), begin + len(previous)):
+                    match = compiled.match(text, point)
+                    if match:
+                        flat.extend(match.span())
+                        done = match.end()
+                        break
+        else:
+            flat = self._scan(text)
+        self._flags = flags
+        self.matches = RegionArray(flat)
+        self.index = -1
+        return self.matches.copy()
+
+    def clear(self):
+        self.pattern, self.literal, self.matches, self.index = None, None, None, -1
+
+    def count(self):
+        self._ensure()
+        return len(self.matches) if self.matches is not None else 0
+
+    def regions(self):
+        self._ensure()
+        return self.matches.copy() if self.matches is not None else RegionArray()
+
+    def _ensure(self):
+        if self.matches is None and self.pattern is not None:
+            self.matches = RegionArray(self._scan(self._getText()))
+
+    def _contentsChanged(self, int position, int removed, int added):
+        document = self.textEdit.document()
+        # Подсветка может прислать ту же правку второй раз: сдвигаем позиции, только если длина изменилась на столько же
+        shifted, self._count = document.characterCount() - self._count == added - removed, document.characterCount()
+        if self.pattern is None:
+            return
+        self._text = None
+        if self.matches is None or self.textEdit.largeFile:
+            self.matches = None
+            return
+        if removed != added and shifted:
+            self.matches.adjust(position, position + removed, added)
+        length = document.characterCount() - 1
+        local = lineLocal(self.pattern)
+        behind, ahead = patternReach(self.pattern)
+        hi = position + added
+        if local:
+            # $ в конце предыдущей строки зависит от того, последний ли это перевод строки
+            lo = max(0, document.findBlock(position).previous().position())
+        elif ahead < 0:
+            lo = 0
+        else:
+            # Совпадение, задетое правкой, начинается не раньше чем за ahead символов до нее
+            lo = max(0, position - ahead - 1)
+        pairs = self.matches.buffer()
+        n = len(self.matches)
+        i = self.matches.bisect(lo)
+        if i > 0 and pairs[2 * i - 1] > lo:
+            i -= 1
+            lo = pairs[2 * i]
+        flat = array("q")
+        flat.frombytes(pairs[:2 * i].cast("B"))
+        # Дальше этой точки текст и состояние поиска те же, что до правки
+        settled = max(self._blockEnd(hi), hi + 1) if local else hi + behind + 1
+        start, end, last, k = lo, length if ahead < 0 and not local else self._blockEnd(hi), None, i
+        while True:
+            # Окно от start с контекстом для просмотра назад и символом после end для $ и \b
+            begin = max(0, document.findBlock(start).position() - 1 if local else start - behind - 1)
+            text = self.view.substr(Region(begin, end + 1))
+            # Поиск с началом до safe не читает текст за окном
+            safe = length + 1 if end >= length else end if local else end - ahead - 2
+            synced = False
+            for match in self.pattern.finditer(text, start - begin):
+                b, e = match.start() + begin, match.end() + begin
+                if b >= safe:
+                    break
+                if (b, e) == last:
+                    continue
+                if b >= settled:
+                    while k < n and pairs[2 * k] < b:
+                        k += 1
+                    # Совпадение из старого индекса после правки: дальше поиск повторяет старый
+                    synced = k < n and pairs[2 * k] == b and pairs[2 * k + 1] == e
+                    if synced:
+                        break
+                flat.extend((b, e))
+                last = (b, e)
+            if synced:
+                break
+            if end >= length:
+                k = n
+                break
+            start = max(start, safe, last[1] if last else 0)
+            if start >= settled and last != (start, start):
+                while k < n and pairs[2 * k] < start:
+                    k += 1
+                # Ни одно старое совпадение не перекрывает start: старый поиск тоже шел отсюда
+                if k == 0 or pairs[2 * k - 1] <= start:
+                    break
+            end = self._blockEnd(min(length, end + max(end - begin, ahead + behind + 2)))
+        flat.frombytes(pairs[2 * k:].cast("B"))
+        self.matches = RegionArray(flat)
+        self.index = min(self.index, len(self.matches) - 1)
+
+    def _blockEnd(self, int point):
+        document = self.textEdit.document()
+        block = document.findBlock(min(point, document.characterCount() - 1))
+        return min(block.position() + block.length(), document.characterCount() - 1)
+
+    def next(self, point=None, cython.bint forward=True, cython.bint wrap=True):
+        """Selects the next (or previous) match from point or the cursor and returns it, None if there are no matches."""
+        self._ensure()
+        if not self.matches:
+            return None
+        if point is None:
+            cursor = self.textEdit.textCursor()
+            point = cursor.selectionEnd() if forward else cursor.selectionStart()
+        i = self.matches.bisect(point) - (0 if forward else 1)
+        # Пустое совпадение на месте курсора уже выбрано - идем дальше
+        if forward and i == self.index and i < len(self.matches) and self.matches[i].end() == point:
+            i += 1
+        if not 0 <= i < len(self.matches):
+            if not wrap:
+                return None
+            i = 0 if forward else len(self.matches) - 1
+        region = self.matches[i]
+        self.index = i
+        self.view.setTextSelection(region)
+        return region
+
+    def _match(self, str text, int begin, int end):
+        """The match object for an indexed region; lookahead may read past its end."""
+        match = None
+        for match in self.pattern.finditer(text, begin):
+            if match.end() == end or match.start() > begin:
+                break
+        if match is None or match.span() != (begin, end):
+            raise ValueError(f"No match at ({begin}, {end})")
+        return match
+
+    def replace(self, str replacement):
+        """Replaces the current match and selects the next one."""
+        self._ensure()
+        if not self.matches or not 0 <= self.index < len(self.matches):
+            return self.next()
+        region = self.matches[self.index]
+        if self.literal is None:
+            replacement = self._match(self._getText(), region.begin(), region.end()).expand(replacement)
+        self.view.applyEdits([(region.begin(), region.end(), replacement)])
+        return self.next(region.begin() + len(replacement))
+
+    def replaceAll(self, str replacement):
+        """Replaces every match in one edit and one undo step, returns the number of replacements."""
+        self._ensure()
+        if not self.matches:
+            return 0
+        text = self._getText()
+        parts, first, last = [], None, 0
+        for match in self.pattern.finditer(text):
+            begin, end = match.span()
+            if first is None:
+                first = last = begin
+            parts.append(text[last:begin])
+            parts.append(replacement if self.literal is not None else match.expand(replacement))
+            last = end
+        if first is None:
+            return 0
+        self.view.applyEdits([(first, last, "".join(parts))])
+        self.index = -1
+        return len(parts) // 2
+
 cdef class View:
     cdef readonly object api
     cdef readonly object __window
@@ -571,7 +1524,11 @@ cdef class View:
         self.__tabWidget.setTabText(self.__tabWidget.indexOf(self.__tab), text)
 
     cpdef str getText(self):
-        return self.__tab.textEdit.toPlainText()
+        textEdit = self.__tab.textEdit
+        if textEdit.largeFile:
+            textEdit.commitWindow()
+            return textEdit.largeFile.text()
+        return textEdit.toPlainText()
 
     cpdef str getHtml(self):
         return self.__tab.textEdit.toHtml()
@@ -581,6 +1538,33 @@ cdef class View:
         self.setSaved(False)
         return text
 
+    cpdef void loadFile(self, object file, progress=None):
+        """Streams a file into the view block by block, without a full text copy.
+        Files above the large file threshold are shown through a line index instead."""
+        cdef File f = File(file) if isinstance(file, str) else file
+        textEdit = self.__tab.textEdit
+        if f.size() >= textEdit.largeFileThreshold and f.encoding != "binary":
+            textEdit.openLargeFile(f.path, f.encoding)
+            return
+        textEdit.closeLargeFile()
+        document = textEdit.document()
+        readOnly = textEdit.isReadOnly()
+        textEdit.setReadOnly(True)
+        textEdit.blockSignals(True)
+        document.setUndoRedoEnabled(False)
+        try:
+            document.clear()
+            cursor = QtGui.QTextCursor(document)
+            for block in f.blocks(progress):
+                cursor.insertText(block)
+                QtCore.QCoreApplication.processEvents()
+        finally:
+            document.setUndoRedoEnabled(True)
+            textEdit.blockSignals(False)
+            textEdit.setReadOnly(readOnly)
+        textEdit.textLen.cache_clear()
+        textEdit.textChanged.emit()
+
     cpdef object getFile(self):
         return self.__tab.file
 
@@ -622,35 +1606,134 @@ cdef class View:
         return b
 
     cpdef int size(self):
-        return self.__tab.textEdit.textLen()
+        textEdit = self.__tab.textEdit
+        if textEdit.largeFile:
+            textEdit.commitWindow()
+            return textEdit.largeFile.length()
+        return textEdit.textLen()
 
     cpdef str substr(self, object region):
-        return self.__tab.textEdit.toPlainText()[region.begin():region.end()]
+        textEdit = self.__tab.textEdit
+        if textEdit.largeFile:
+            textEdit.commitWindow()
+            return textEdit.largeFile.substr(region.begin(), region.end())
+        cursor = QtGui.QTextCursor(textEdit.document())
+        cursor.setPosition(max(0, min(region.begin(), textEdit.document().characterCount() - 1)))
+        cursor.setPosition(max(0, min(region.end(), textEdit.document().characterCount() - 1)), QtGui.QTextCursor.MoveMode.KeepAnchor)
+        return cursor.selection().toPlainText()
+
+    cdef void largeReplace(self, int a, int b, str string):
+        textEdit = self.__tab.textEdit
+        textEdit.commitWindow()
+        textEdit.largeFile.replace(a, b, string)
+        textEdit.reloadWindow()
+        self.setSaved(False)
+
+    cpdef object edit(self):
+        """Starts a batch of edits in current coordinates: with view.edit() as e: e.replace(...)"""
+        return TextEdits(self)
+
+    cpdef void applyEdits(self, list edits):
+        """Applies sorted, non-overlapping (begin, end, text) edits as one undo step; positions are clamped to the text."""
+        textEdit = self.__tab.textEdit
+        if textEdit.largeFile:
+            textEdit.commitWindow()
+            last = textEdit.largeFile.length()
+            for begin, end, text in reversed(edits):
+                textEdit.largeFile.replace(max(0, min(begin, last)), max(0, min(end, last)), text)
+            textEdit.reloadWindow()
+        else:
+            textEdit.applyEdits(edits)
+        self.setSaved(False)
+
+    cpdef object findAll(self, str pattern, int flags=0, cython.bint literal=False):
+        """All matches of pattern as a RegionArray, built in one pass without Region objects."""
+        flat = array("q")
+        for match in compilePattern(pattern, flags, literal).finditer(self.getText()):
+             flat.extend(match.span())
+        return RegionArray(flat)
+
+    cpdef object finder(self):
+        """Search state of this document, kept across calls and updated on every edit."""
+        textEdit = self.__tab.textEdit
+        if textEdit.finder is None:
+             textEdit.finder = Finder(self, textEdit)
+        return textEdit.finder
+
+    cpdef object find(self, str pattern, int flags=0, cython.bint literal=False):
+        return self.finder().find(pattern, flags, literal)
+
+    cpdef int replaceAll(self, str pattern, str replacement, int flags=0, cython.bint literal=False):
+        finder = self.finder()
+        finder.find(pattern, flags, literal)
+        return finder.replaceAll(replacement)
+
+    cpdef tuple rowcol(self, int offset):
+        """Converts a character offset to (row, col), both from 0. O(log n) over the document's block map."""
+        textEdit = self.__tab.textEdit
+        if textEdit.largeFile:
+            textEdit.commitWindow()
+            return textEdit.largeFile.rowcol(offset)
+        document = textEdit.document()
+        block = document.findBlock(max(0, min(offset, document.characterCount() - 1)))
+        return block.blockNumber(), max(0, min(offset, document.characterCount() - 1)) - block.position()
+
+    cpdef int textPoint(self, int row, int col=0):
+        """Converts (row, col) to a character offset; col is clamped to the line, rows past the end give the end of text."""
+        textEdit = self.__tab.textEdit
+        if textEdit.largeFile:
+            textEdit.commitWindow()
+            if row >= textEdit.largeFile.lineCount():
+                return textEdit.largeFile.length()
+            return textEdit.largeFile.lineStart(row) + max(0, min(col, len(textEdit.largeFile.line(row))))
+        document = textEdit.document()
+        block = document.findBlockByNumber(row)
+        if not block.isValid():
+            return document.characterCount() - 1
+        return block.position() + max(0, min(col, block.length() - 1))
+
+    cpdef object line(self, object region):
+        """Region of the whole lines covering a region or an offset, without the trailing newline."""
+        begin, end = (region, region) if isinstance(region, int) else (region.begin(), region.end())
+        textEdit = self.__tab.textEdit
+        if textEdit.largeFile:
+            first, last = self.rowcol(begin)[0], self.rowcol(end)[0]
+            return Region(self.textPoint(first, 0), self.textPoint(last, len(textEdit.largeFile.line(last))))
+        document = textEdit.document()
+        first = document.findBlock(max(0, min(begin, document.characterCount() - 1)))
+        last = document.findBlock(max(0, min(end, document.characterCount() - 1)))
+        return Region(first.position(), last.position() + last.length() - 1)
 
     cpdef void insert(self, str string, object point=None):
         textEdit = self.__tab.textEdit
-        cursor = textEdit.textCursor()
+        if textEdit.largeFile:
+            textEdit.commitWindow()
+            if point is not None:
+                pos = self.textPoint(point.x, point.y)
+            else:
+                pos = textEdit.largeFile.length()
+            self.largeReplace(pos, pos, string)
+            return
         if point is not None:
-            line_index, char_index = point.x, point.y
-            lines = textEdit.toPlainText().splitlines()
-            abs_position = 0
-            for i in range(line_index):
-                abs_position += len(lines[i]) + 1
-            cursor.setPosition(abs_position)
+            pos = self.textPoint(point.x, point.y)
         else:
-            cursor.movePosition(QtGui.QTextCursor.MoveOperation.End)
-        textEdit.safeSetText(string, cursor)
+            pos = textEdit.document().characterCount() - 1
+        self.applyEdits([(pos, pos, string)])
+        cursor = textEdit.textCursor()
+        cursor.setPosition(pos + len(string))
         textEdit.setTextCursor(cursor)
-        self.setSaved(False)
 
     cpdef void erase(self, object region):
-        t = self.__tab.textEdit.toPlainText()
-        self.__tab.textEdit.setPlainText(t[:region.begin()] + t[region.end():])
+        if self.__tab.textEdit.largeFile:
+            self.largeReplace(region.begin(), region.end(), "")
+            return
+        self.applyEdits([(region.begin(), region.end(), "")])
 
     cpdef void replace(self, object region, str string):
-        t = self.__tab.textEdit.toPlainText()
-        self.__tab.textEdit.setPlainText(t[:region.begin()] + string + t[region.end():])
-        self.setSaved(False)
+        if self.__tab.textEdit.largeFile:
+            self.largeReplace(region.begin(), region.end(), string)
+            return
+        self.applyEdits([(region.begin(), region.end(), string)])
 
     cpdef void undo(self):
         self.__tab.textEdit.undo()
@@ -701,18 +1784,15 @@ cdef class View:
         self.__tab.textEdit.setTextCursor(cursor)
 
     cpdef tuple getCompletePos(self):
-        current_text = self.__tab.textEdit.document().toPlainText()
-        cursor_position = self.__tab.textEdit.textCursor().position()
-
-        line_number = self.__tab.textEdit.textCursor().blockNumber()
-        column = self.__tab.textEdit.textCursor().columnNumber()
-
-        lines = current_text.splitlines()
-        if 0 <= line_number < len(lines):
-            line = lines[line_number]
-            return current_text, line_number + 1, column
+        document = self.__tab.textEdit.document()
+        cursor = self.__tab.textEdit.textCursor()
+        line_number = cursor.blockNumber()
+        column = cursor.columnNumber()
+        # splitlines() не считает пустую строку после последнего перевода строки
+        if 0 <= line_number < document.blockCount() - (1 if document.lastBlock().length() == 1 else 0):
+            return document.toPlainText(), line_number + 1, column
         else:
-            return current_text, 0, 0
+            return document.toPlainText(), 0, 0
 
     cpdef void setCompleteList(self, list lst):
         self.completer = self.__tab.textEdit.completer.updateCompletions(lst)
@@ -721,9 +1801,37 @@ cdef class View:
         for _type in hl:
             self.__tab.textEdit.highLighter.addHighlightingRule(_type, hl.get(_type))
 
-    cpdef void setAddititionalHL(self, data):
+    cpdef list _hlSpans(self, object regions, dict style):
+        """Splits document regions into per-line highlighting spans."""
+        spans = []
+        pairs = RegionArray(regions).pairs()
+        for begin, end in pairs:
+             first, col = self.rowcol(begin)
+             last, lastCol = self.rowcol(end)
+             for row in range(first, last + 1):
+                 line = self.line(self.textPoint(row))
+                 stop = lastCol if row == last else line.end() - line.begin()
+                 if stop > col or first == last:
+                     spans.append({**style, "line": row, "pos": (col, stop)})
+                 col = 0
+        return spans
+
+    cpdef void setAddititionalHL(self, data, dict style=None):
+        if style is not None:
+             data = self._hlSpans(data, style)
         self.__tab.textEdit.highLighter.addHighlightingData(data)
 
+    cpdef void addAdditionalHL(self, data, dict style=None):
+        if style is not None:
+             data = self._hlSpans(data, style)
+        self.__tab.textEdit.highLighter.addHighlightingSpans(data)
+
+    cpdef void removeAdditionalHL(self, data):
+        self.__tab.textEdit.highLighter.removeHighlightingSpans(data)
+
+    cpdef void clearAdditionalHL(self, lines=None):
+        self.__tab.textEdit.highLighter.clearHighlightingSpans(lines)
+
     cpdef void rehighlite(self):
         QtCore.QMetaObject.invokeMethod(
             self.__tab.textEdit.highLighter, "rehighlight",
@@ -736,6 +1844,9 @@ cdef class View:
         else:
             self.__tab.textEdit.minimapScrollArea.show()
 
+    cpdef cython.bint isLargeFile(self):
+        return self.__tab.textEdit.largeFile is not None
+
     cpdef cython.bint isMmapHidden(self):
         return self.__tab.textEdit.minimapScrollArea.isHidden()
 
@@ -743,7 +1854,10 @@ cdef class View:
         if os.path.isfile(path):
             self.tagBase.addFile(path)
 
-    cpdef list getTags(self, str path):
+    cpdef list getTags(self, str path, callback=None):
+        if callback is not None:
+            self.tagBase.getTagsForFile(path, callback=callback)
+            return []
         return self.tagBase.getTagsForFile(path)
 
     cpdef void addTag(self, str path, str tag):
@@ -756,9 +1870,30 @@ cdef class View:
         self.tagBase.removeTag(path, tag)
         self.__tab.frame.removeTag(tag, show)
 
-    cpdef list getTagFiles(self, str tag):
+    cpdef list getTagFiles(self, str tag, callback=None):
+        if callback is not None:
+            self.tagBase.getFilesForTag(tag, callback=callback)
+            return []
         return self.tagBase.getFilesForTag(tag)
 
+    cpdef list findTagFiles(self, str expression, callback=None):
+        if callback is not None:
+            self.tagBase.queryFiles(expression, callback=callback)
+            return []
+        return self.tagBase.queryFiles(expression)
+
+    cpdef int countTagFiles(self, str expression, callback=None):
+        if callback is not None:
+            self.tagBase.countFiles(expression, callback=callback)
+            return 0
+        return self.tagBase.countFiles(expression)
+
+    cpdef dict tagCounts(self, str prefix="", callback=None):
+        if callback is not None:
+            self.tagBase.tagCounts(prefix, callback=callback)
+            return {}
+        return self.tagBase.tagCounts(prefix)
+
 cdef class Window:
     cdef readonly VtAPI api
     cdef readonly object __mw
@@ -876,6 +2011,59 @@ cdef class Window:
         if hasattr(self.__mw, "pl"):
             return self.__mw.pl.regCommands.get(name)
 
+    cpdef dict commandMetrics(self):
+        if hasattr(self.__mw, "pl"):
+            return self.__mw.pl.metrics.data()
+        return {"commands": {}, "plugins": {}}
+
+    cpdef void setCommandMetricsEnabled(self, bint enabled):
+        if hasattr(self.__mw, "pl"):
+            self.__mw.pl.metrics.enabled = enabled
+
+    cpdef void exportCommandMetrics(self, str path):
+        if hasattr(self.__mw, "pl"):
+            self.__mw.pl.metrics.export(path)
+
+    cpdef void resetCommandMetrics(self):
+        if hasattr(self.__mw, "pl"):
+            self.__mw.pl.metrics.reset()
+
+    cpdef list tasks(self):
+        if hasattr(self.__mw, "pl"):
+            return list(self.__mw.pl.tasks)
+        return []
+
+    cpdef list findTagFiles(self, str expression, callback=None):
+        if callback is not None:
+            self.__mw.tagBase.queryFiles(expression, callback=callback)
+            return []
+        return self.__mw.tagBase.queryFiles(expression)
+
+    cpdef int countTagFiles(self, str expression, callback=None):
+        if callback is not None:
+            self.__mw.tagBase.countFiles(expression, callback=callback)
+            return 0
+        return self.__mw.tagBase.countFiles(expression)
+
+    cpdef dict tagCounts(self, str prefix="", callback=None):
+        if callback is not None:
+            self.__mw.tagBase.tagCounts(prefix, callback=callback)
+            return {}
+        return self.__mw.tagBase.tagCounts(prefix)
+
+    def spawn(self, coro):
+        return asyncLoop().spawn(coro, self)
+
+    cpdef list asyncTasks(self):
+        return asyncLoop().windowTasks(self)
+
+    cpdef void cancelAsyncTasks(self):
+        asyncLoop().cancel(self)
+
+    cpdef void cancelTasks(self):
+        if hasattr(self.__mw, "pl"):
+            self.__mw.pl.cancelTasks()
+
     cpdef str getTheme(self):
         return self.__mw.themeFile
 
@@ -891,14 +2079,20 @@ cdef class Window:
         if auto: locale = self.__mw.defineLocale()
         else: locale = s
         self.__mw.locale = locale
+        self.__mw.clearTranslationCache()
         return locale
 
+    cpdef dict translationCacheInfo(self):
+        return {"hits": self.__mw.translationHits, "misses": self.__mw.translationMisses, "size": len(self.__mw.translationCache)}
+
     cpdef str getLog(self):
         return self.__mw.logger.log
 
+    cpdef list getLogRecords(self):
+        return self.__mw.logger.records()
+
     cpdef void setLogMsg(self, msg, t: "VtAPI.Color" = None):
-        msg = f"""<i style="color: {t.value if t else ""};">{msg}</i>"""
-        self.__mw.logger.log += f"<br>{time.strftime('[%H:%M:%S %d %b];', time.localtime())}: {msg}"
+        self.__mw.logger.append(str(msg), t.value if t else "")
 
     cpdef void setTab(self, int i):
         self.__mw.tabWidget.setCurrentIndex(i - 1)
@@ -984,12 +2178,18 @@ cdef class VtAPI:
     Point = Point
     Region = Region
     Selection = Selection
+    RegionArray = RegionArray
+    Task = Task
+    TextEdits = TextEdits
+    Finder = Finder
+    AsyncLoop = AsyncLoop
 
     def __cinit__(self, app=None):
         if app is None:
              self.__app = QtWidgets.QApplication.instance()
         else:
              self.__app = app
+        invoker()
         
         self.__windows = []
         self.__appName = "VT2"
@@ -1065,6 +2265,31 @@ cdef class VtAPI:
     def setTimeout(function, int delay):
         QtCore.QTimer.singleShot(delay, function)
 
+    @staticmethod
+    def runOnGui(function, *args, **kwargs):
+        invoker().call(function, *args, **kwargs)
+
+    @staticmethod
+    def runTask(function, *args, task=None, **kwargs):
+        task = task or Task(getattr(function, "__name__", ""))
+        return task.start(function, *args, **kwargs)
+
+    @staticmethod
+    def setTaskWorkers(int count):
+        global TASK_WORKERS, _taskPool
+        TASK_WORKERS = max(1, count)
+        if _taskPool is not None:
+             _taskPool.shutdown(wait=False)
+             _taskPool = None
+
+    @staticmethod
+    def asyncLoop():
+        return asyncLoop()
+
+    @staticmethod
+    def spawn(coro, window=None):
+        return asyncLoop().spawn(coro, window)
+
     @staticmethod
     async def setTimeout_async(function, int delay):
         await asyncio.sleep(delay)
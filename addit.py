@@ -5,38 +5,101 @@ from PySide6.QtCore import QStringListModel, Qt, Slot
 from PySide6.QtGui import QTextCursor
 from PySide6.QtSql import QSqlDatabase, QSqlQuery
 
-import sys, io, uuid
+import sys, io, uuid, os, bisect, re, heapq, time, collections, queue, threading, contextlib, json, atexit, inspect
+from array import array
+from concurrent.futures import ThreadPoolExecutor, Future
+
+LARGE_FILE_THRESHOLD = 64 * 1024 * 1024
+
+LogRecord = collections.namedtuple("LogRecord", "time color message")
 
 class Logger:
-    def __init__(self, window):
-        self._log = ""
+    """
+    Log of the window kept as a ring buffer of LogRecord (at most capacity records).
+    Each record is rendered once on append and kept next to it, the log HTML is joined from these
+    fragments only when read, logWrited gets just the new line,
+    and file output is written in batches by a background thread.
+    """
+    capacity = 10000
+
+    def __init__(self, window, capacity=None):
         self.__window = window
+        self._records = collections.deque(maxlen=capacity or self.capacity)
+        self._fragments = collections.deque(maxlen=self._records.maxlen)
+        self._html = ""
         
         self._stdout_backup = sys.stdout
         self._log_stream = io.StringIO()
         sys.stdout = self
         self._file = None
+        self._fileQueue = None
+        self._fileThread = None
 
     def setFile(self, file):
+        self._stopFileThread()
         self._file = file
+        if file:
+            self._fileQueue = queue.SimpleQueue()
+            self._fileThread = threading.Thread(target=self._writeFile, args=(file, self._fileQueue), daemon=True)
+            self._fileThread.start()
+
+    def setCapacity(self, capacity):
+        self._records = collections.deque(self._records, maxlen=capacity)
+        self._fragments = collections.deque(self._fragments, maxlen=capacity)
+        self._html = None
+
+    def records(self):
+        return list(self._records)
+
+    @staticmethod
+    def render(record):
+        if record.color is None:
+            return record.message
+        stamp = time.strftime('[%H:%M:%S %d %b];', time.localtime(record.time))
+        return f"""<br>{stamp}: <i style="color: {record.color};">{record.message}</i>"""
+
+    def append(self, message, color=""):
+        """Adds a record; color None keeps the message as ready HTML."""
+        record = LogRecord(time.time(), color, message)
+        full = len(self._records) == self._records.maxlen
+        self._records.append(record)
+        html = self.render(record)
+        self._fragments.append(html)
+        if self._html is not None and not full:
+            self._html += html
+        else:
+            # Старая запись вытеснена: лог склеивается из готовых фрагментов при чтении
+            self._html = None
+        if self._fileQueue: self._fileQueue.put("\n" + html)
+        self.__window.api.activeWindow.signals.logWrited.emit(html)
+        return record
+
+    def clear(self):
+        self._records.clear()
+        self._fragments.clear()
+        self._html = ""
 
     @property
     def log(self):
-        return self._log
+        if self._html is None:
+            self._html = "".join(self._fragments)
+        return self._html
 
     @log.setter
     def log(self, value):
-        self._log = value
-        if self._file: self._file.write("\n"+value)
-        self.__window.api.activeWindow.signals.logWrited.emit(value)
+        current = self.log
+        if current and value.startswith(current):
+            # log += "...": сохраняем только добавленную часть
+            self.append(value[len(current):], None)
+        else:
+            self.clear()
+            self.append(value, None)
 
     def write(self, message):
         if message:
             try:
                 if self.__window.logStdout:
                     self.__window.api.activeWindow.setLogMsg(f"stdout: {message}")
-                    if self._file: self._file.write("\n"+message)
-                    self.__window.api.activeWindow.signals.logWrited.emit(message)
             except: pass
             if self._stdout_backup:
                 self._stdout_backup.write(message)
@@ -44,54 +107,470 @@ class Logger:
     def flush(self):
         pass
 
+    @staticmethod
+    def _writeFile(file, lines):
+        while True:
+            batch = [lines.get()]
+            while not lines.empty():
+                batch.append(lines.get())
+            stop = None in batch
+            file.write("".join(line for line in batch if line is not None))
+            file.flush()
+            if stop:
+                return
+
+    def _stopFileThread(self):
+        if self._fileThread:
+            self._fileQueue.put(None)
+            self._fileThread.join()
+        self._fileQueue = self._fileThread = None
+
     def close(self):
+        self._stopFileThread()
         sys.stdout = self._stdout_backup
         self._log_stream.close()
 
-class MiniMap(QtWidgets.QTextEdit):
+class StartupTracer:
+    """
+    Wall-clock spans of startup phases (settings, TagDB, menus, plugins, state restore...).
+    Spans are always recorded (there are only a few dozen); files are written by finish()
+    only when tracing is enabled with --trace-startup[=path] or the "traceStartup" setting.
+    save() writes a JSON report and a Chrome trace (chrome://tracing, Perfetto) next to it.
+    """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.path = None
+        self.recording = True
+        self.finished = False
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def setOrigin(self, origin):
+        """Moves the zero of the timeline back, e.g. to before the first import in main.py."""
+        self.origin = min(self.origin, origin)
+
+    def enable(self, path):
+        self.path = path
+
+    def addSpan(self, name, start, end, category="startup", **args):
+        if self.recording:
+            self.spans.append({"name": name, "cat": category, "start": start - self.origin, "duration": end - start, "args": args})
+
+    @contextlib.contextmanager
+    def span(self, name, category="startup", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addSpan(name, start, time.perf_counter(), category, **args)
+
+    def chromeTrace(self):
+        pid, tid = os.getpid(), threading.get_ident()
+        return {"traceEvents": [{
+            "name": s["name"], "cat": s["cat"], "ph": "X", "pid": pid, "tid": tid,
+            "ts": round(s["start"] * 1e6), "dur": round(s["duration"] * 1e6), "args": s["args"],
+        } for s in self.spans], "displayTimeUnit": "ms"}
+
+    def save(self, path=None):
+        path = path or self.path
+        report = {"total": time.perf_counter() - self.origin, "spans": self.spans}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        with open(os.path.splitext(path)[0] + ".chrome.json", "w", encoding="utf-8") as f:
+            json.dump(self.chromeTrace(), f)
+
+    def finish(self):
+        """Ends the startup trace: saves it if enabled, and keeps recording (lazy plugin imports) only then."""
+        if self.finished:
+            return
+        self.finished = True
+        self.recording = self.enabled
+        if self.enabled:
+            self.trySave()
+            atexit.register(self.trySave)
+        else:
+            self.spans.clear()
+
+    def trySave(self):
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Startup trace not saved: {e}")
+
+tracer = StartupTracer()
+
+class LargeFileBuffer:
+    """
+    Text of a large file addressed through a line-offset index.
+    The index is built lazily in steps of indexStep bytes and edits are kept as
+    pieces of replaced lines on top of the file, so the file is never loaded as a whole.
+    Offsets are character offsets in the text with "\n" line ends, like QTextDocument.
+    """
+    indexStep = 4 * 1024 * 1024
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.open()
+
+    def open(self):
+        # Positional reads instead of mmap: a file truncated underneath (log rotation,
+        # saving over it) gives short reads here instead of SIGBUS.
+        self._file = open(self.path, "rb")
+        self._stat = os.fstat(self._file.fileno())
+        self._size = self._stat.st_size
+        self._byteStarts = array("q", [0])
+        self._charStarts = array("q", [0])
+        self._done = self._size == 0
+        self._pieces = [[None, 0, None]]
+
+    def close(self):
+        self._file.close()
+
+    def reload(self):
+        self.close()
+        self.open()
+
+    def isStale(self):
+        st = os.stat(self.path)
+        return (st.st_size, st.st_mtime_ns) != (self._stat.st_size, self._stat.st_mtime_ns)
+
+    def _read(self, a, b):
+        self._file.seek(a)
+        return self._file.read(b - a)
+
+    def isIndexed(self):
+        return self._done
+
+    def indexMore(self):
+        """Indexes the next indexStep bytes. Returns False once the whole file is indexed."""
+        if self._done:
+            return False
+        start = self._byteStarts[-1]
+        self._file.seek(start)
+        data = self._file.read(self.indexStep)
+        # Короткое чтение - конец файла, даже если файл стал меньше, чем при открытии
+        eof = len(data) < self.indexStep
+        while data.rfind(b"\n") == -1 and not eof and start + len(data) < self._size:
+            more = self._file.read(self.indexStep)
+            found = more.find(b"\n")
+            eof = found == -1 and len(more) < self.indexStep
+            data += more if found == -1 else more[:found + 1]
+        bs, cs = self._byteStarts, self._charStarts
+        c = cs[-1]
+        ascii = data.isascii()
+        p = 0
+        while True:
+            q = data.find(b"\n", p)
+            if q == -1:
+                break
+            n = q - p if ascii else len(data[p:q].decode(self.encoding, "ignore"))
+            if q > p and data[q - 1] == 13:
+                n -= 1
+            c += n + 1
+            bs.append(start + q + 1)
+            cs.append(c)
+            p = q + 1
+        if eof:
+            self._size = start + len(data)
+        if eof or start + len(data) >= self._size:
+            self._done = True
+        return not self._done
+
+    def _ensureFileLine(self, i):
+        while not self._done and len(self._byteStarts) - 1 <= i:
+            self.indexMore()
+
+    def _ensureFileOffset(self, offset):
+        while not self._done and self._charStarts[-1] <= offset:
+            self.indexMore()
+
+    def _fileLine(self, i):
+        return self._fileLines(i, i + 1)[0]
+
+    def _fileLines(self, a, b):
+        self._ensureFileLine(b - 1)
+        bs = self._byteStarts
+        end = bs[b] - 1 if b < len(bs) else self._size
+        lines = self._read(bs[a], end).decode(self.encoding, "ignore").split("\n")
+        lastLine = lines[-1]
+        lines = [line[:-1] if line.endswith("\r") else line for line in lines]
+        if end == self._size:
+            lines[-1] = lastLine
+        return lines
+
+    def _knownEnd(self, piece):
+        """End line of a piece as far as the file is indexed."""
+        if piece[2] is not None:
+            return piece[2]
+        return len(self._byteStarts) - (0 if self._done else 1)
+
+    def _pieceChars(self, piece):
+        src, a = piece[0], piece[1]
+        if piece[2] is None:
+            self._ensureFileLine(sys.maxsize)
+        b = self._knownEnd(piece)
+        if b <= a:
+            return 0
+        if src is not None:
+            return sum(len(line) + 1 for line in src[a:b])
+        cs = self._charStarts
+        if b < len(cs):
+            return cs[b] - cs[a]
+        return cs[b - 1] - cs[a] + len(self._fileLine(b - 1)) + 1
+
+    def lineCount(self, estimate=False):
+        """Number of lines. With estimate=True a guess is returned while the file is still being indexed."""
+        if not self._done:
+            if not estimate:
+                self._ensureFileLine(sys.maxsize)
+            else:
+                bs = self._byteStarts
+                perLine = bs[-1] / (len(bs) - 1) if len(bs) > 1 else self._size
+                tail = int((self._size - bs[-1]) / max(perLine, 1)) + 1
+                return sum(self._knownEnd(p) - p[1] for p in self._pieces) + tail
+        return sum(self._knownEnd(p) - p[1] for p in self._pieces)
+
+    def length(self):
+        return sum(self._pieceChars(p) for p in self._pieces) - 1
+
+    def lines(self, first, last):
+        """Returns the text of lines [first, last)."""
+        out = []
+        line = 0
+        for piece in self._pieces:
+            if line >= last:
+                break
+            src, a = piece[0], piece[1]
+            if piece[2] is None:
+                self._ensureFileLine(a + last - line - 1)
+            count = self._knownEnd(piece) - a
+            lo, hi = max(first - line, 0), min(last - line, count)
+            if lo < hi:
+                out.extend(src[a + lo:a + hi] if src is not None else self._fileLines(a + lo, a + hi))
+            line += count
+        return out
+
+    def line(self, i):
+        lines = self.lines(i, i + 1)
+        return lines[0] if lines else ""
+
+    def lineStart(self, i):
+        """Character offset of the start of line i. Lines past the end map to the end of the text."""
+        offset = line = 0
+        for piece in self._pieces:
+            src, a = piece[0], piece[1]
+            if piece[2] is None:
+                self._ensureFileLine(a + i - line)
+            count = self._knownEnd(piece) - a
+            if i - line < count:
+                k = a + i - line
+                if src is not None:
+                    return offset + sum(len(l) + 1 for l in src[a:k])
+                return offset + self._charStarts[k] - self._charStarts[a]
+            offset += self._pieceChars(piece)
+            line += count
+        return max(offset - 1, 0)
+
+    def rowcol(self, offset):
+        """Converts a character offset to (line, column)."""
+        line = 0
+        last = len(self._pieces) - 1
+        for n, piece in enumerate(self._pieces):
+            src, a = piece[0], piece[1]
+            if src is None:
+                cs = self._charStarts
+                target = cs[a] + offset
+                if piece[2] is None:
+                    self._ensureFileOffset(target)
+                end = self._knownEnd(piece)
+                if end > a and (n == last or (target < cs[end] if end < len(cs) else offset < self._pieceChars(piece))):
+                    i = bisect.bisect_right(cs, target, a, end) - 1
+                    return line + i - a, min(target - cs[i], len(self._fileLine(i)))
+                offset -= self._pieceChars(piece)
+                line += end - a
+            else:
+                for i in range(a, piece[2]):
+                    if offset <= len(src[i]):
+                        return line + i - a, offset
+                    offset -= len(src[i]) + 1
+                line += piece[2] - a
+        last = self.lineCount() - 1
+        return last, len(self.line(last))
+
+    def substr(self, a, b):
+        (la, ca), (lb, cb) = self.rowcol(a), self.rowcol(b)
+        lines = self.lines(la, lb + 1)
+        lines[-1] = lines[-1][:cb]
+        lines[0] = lines[0][ca:] if la != lb else lines[0][ca:cb]
+        return "\n".join(lines)
+
+    def text(self):
+        return "\n".join(self.lines(0, self.lineCount()))
+
+    def _split(self, i):
+        """Splits the pieces so that line i starts a piece and returns that piece's index."""
+        line = 0
+        for n, piece in enumerate(self._pieces):
+            src, a, b = piece
+            if b is None:
+                self._ensureFileLine(a + i - line)
+            count = self._knownEnd(piece) - a
+            if i == line:
+                return n
+            if i - line < count:
+                k = a + i - line
+                self._pieces[n:n + 1] = [[src, a, k], [src, k, b]]
+                return n + 1
+            line += count
+        return len(self._pieces)
+
+    def replaceLines(self, first, last, newLines):
+        """Replaces lines [first, last) with newLines."""
+        start = self._split(first)
+        end = self._split(last)
+        self._pieces[start:end] = [[list(newLines), 0, len(newLines)]]
+        self._pieces = [p for p in self._pieces if p[2] is None or p[2] > p[1]] or [[[""], 0, 1]]
+
+    def replace(self, a, b, string):
+        """Replaces the characters [a, b) and returns the first and last touched lines."""
+        (la, ca), (lb, cb) = self.rowcol(a), self.rowcol(b)
+        newText = self.line(la)[:ca] + string + self.line(lb)[cb:]
+        newLines = newText.split("\n")
+        self.replaceLines(la, lb + 1, newLines)
+        return la, la + len(newLines)
+
+class MiniMap(QtWidgets.QWidget):
+    """
+    Minimap drawn straight from the source document: every block is a density bar
+    (indent and length of the line) in a cached pixmap that covers only the rows on screen.
+    Edits repaint just the rows of the changed blocks, at most once per frameInterval ms.
+    """
+    lineHeight = 2
+    charWidth = 1
+    frameInterval = 16
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.setReadOnly(True)
         self.setFixedWidth(150)
         self.setObjectName("miniMap")
-        self.setTextInteractionFlags (QtCore.Qt.TextInteractionFlag.NoTextInteraction) 
-        self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setCursor(QtCore.Qt.CursorShape.ArrowCursor)
+        self.textEdit = None
         self._isDragging = False
+        self._cache = QtGui.QPixmap()
+        self._top = 0
+        self._blockCount = 0
+        self._dirty = None
+        self._frameTimer = QtCore.QTimer(self)
+        self._frameTimer.setSingleShot(True)
+        self._frameTimer.timeout.connect(self.renderDirty)
 
     def setTextEdit(self, text_edit):
         self.textEdit = text_edit
-        self.setHtml(self.textEdit.toHtml())
         self.textEdit.verticalScrollBar().valueChanged.connect(self.syncScroll)
         self.textEdit.cursorPositionChanged.connect(self.syncSelection)
-        self.textEdit.verticalScrollBar().rangeChanged.connect(self.update_minimap)
-        self.textEdit.textChanged.connect(self.update_minimap)
-        self.setFontPointSize(3)
+        self.textEdit.verticalScrollBar().rangeChanged.connect(self.syncScroll)
+        self.textEdit.document().contentsChange.connect(self.onContentsChange)
         self.update_minimap()
-        self.viewport().update()
+
+    def visibleRows(self):
+        return max(1, self.height() // self.lineHeight)
+
+    def topBlock(self):
+        """Number of the first block shown: the minimap scrolls in proportion to the editor."""
+        blockCount = self.textEdit.document().blockCount()
+        rows = self.visibleRows()
+        if blockCount <= rows:
+            return 0
+        scrollBar = self.textEdit.verticalScrollBar()
+        if scrollBar.maximum() == 0:
+            return 0
+        return int(scrollBar.value() / scrollBar.maximum() * (blockCount - rows))
+
+    def blockAt(self, y):
+        return self._top + int(y) // self.lineHeight
+
+    def scheduleRender(self, first=0, last=None):
+        """Marks blocks first..last (None - up to the end) for repainting on the next frame."""
+        if self._dirty is None:
+            self._dirty = (first, last)
+        else:
+            old_first, old_last = self._dirty
+            self._dirty = (min(first, old_first), None if last is None or old_last is None else max(last, old_last))
+        if not self._frameTimer.isActive():
+            self._frameTimer.start(self.frameInterval)
+
+    def onContentsChange(self, position, removed, added):
+        document = self.textEdit.document()
+        first = document.findBlock(position).blockNumber()
+        if document.blockCount() != self._blockCount:
+            # Строки сдвинулись: перерисовываем всё ниже изменения
+            self._blockCount = document.blockCount()
+            self.scheduleRender(max(first, 0))
+        else:
+            self.scheduleRender(max(first, 0), document.findBlock(position + added).blockNumber())
+
+    @Slot()
+    def renderDirty(self):
+        if self.textEdit is None or self._dirty is None:
+            return
+        first, last = self._dirty
+        self._dirty = None
+        if self.width() <= 0 or self.height() <= 0:
+            return
+        size = self.size() * self.devicePixelRatioF()
+        top = self.topBlock()
+        if self._cache.size() != size or top != self._top:
+            self._cache = QtGui.QPixmap(size)
+            self._cache.setDevicePixelRatio(self.devicePixelRatioF())
+            self._top = top
+            first, last = top, None
+        rows = self.visibleRows()
+        first = max(first, self._top)
+        last = self._top + rows - 1 if last is None else min(last, self._top + rows - 1)
+        if first <= last:
+            self.renderBlocks(first, last)
+        self.update()
+
+    def renderBlocks(self, first, last):
+        """Paints density bars of blocks first..last into the cache."""
+        painter = QtGui.QPainter(self._cache)
+        y = (first - self._top) * self.lineHeight
+        painter.fillRect(0, y, self.width(), (last - first + 1) * self.lineHeight, self.palette().color(QtGui.QPalette.ColorRole.Base))
+        color = self.palette().color(QtGui.QPalette.ColorRole.Text)
+        color.setAlpha(140)
+        barHeight = max(1, self.lineHeight - 1)
+        block = self.textEdit.document().findBlockByNumber(first)
+        width = self.width()
+        for _ in range(last - first + 1):
+            if not block.isValid():
+                break
+            text = block.text()
+            stripped = text.lstrip()
+            if stripped:
+                x = (len(text) - len(stripped)) * self.charWidth
+                painter.fillRect(x, y, min(len(stripped.rstrip()) * self.charWidth, width - x), barHeight, color)
+            y += self.lineHeight
+            block = block.next()
+        painter.end()
 
     @Slot()
     def syncScroll(self):
-        maxValue = self.textEdit.verticalScrollBar().maximum()
-        if maxValue != 0:
-            value = self.textEdit.verticalScrollBar().value()
-            ratio = value / maxValue
-            self.verticalScrollBar().setValue(int(ratio * self.verticalScrollBar().maximum()))
-        self.viewport().update()
+        if self.textEdit is not None and self.topBlock() != self._top:
+            self.scheduleRender()
+        self.update()
 
     def syncSelection(self):
-        c = QtGui.QTextCursor(self.textEdit.document())
-        c.setPosition(self.textEdit.textCursor().selectionStart())
-        c.setPosition(self.textEdit.textCursor().selectionEnd(), QtGui.QTextCursor.MoveMode.KeepAnchor)
-        self.setTextCursor(c)
-        self.viewport().update()
+        self.update()
 
     @Slot()
     def update_minimap(self):
-        self.setPlainText(self.textEdit.toPlainText())
-        self.syncScroll()
-        self.viewport().update()
+        self._blockCount = self.textEdit.document().blockCount()
+        self._cache = QtGui.QPixmap()
+        self.scheduleRender()
 
     def mousePressEvent(self, event):
         if event.button() == QtCore.Qt.MouseButton.LeftButton:
@@ -102,22 +581,19 @@ class MiniMap(QtWidgets.QTextEdit):
     def mouseMoveEvent(self, event):
         if self._isDragging:
             self.syncScroll_from_position(event.pos())
-            self.textCursor().clearSelection()
         super().mouseMoveEvent(event)
-        self.textCursor().clearSelection()
 
     def mouseReleaseEvent(self, event):
         if event.button() == QtCore.Qt.MouseButton.LeftButton:
-            self.textCursor().clearSelection()
             self._isDragging = False
         super().mouseReleaseEvent(event)
 
     def syncScroll_from_position(self, pos):
-        if self.viewport().height() != 0:
-            ratio = pos.y() / self.viewport().height()
-            value = int(ratio * self.textEdit.verticalScrollBar().maximum())
-            self.textEdit.verticalScrollBar().setValue(value)
-            self.textCursor().clearSelection()
+        blockCount = self.textEdit.document().blockCount()
+        if blockCount > 1:
+            ratio = min(max(self.blockAt(pos.y()), 0), blockCount - 1) / (blockCount - 1)
+            scrollBar = self.textEdit.verticalScrollBar()
+            scrollBar.setValue(int(ratio * scrollBar.maximum()))
 
     def wheelEvent(self, event):
         delta = event.angleDelta().y()
@@ -125,92 +601,273 @@ class MiniMap(QtWidgets.QTextEdit):
         scroll_bar.setValue(int(scroll_bar.value() - delta / 1.5))
 
     def resizeEvent(self, event):
-        self.update_minimap()
         super().resizeEvent(event)
+        if self.textEdit is not None:
+            self.scheduleRender()
 
     def paintEvent(self, event):
-        super().paintEvent(event)
         if self.textEdit is None:
             return
-
-        viewportRect = self.textEdit.viewport().rect()
-        content_rect = self.textEdit.document().documentLayout().blockBoundingRect(self.textEdit.document().firstBlock()).united(
-            self.textEdit.document().documentLayout().blockBoundingRect(self.textEdit.document().lastBlock())
-        )
-
-        viewportHeight = self.viewport().height()
-        contentHeight = content_rect.height()
-        if contentHeight == 0:
-            return
-        scaleFactor = viewportHeight / contentHeight
-
-        visibleRectHeight = viewportRect.height() * scaleFactor
-        visibleRectTop = self.textEdit.verticalScrollBar().value() * scaleFactor
-
-        visibleRect = QtCore.QRectF(
-            0,
-            visibleRectTop,
-            self.viewport().width(),
-            visibleRectHeight
-        )
-
-        painter = QtGui.QPainter(self.viewport())
+        painter = QtGui.QPainter(self)
+        if self._cache.isNull():
+            self.scheduleRender()
+        else:
+            painter.drawPixmap(0, 0, self._cache)
+
+        cursor = self.textEdit.textCursor()
+        if cursor.hasSelection():
+            document = self.textEdit.document()
+            first = document.findBlock(cursor.selectionStart()).blockNumber()
+            last = document.findBlock(cursor.selectionEnd()).blockNumber()
+            painter.fillRect(0, (first - self._top) * self.lineHeight, self.width(),
+                             (last - first + 1) * self.lineHeight, QtGui.QColor(0, 120, 215, 80))
+
+        first = self.textEdit.cursorForPosition(QtCore.QPoint(0, 0)).blockNumber()
+        last = self.textEdit.cursorForPosition(QtCore.QPoint(0, self.textEdit.viewport().height())).blockNumber()
+        visibleRect = QtCore.QRectF(0, (first - self._top) * self.lineHeight, self.width() - 1,
+                                    (max(first, last) - first + 1) * self.lineHeight)
         painter.setBrush(QtGui.QColor(0, 0, 255, 50))
         painter.setPen(QtGui.QColor(0, 0, 255))
         painter.drawRect(visibleRect)
 
 class StandartHighlighter(QtGui.QSyntaxHighlighter):
+    """
+    Подсветка с приоритетом видимой области: за один проход цикла событий блоки
+    подсвечиваются не дольше sliceTime секунд, остальные невидимые блоки откладываются
+    и дописываются по порядку в простое (highlightPending), сохраняя состояния многострочных правил.
+    """
+    sliceTime = 0.02
+    minChunk = 32
+
     def __init__(self, document: QtGui.QTextDocument):
         super().__init__(document)
         self.highlightingRules = {}
         self.multi_line_rules = []
-        self.additData = []
+        self.additLines = {}
+        self.lineOffset = 0
+        self.mergeRules = False
+        self.visibleBlocks = (0, -1)
+        self._rules = []
+        self._mergedRule = None
+        self._separateRules = []
+        self._multiLineRules = []
+        self._passStart = None
+        self._pendingFrom = None
+        self._forceUpTo = -1
+        self._lastHighlighted = -1
+        self._chunk = 64
+        self._idleTimer = QtCore.QTimer(self)
+        self._idleTimer.setSingleShot(True)
+        self._idleTimer.timeout.connect(self.highlightPending)
 
     def addHighlightingRule(self, category, rule):
         if category == "multi_line_strings":
             self.multi_line_rules.append(rule)
+            self._multiLineRules.append((self.compilePattern(rule['start']), self.compilePattern(rule['end']), self.createTextFormat(rule)))
         else:
             self.highlightingRules[category] = rule
+            self.compileRules()
 
-    def addHighlightingData(self, data):
-        self.additData = data
+    def setMergeRules(self, b):
+        """
+        Объединяет все шаблоны в одно регулярное выражение с именованными группами.
+        Быстрее на больших файлах, но перекрывающиеся совпадения разных правил не подсвечиваются.
+        """
+        self.mergeRules = b
+        self.compileRules()
 
-    def highlightBlock(self, text):
-        block_start_line = self.document().findBlockByNumber(self.currentBlock().blockNumber()).blockNumber()
+    def compilePattern(self, pattern):
+        regex = QtCore.QRegularExpression(pattern)
+        regex.optimize()
+        return regex
+
+    # Ссылки на группы по номеру (\1, \g{1}, (?1), (?R), (?(1)...)): при слиянии группы правил перенумеровываются
+    NUMBERED_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*(?:\\[1-9]|\\g\{?\+?\d|\(\?(?:R|\d|\(R|\(\d))")
 
+    def compileRules(self):
+        """Компилирует шаблоны и форматы один раз, чтобы highlightBlock только выполнял поиск."""
+        self._rules = []
         for category, rule in self.highlightingRules.items():
             text_format = self.createTextFormat(rule)
             for pattern in rule['pattern']:
-                regex = QtCore.QRegularExpression(pattern)
-                match = regex.globalMatch(text)
-                while match.hasNext():
-                    match_item = match.next()
-                    start_pos = match_item.capturedStart()
-                    length = match_item.capturedLength()
-                    self.setFormat(start_pos, length, text_format)
-
-        if self.additData:
-            for data in self.additData:
-                if data['line'] == block_start_line:
-                    start_pos, end_pos = data['pos']
-                    text_format = QtGui.QTextCharFormat()
-                    
-                    if 'color' in data:
-                        text_format.setForeground(QtGui.QColor(data['color']))
-                    if 'bg' in data:
-                        text_format.setBackground(QtGui.QColor(data['bg']))
-                    if 'weight' in data:
-                        if data['weight'] == 'bold':
-                            text_format.setFontWeight(QtGui.QFont.Weight.Bold)
-                        elif data['weight'] == 'italic':
-                            text_format.setFontItalic(True)
-
-                    # Устанавливаем формат подсветки на определенные участки
-                    self.setFormat(start_pos, end_pos - start_pos, text_format)
+                regex = self.compilePattern(pattern)
+                if regex.isValid():
+                    self._rules.append((regex, text_format))
+        self._mergedRule = None
+        self._separateRules = self._rules
+        mergeable = [rule for rule in self._rules if not self.NUMBERED_REFERENCE.search(rule[0].pattern())]
+        if self.mergeRules and mergeable:
+            # Номер внешней группы каждого правила: по lastCapturedIndex совпадения бинарным поиском находится правило
+            groups, starts = [], []
+            number = 1
+            for i, (regex, _) in enumerate(mergeable):
+                groups.append(f"(?<r{i}>{regex.pattern()})")
+                starts.append(number)
+                number += regex.captureCount() + 1
+            merged = self.compilePattern("|".join(groups))
+            if merged.isValid():
+                self._mergedRule = (merged, starts, [text_format for _, text_format in mergeable])
+                # Правила со ссылками на группы по номеру выполняются отдельно, после общего выражения
+                self._separateRules = [rule for rule in self._rules if rule not in mergeable]
+
+    @property
+    def additData(self):
+        return [data for line in self.additLines.values() for data, _, _, _ in line]
+
+    def addHighlightingData(self, data):
+        """Заменяет все дополнительные участки подсветки."""
+        lines = set(self.additLines)
+        self.additLines = {}
+        self.addHighlightingSpans(data, lines)
+
+    def addHighlightingSpans(self, data, lines=None):
+        """Добавляет участки подсветки ({'line', 'pos', 'color', 'bg', 'weight'}) и переподсвечивает только их строки."""
+        lines = set(lines or ())
+        for item in data:
+            start_pos, end_pos = item['pos']
+            text_format = self.createTextFormat(item)
+            self.additLines.setdefault(item['line'], []).append((item, start_pos, end_pos - start_pos, text_format))
+            lines.add(item['line'])
+        self.rehighlightLines(lines)
+
+    def removeHighlightingSpans(self, data):
+        """Удаляет участки подсветки и переподсвечивает только их строки."""
+        lines = set()
+        for item in data:
+            spans = self.additLines.get(item['line'])
+            if spans:
+                spans[:] = [span for span in spans if span[0] != item]
+                if not spans:
+                    del self.additLines[item['line']]
+                lines.add(item['line'])
+        self.rehighlightLines(lines)
+
+    def clearHighlightingSpans(self, lines=None):
+        """Очищает участки подсветки на строках lines (или везде)."""
+        lines = set(self.additLines) if lines is None else set(lines)
+        for line in lines:
+            self.additLines.pop(line, None)
+        self.rehighlightLines(lines)
+
+    def rehighlightLines(self, lines):
+        document = self.document()
+        if not document or not lines:
+            return
+        if len(lines) > document.blockCount() // 2:
+            self.rehighlight()
+            return
+        for line in sorted(lines):
+            block = document.findBlockByNumber(line - self.lineOffset)
+            if block.isValid():
+                self.rehighlightBlock(block)
+
+    def _overBudget(self):
+        now = time.perf_counter()
+        if self._passStart is None:
+            self._passStart = now
+            QtCore.QTimer.singleShot(0, self._endPass)
+        return now - self._passStart > self.sliceTime
+
+    def _endPass(self):
+        self._passStart = None
+
+    def isHighlightPending(self):
+        return self._pendingFrom is not None
+
+    def setVisibleBlocks(self, first, last):
+        """Задаёт видимые блоки. Отложенные блоки в видимой области подсвечиваются сразу."""
+        self.visibleBlocks = (first, last)
+        if self._pendingFrom is not None and last >= self._pendingFrom:
+            first = max(first, self._pendingFrom)
+            if first > self._pendingFrom:
+                self._highlightRange(first, last)
+                self._deferFrom(self._pendingFrom)
+            else:
+                self._pendingFrom = None
+                self._continueFrom(self._highlightRange(first, last))
+
+    def highlightPending(self):
+        """Подсвечивает следующую порцию отложенных блоков, подбирая её размер под sliceTime."""
+        if self._pendingFrom is None or not self.document():
+            return
+        first, self._pendingFrom = self._pendingFrom, None
+        start = time.perf_counter()
+        last = self._highlightRange(first, first + self._chunk - 1)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self._chunk = max(self.minChunk, min(self._chunk * 4, int(self._chunk * self.sliceTime / elapsed)))
+        self._continueFrom(last)
+
+    def _highlightRange(self, first, last):
+        """Подсвечивает блоки first..last одним проходом Qt и возвращает номер последнего обработанного блока."""
+        document = self.document()
+        last = min(last, document.blockCount() - 1)
+        begin = document.findBlockByNumber(first)
+        if not begin.isValid():
+            return last
+        # Блоки диапазона получают состояние, которое highlightBlock никогда не ставит,
+        # поэтому Qt проходит их все за один вызов rehighlightBlock
+        block = begin
+        for _ in range(last - first + 1):
+            block.setUserState(-2)
+            block = block.next()
+        passStart, self._passStart = self._passStart, time.perf_counter()
+        self._forceUpTo = last
+        self._lastHighlighted = last
+        try:
+            self.rehighlightBlock(begin)
+        finally:
+            self._passStart = passStart
+            self._forceUpTo = -1
+        return max(last, self._lastHighlighted)
+
+    def _continueFrom(self, last):
+        pending = self._pendingFrom
+        self._pendingFrom = None
+        if pending is not None and pending <= last:
+            pending = None
+        following = last + 1 if last + 1 < self.document().blockCount() else None
+        if pending is not None or following is not None:
+            self._deferFrom(min(n for n in (pending, following) if n is not None))
+
+    def _deferFrom(self, number):
+        if self._pendingFrom is None or number < self._pendingFrom:
+            self._pendingFrom = number
+        self._idleTimer.start(0)
+
+    def highlightBlock(self, text):
+        number = self.currentBlock().blockNumber()
+        if number > self._forceUpTo and not self.visibleBlocks[0] <= number <= self.visibleBlocks[1] and self._overBudget():
+            # Состояние блока не меняется, чтобы Qt не продолжал проход по следующим блокам
+            self.setCurrentBlockState(self.currentBlockState())
+            self._deferFrom(number)
+            return
+        self._lastHighlighted = number
+        block_start_line = number + self.lineOffset
+
+        if self._mergedRule:
+            regex, starts, formats = self._mergedRule
+            match = regex.globalMatch(text)
+            while match.hasNext():
+                match_item = match.next()
+                rule = bisect.bisect_right(starts, match_item.lastCapturedIndex()) - 1
+                group = starts[rule]
+                self.setFormat(match_item.capturedStart(group), match_item.capturedLength(group), formats[rule])
+        for regex, text_format in self._separateRules:
+            match = regex.globalMatch(text)
+            while match.hasNext():
+                match_item = match.next()
+                self.setFormat(match_item.capturedStart(), match_item.capturedLength(), text_format)
+
+        spans = self.additLines.get(block_start_line)
+        if spans:
+            # Устанавливаем формат подсветки на определенные участки
+            for _, start_pos, length, text_format in spans:
+                self.setFormat(start_pos, length, text_format)
 
         self.setCurrentBlockState(0)
 
-        for rule in self.multi_line_rules:
+        for rule in self._multiLineRules:
             self.applyMultilineHighlighting(text, rule)
 
 
@@ -236,11 +893,9 @@ class StandartHighlighter(QtGui.QSyntaxHighlighter):
         """
         Применяет подсветку для многострочных строк.
         :param text: Текст блока.
-        :param rule: Словарь с параметрами (start, end, style).
+        :param rule: Скомпилированное правило (start, end, format).
         """
-        start_delim = QtCore.QRegularExpression(rule['start'])
-        end_delim = QtCore.QRegularExpression(rule['end'])
-        text_format = self.createTextFormat(rule)
+        start_delim, end_delim, text_format = rule
 
         if self.previousBlockState() == 1:
             start = 0
@@ -252,9 +907,11 @@ class StandartHighlighter(QtGui.QSyntaxHighlighter):
             else:
                 self.setFormat(start, len(text), text_format)
                 self.setCurrentBlockState(1)
-            return
+                return
+            match = start_delim.match(text, end)
+        else:
+            match = start_delim.match(text)
 
-        match = start_delim.match(text)
         while match.hasMatch():
             start = match.capturedStart()
             match = end_delim.match(text, start + 1)
@@ -262,18 +919,91 @@ class StandartHighlighter(QtGui.QSyntaxHighlighter):
                 end = match.capturedEnd()
                 self.setFormat(start, end - start, text_format)
                 self.setCurrentBlockState(0)
+                match = start_delim.match(text, end)
             else:
                 self.setFormat(start, len(text) - start, text_format)
                 self.setCurrentBlockState(1)
+                break
 
     def rehighlightBlock(self, block):
         """
         Переподсвечивает определенный блок.
         :param block: QTextBlock для обработки.
         """
-        cursor = QtGui.QTextCursor(block)
-        self.highlightBlock(cursor.block().text())
+        super().rehighlightBlock(block)
+
 
+class WordIndex:
+    """
+    Completion words of a document, kept up to date per changed block.
+    Words are stored in a sorted list with occurrence counts, so a prefix
+    lookup is a binary search plus a scan over the matching words only.
+    """
+    wordRegex = re.compile(r"[^\W\d]\w+")
+
+    def __init__(self, document: QtGui.QTextDocument):
+        self.document = document
+        self.words = []
+        self.counts = {}
+        self._blockWords = []
+        self.rebuild()
+        self.document.contentsChange.connect(self.onContentsChange)
+
+    def rebuild(self):
+        self.words, self.counts, self._blockWords = [], {}, []
+        block = self.document.begin()
+        while block.isValid():
+            words = self.wordRegex.findall(block.text())
+            self._blockWords.append(words)
+            self._add(words)
+            block = block.next()
+
+    def _add(self, words):
+        for word in words:
+            count = self.counts.get(word)
+            if count:
+                self.counts[word] = count + 1
+            else:
+                self.counts[word] = 1
+                bisect.insort(self.words, word)
+
+    def _remove(self, words):
+        for word in words:
+            count = self.counts[word] - 1
+            if count:
+                self.counts[word] = count
+            else:
+                del self.counts[word]
+                del self.words[bisect.bisect_left(self.words, word)]
+
+    def onContentsChange(self, position, removed, added):
+        first = self.document.findBlock(position)
+        last = self.document.findBlock(position + added)
+        if not last.isValid():
+            last = self.document.lastBlock()
+        start = first.blockNumber()
+        newCount = last.blockNumber() - start + 1
+        oldCount = newCount - (self.document.blockCount() - len(self._blockWords))
+        for words in self._blockWords[start:start + oldCount]:
+            self._remove(words)
+        newWords = []
+        block = first
+        for _ in range(newCount):
+            words = self.wordRegex.findall(block.text())
+            newWords.append(words)
+            self._add(words)
+            block = block.next()
+        self._blockWords[start:start + oldCount] = newWords
+
+    def complete(self, prefix, limit=50):
+        """Returns up to limit words starting with prefix, most frequent first."""
+        i = bisect.bisect_left(self.words, prefix)
+        found = []
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            if self.words[i] != prefix or self.counts[prefix] > 1:
+                found.append(self.words[i])
+            i += 1
+        return heapq.nlargest(limit, found, key=self.counts.__getitem__)
 
 class StandartCompleter(QCompleter):
     insertText = QtCore.Signal(str)
@@ -291,8 +1021,7 @@ class StandartCompleter(QCompleter):
     def getSelected(self):
         return self.lastSelected
 
-    def updateModel(self, text: str):
-        words = list(set(text.split()))
+    def setWords(self, words):
         self.model.setStringList(words)
     
     def updateCompletions(self, completions):
@@ -307,46 +1036,64 @@ class LineNumberArea(QtWidgets.QWidget):
         super().__init__(text_edit)
         self.text_edit = text_edit
         self.text_edit.viewport().installEventFilter(self)
-        self.text_edit.verticalScrollBar().valueChanged.connect(self.update)
-        self.text_edit.textChanged.connect(self.update)
+        self.text_edit.verticalScrollBar().valueChanged.connect(self.scheduleUpdate)
+        self.text_edit.textChanged.connect(self.scheduleUpdate)
         self.font = self.text_edit.font()
+        self._digits = 0
+        self._paintedState = None
 
         self.update_width()
 
     def update_width(self):
-        """Updates the width of the line number area."""
-        block_count = self.text_edit.document().blockCount()
+        """Updates the width of the line number area when the number of digits changes."""
+        block_count = self.text_edit.firstLine + self.text_edit.document().blockCount()
         digits = len(str(max(1, block_count)))
+        if digits == self._digits:
+            return
+        self._digits = digits
         font_metrics = QtGui.QFontMetrics(self.font)
         self.setFixedWidth(10 + font_metrics.horizontalAdvance("9") * digits)
 
+    def viewState(self):
+        """What the painted numbers depend on: scroll position, text revision, viewport size, window offset."""
+        return (
+            self.text_edit.verticalScrollBar().value(),
+            self.text_edit.document().revision(),
+            self.text_edit.viewport().size(),
+            self.text_edit.firstLine,
+        )
+
+    def scheduleUpdate(self, *args):
+        """Requests a repaint only if the numbers could have changed; Qt merges repeated requests."""
+        if self.viewState() != self._paintedState:
+            self.update()
+
     def paintEvent(self, event):
-        """Paint line numbers."""
+        """Paint line numbers of the visible blocks."""
         painter = QtGui.QPainter(self)
+        self._paintedState = self.viewState()
 
-        block = self.text_edit.document().begin()
-        block_number = block.blockNumber()
+        layout = self.text_edit.document().documentLayout()
+        block = self.text_edit.cursorForPosition(QtCore.QPoint(0, event.rect().top())).block()
+        block_number = block.blockNumber() + self.text_edit.firstLine
         top = -self.text_edit.verticalScrollBar().value()
         font_metrics = QtGui.QFontMetrics(self.text_edit.font())
 
         while block.isValid():
-            block_geometry = self.text_edit.document().documentLayout().blockBoundingRect(block)
+            block_geometry = layout.blockBoundingRect(block)
             block_top = int(block_geometry.translated(0, top).top())
-            block_bottom = block_top + int(block_geometry.height())
 
             if block_top > event.rect().bottom():
                 break
 
-            if block_bottom >= event.rect().top():
-                number = str(block_number + 1)
-                painter.drawText(
-                    0,
-                    block_top,
-                    self.width(),
-                    font_metrics.height(),
-                    QtCore.Qt.AlignRight,
-                    number,
-                )
+            painter.drawText(
+                0,
+                block_top,
+                self.width(),
+                font_metrics.height(),
+                QtCore.Qt.AlignRight,
+                str(block_number + 1),
+            )
 
             block = block.next()
             block_number += 1
@@ -354,16 +1101,26 @@ class LineNumberArea(QtWidgets.QWidget):
     def eventFilter(self, obj, event):
         """Handle events from the text edit viewport."""
         if obj == self.text_edit.viewport() and event.type() == QtCore.QEvent.Paint:
-            self.update()
+            self.scheduleUpdate()
         return super().eventFilter(obj, event)
 
 class TextEdit(QtWidgets.QTextEdit):
+    windowLines = 2000
+
     def __init__(self, mw):
         super().__init__()
 
         self.change_event = False
 
         self.mw = mw
+        self.largeFile = None
+        self.finder = None
+        self.largeFileThreshold = (getattr(mw, "settData", None) or {}).get("largeFileThreshold") or LARGE_FILE_THRESHOLD
+        self.firstLine = 0
+        self._windowCount = 0
+        self._shifting = False
+        self._indexTimer = QtCore.QTimer(self)
+        self._indexTimer.timeout.connect(self._indexLargeFile)
         self.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
         self.customContextMenuRequested.connect(self.contextMenu)
         self.setShortcutEnabled(False)
@@ -379,6 +1136,7 @@ class TextEdit(QtWidgets.QTextEdit):
 
         self.minimapScrollArea = QtWidgets.QScrollArea()
         self.minimapScrollArea.setWidget(self.minimap)
+        self.minimapScrollArea.setWidgetResizable(True)
         self.minimapScrollArea.setFixedWidth(150)
         self.minimapScrollArea.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
         # self.minimapScrollArea.customContextMenuRequested.connect(self.minimap.contextMenu)
@@ -393,12 +1151,110 @@ class TextEdit(QtWidgets.QTextEdit):
 
         self.highLighter = StandartHighlighter(self.document())
         self.highLighter.setDocument(self.document())
+        self.wordIndex = WordIndex(self.document())
+
+        self.verticalScrollBar().valueChanged.connect(self.updateVisibleBlocks)
+        self.document().blockCountChanged.connect(self.updateVisibleBlocks)
 
-        self.textChanged.connect(self.update_line_number_width)
+        self.document().blockCountChanged.connect(self.update_line_number_width)
 
     def update_line_number_width(self):
         self.line_number_area.update_width()
 
+    def updateVisibleBlocks(self, *args):
+        first = self.cursorForPosition(QtCore.QPoint(0, 0)).blockNumber()
+        last = self.cursorForPosition(QtCore.QPoint(0, self.viewport().height())).blockNumber()
+        self.highLighter.setVisibleBlocks(first, max(first, last))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.updateVisibleBlocks()
+
+    def openLargeFile(self, path, encoding="utf-8"):
+        """Shows the file through a LargeFileBuffer, keeping only windowLines lines in the document."""
+        if self.largeFile:
+            self.largeFile.close()
+        else:
+            self.verticalScrollBar().valueChanged.connect(self._largeFileScroll)
+            self.mw.api.activeWindow.signals.fileSaved.connect(self._largeFileSaved)
+        self.largeFile = LargeFileBuffer(path, encoding)
+        self.document().setModified(False)
+        self.loadWindow(0)
+        self.document().clearUndoRedoStacks()
+        self._indexTimer.start(0)
+
+    def closeLargeFile(self):
+        if self.largeFile:
+            self._indexTimer.stop()
+            self.largeFile.close()
+            self.largeFile = None
+            self.firstLine = self._windowCount = 0
+
+    def _indexLargeFile(self):
+        if not self.largeFile or not self.largeFile.indexMore():
+            self._indexTimer.stop()
+
+    def commitWindow(self):
+        """Writes edits made in the visible window back into the large file buffer."""
+        if self.largeFile and self.document().isModified():
+            self.largeFile.replaceLines(self.firstLine, self.firstLine + self._windowCount, self.toPlainText().split("\n"))
+            self._windowCount = self.document().blockCount()
+            self.document().setModified(False)
+
+    def loadWindow(self, first):
+        self.commitWindow()
+        lines = self.largeFile.lines(max(first, 0), max(first, 0) + self.windowLines)
+        if not lines and first > 0:
+            first = max(self.largeFile.lineCount() - self.windowLines, 0)
+            lines = self.largeFile.lines(first, first + self.windowLines)
+        self.firstLine = max(first, 0)
+        self.highLighter.lineOffset = self.firstLine
+        self._windowCount = len(lines)
+        self._shifting = True
+        self.setPlainText("\n".join(lines))
+        self.document().setModified(False)
+        self._shifting = False
+        self.textLen.cache_clear()
+        self.line_number_area.update_width()
+
+    def reloadWindow(self):
+        value = self.verticalScrollBar().value()
+        self.loadWindow(self.firstLine)
+        self._shifting = True
+        self.verticalScrollBar().setValue(value)
+        self._shifting = False
+
+    def _largeFileScroll(self, value):
+        if not self.largeFile or self._shifting:
+            return
+        sb = self.verticalScrollBar()
+        if not sb.maximum():
+            return
+        step = self.windowLines // 2
+        if value >= sb.maximum() * 0.9:
+            end = self.firstLine + self._windowCount
+            if not self.largeFile.lines(end, end + 1):
+                return
+            first = self.firstLine + step
+        elif value <= sb.maximum() * 0.1 and self.firstLine > 0:
+            first = max(self.firstLine - step, 0)
+        else:
+            return
+        top = self.firstLine + self.cursorForPosition(QtCore.QPoint(0, 0)).blockNumber()
+        self.loadWindow(first)
+        block = self.document().findBlockByNumber(top - self.firstLine)
+        self._shifting = True
+        self.setTextCursor(QtGui.QTextCursor(block))
+        sb.setValue(int(self.document().documentLayout().blockBoundingRect(block).top()))
+        self._shifting = False
+
+    def _largeFileSaved(self, *args):
+        if self.largeFile and self.largeFile.isStale():
+            self.document().setModified(False)
+            self.largeFile.reload()
+            self.reloadWindow()
+            self._indexTimer.start(0)
+
     def update_line_number_area(self):
         self.line_number_area.update()
 
@@ -418,6 +1274,31 @@ class TextEdit(QtWidgets.QTextEdit):
         self.mw.api.activeWindow.signals.textChanged.emit()
         self.change_event = False
 
+    def applyEdits(self, edits):
+        """
+        Применяет правки [(begin, end, text)] (позиции в тексте до правок, без пересечений, по возрастанию,
+        прижимаются к границам текста) курсором с конца документа к началу, одним шагом отмены. Подсветка пересчитывает только измененные блоки.
+        """
+        self.change_event = True
+        cursor = QtGui.QTextCursor(self.document())
+        last = self.document().characterCount() - 1
+        cursor.beginEditBlock()
+        try:
+            for begin, end, text in reversed(edits):
+                # Позиции за концом текста прижимаются к нему, как в substr
+                cursor.setPosition(max(0, min(begin, last)))
+                cursor.setPosition(max(0, min(end, last)), QtGui.QTextCursor.MoveMode.KeepAnchor)
+                if text:
+                    cursor.insertText(text)
+                elif cursor.hasSelection():
+                    cursor.removeSelectedText()
+        finally:
+            cursor.endEditBlock()
+            self.textLen.cache_clear()
+            self.change_event = False
+        self.mw.api.activeWindow.signals.textChanged.emit()
+        return cursor
+
     def contextMenu(self, pos):
         self.mw.textContextMenu.exec(self.mapToGlobal(pos))
 
@@ -455,13 +1336,14 @@ class TextEdit(QtWidgets.QTextEdit):
             self.completer.insertText.emit(self.completer.getSelected())
             self.completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
             return
-        self.completer.updateModel(self.toPlainText())
 
         tc.select(QTextCursor.SelectionType.WordUnderCursor)
         cr = self.cursorRect()
+        prefix = tc.selectedText()
 
-        if len(tc.selectedText()) > 0 and event.text().isprintable():
-            self.completer.setCompletionPrefix(tc.selectedText())
+        if len(prefix) > 0 and event.text().isprintable():
+            self.completer.setWords(self.wordIndex.complete(prefix))
+            self.completer.setCompletionPrefix(prefix)
             popup = self.completer.popup()
             popup.setCurrentIndex(self.completer.completionModel().index(0, 0))
 
@@ -644,7 +1526,18 @@ class Tag(QtWidgets.QWidget):
         layout.addWidget(self.closeButton)
 
     def mouseDoubleClickEvent(self, a0):
-        self.api.activeWindow.runCommand({"command": "GetFilesForTagCommand", "kwargs": {"tag": self.text}})
+        window = self.api.activeWindow
+        # Запрос идет по индексу и кешу базы тегов в ее потоке, интерфейс не ждет
+        window.findTagFiles(f'"{self.text}"', callback=functools.partial(self.filesFound, window, self.text))
+
+    def filesFound(self, window, tag, files):
+        window.signals.tagFilesFound.emit(tag, files)
+        kwargs = {"tag": tag}
+        command = (window.getCommand("GetFilesForTagCommand") or {}).get("command")
+        if command is not None and "files" in inspect.signature(command.run).parameters:
+            # Найденные файлы передаются команде, чтобы она не искала их еще раз
+            kwargs["files"] = files
+        window.runCommand({"command": "GetFilesForTagCommand", "kwargs": kwargs})
 
     def closeTag(self):
         self.onClose(self.text)
@@ -738,198 +1631,517 @@ class TagContainer(QtWidgets.QFrame):
         
         self.moreMenu.exec(self.moreButton.mapToGlobal(QtCore.QPoint(0, self.moreButton.height())))
 
+class TagQuery:
+    """
+    Разбирает логическое выражение над тегами и строит по нему один SQL запрос.
+    Синтаксис: "python AND (test OR spec) AND NOT draft", "py*" - префикс, "#tag" == "tag",
+    AND можно опускать, также поддерживаются &, |, ! и "теги в кавычках".
+    """
+    TOKENS = re.compile(r'\s*(?:(\()|(\))|(&&?|\|\|?|!)|"([^"]*)"|([^\s()&|!"]+))')
+    OPERATORS = {"&": "AND", "&&": "AND", "|": "OR", "||": "OR", "!": "NOT"}
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = self.tokenize(expression)
+        self.pos = 0
+        self.sql, self.params = self.parseOr()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.pos][1]}' in tag query '{expression}'")
+
+    @classmethod
+    def tokenize(cls, expression: str):
+        tokens, pos = [], 0
+        expression = expression.strip()
+        while pos < len(expression):
+            match = cls.TOKENS.match(expression, pos)
+            if not match:
+                raise ValueError(f"Can't parse tag query '{expression}'")
+            pos = match.end()
+            opened, closed, op, quoted, word = match.groups()
+            if opened or closed:
+                tokens.append(("paren", opened or closed))
+            elif op:
+                tokens.append(("op", cls.OPERATORS[op]))
+            elif quoted is not None:
+                tokens.append(("tag", quoted))
+            elif word.upper() in ("AND", "OR", "NOT"):
+                tokens.append(("op", word.upper()))
+            else:
+                tokens.append(("tag", word[1:] if word.startswith("#") and len(word) > 1 else word))
+        return tokens
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def parseOr(self):
+        sql, params = self.parseAnd()
+        while self.peek() == ("op", "OR"):
+            self.pos += 1
+            right, rightParams = self.parseAnd()
+            sql, params = f"SELECT id FROM ({sql}) UNION SELECT id FROM ({right})", params + rightParams
+        return sql, params
+
+    def parseAnd(self):
+        """NOT внутри AND раскрывается в EXCEPT, чтобы не вычитать из всех файлов"""
+        sql, params, negated = self.parseNot()
+        while self.peek()[0] == "tag" or self.peek() in (("op", "AND"), ("op", "NOT"), ("paren", "(")):
+            if self.peek() == ("op", "AND"):
+                self.pos += 1
+            right, rightParams, rightNegated = self.parseNot()
+            if negated and rightNegated:
+                sql, params = f"SELECT id FROM ({sql}) UNION SELECT id FROM ({right})", params + rightParams
+            elif negated:
+                sql, params, negated = f"SELECT id FROM ({right}) EXCEPT SELECT id FROM ({sql})", rightParams + params, False
+            elif rightNegated:
+                sql, params = f"SELECT id FROM ({sql}) EXCEPT SELECT id FROM ({right})", params + rightParams
+            else:
+                sql, params = f"SELECT id FROM ({sql}) INTERSECT SELECT id FROM ({right})", params + rightParams
+        if negated:
+            sql = f"SELECT id FROM files EXCEPT SELECT id FROM ({sql})"
+        return sql, params
+
+    def parseNot(self):
+        if self.peek() == ("op", "NOT"):
+            self.pos += 1
+            sql, params, negated = self.parseNot()
+            return sql, params, not negated
+        kind, value = self.peek()
+        self.pos += 1
+        if (kind, value) == ("paren", "("):
+            sql, params = self.parseOr()
+            if self.peek() != ("paren", ")"):
+                raise ValueError(f"Missing ')' in tag query '{self.expression}'")
+            self.pos += 1
+            return sql, params, False
+        if kind != "tag":
+            raise ValueError(f"Expected tag in tag query '{self.expression}'")
+        if value.endswith("*") and len(value) > 1:
+            prefix = value[:-1]
+            # Файл с несколькими тегами на этот префикс - один раз
+            return ("SELECT DISTINCT file_id AS id FROM file_tags WHERE tag_id IN (SELECT id FROM tags WHERE tag >= ? AND tag < ?)",
+                [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)], False)
+        return "SELECT file_id AS id FROM file_tags WHERE tag_id = (SELECT id FROM tags WHERE tag = ?)", [value], False
+
 class TagDB:
-    def __init__(self, dbFile: str):
+    """
+    Хранилище тегов файлов (SQLite через QtSql).
+    Имена файлов и тегов уникальны (UNIQUE индексы), одиночные операции - один-три подготовленных запроса,
+    пакетные операции (addTags, tagFiles, retag, importTags) выполняются одной транзакцией одним подготовленным запросом.
+    Результаты чтения кешируются до следующего изменения базы (или сигналов fileTagAdded/fileTagRemoved).
+    """
+    cacheSize = 512
+
+    def __init__(self, dbFile: str, name: str = None):
         self.dbFile = dbFile
-        self.db = QSqlDatabase.addDatabase('QSQLITE')
+        self._depth = 0
+        self._failed = False
+        self._error = ""
+        self._cache = {}
+        self.db = QSqlDatabase.addDatabase('QSQLITE', name) if name else QSqlDatabase.addDatabase('QSQLITE')
         self.db.setDatabaseName(dbFile)
         if not self.db.open():
             print(f"Ошибка при подключении к базе данных: {self.db.lastError().text()}")
         else:
             self._createTables()
 
-    def _createTables(self):
+    def _exec(self, sql: str, *values):
         query = QSqlQuery(self.db)
-        query.prepare("""
-        CREATE TABLE IF NOT EXISTS files (
-            id INTEGER PRIMARY KEY,
-            filename TEXT UNIQUE NOT NULL
-        )""")
-        if not query.exec():
-            print(f"Ошибка создания таблицы files: {query.lastError().text()}")
-        
-        query.prepare("""
-        CREATE TABLE IF NOT EXISTS tags (
-            id INTEGER PRIMARY KEY,
-            tag TEXT NOT NULL
-        )""")
+        query.prepare(sql)
+        for value in values:
+            query.addBindValue(value)
         if not query.exec():
-            print(f"Ошибка создания таблицы tags: {query.lastError().text()}")
-        
-        query.prepare("""
-        CREATE TABLE IF NOT EXISTS file_tags (
-            file_id INTEGER,
-            tag_id INTEGER,
-            FOREIGN KEY (file_id) REFERENCES files(id),
-            FOREIGN KEY (tag_id) REFERENCES tags(id),
-            PRIMARY KEY (file_id, tag_id)
+            self._error = query.lastError().text()
+            print(f"Ошибка выполнения запроса: {self._error}")
+            self._failed = True
+            return None
+        return query
+
+    def _batch(self, sql: str, *columns):
+        """Выполняет запрос для каждой строки столбцов (один подготовленный запрос)"""
+        query = QSqlQuery(self.db)
+        query.prepare(sql)
+        # execBatch в PySide6 растет квадратично на больших списках, повторный exec того же запроса - нет
+        for row in zip(*columns):
+            for i, value in enumerate(row):
+                query.bindValue(i, value)
+            if not query.exec():
+                self._error = query.lastError().text()
+                print(f"Ошибка выполнения запроса: {self._error}")
+                self._failed = True
+                return False
+        return True
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Транзакция; вложенные вызовы входят во внешнюю. Если какой-то запрос не выполнился, транзакция откатывается"""
+        self._depth += 1
+        if self._depth == 1:
+            self._failed = False
+            self.db.transaction()
+        try:
+            yield self
+        except Exception:
+            self._failed = True
+            raise
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                if self._failed:
+                    self.db.rollback()
+                elif not self.db.commit():
+                    self._failed, self._error = True, self.db.lastError().text()
+                    print(f"Ошибка сохранения транзакции: {self._error}")
+                    self.db.rollback()
+
+    def apply(self, operations):
+        """
+        Выполняет операции [(метод, args)] одной транзакцией, каждую в своей точке сохранения:
+        ошибка одной операции откатывает только ее. Возвращает [(результат, исключение или None)].
+        """
+        results = []
+        with self.transaction():
+            for name, args in operations:
+                self._exec("SAVEPOINT operation")
+                self._failed = False
+                try:
+                    result, error = getattr(self, name)(*args), None
+                except Exception as e:
+                    result, error = None, e
+                if error is None and self._failed:
+                    error = RuntimeError(f"TagDB.{name} failed: {self._error}")
+                if error is not None:
+                    self._exec("ROLLBACK TO operation")
+                self._exec("RELEASE operation")
+                self._failed = False
+                results.append((result, error))
+        return results
+
+    def _createTables(self):
+        for pragma in ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA foreign_keys=ON"):
+            self._exec(pragma)
+        with self.transaction():
+            self._exec("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                filename TEXT UNIQUE NOT NULL
+            )""")
+            self._exec("""
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY,
+                tag TEXT NOT NULL
+            )""")
+            self._exec("""
+            CREATE TABLE IF NOT EXISTS file_tags (
+                file_id INTEGER,
+                tag_id INTEGER,
+                FOREIGN KEY (file_id) REFERENCES files(id),
+                FOREIGN KEY (tag_id) REFERENCES tags(id),
+                PRIMARY KEY (file_id, tag_id)
+            )""")
+            # В старых базах tags.tag не был уникальным: сливаем дубликаты перед созданием индекса
+            if not self._column(self._exec("SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'tags_tag'")):
+                self._mergeDuplicateTags()
+            self._exec("CREATE UNIQUE INDEX IF NOT EXISTS tags_tag ON tags (tag)")
+            self._exec("CREATE INDEX IF NOT EXISTS file_tags_tag ON file_tags (tag_id, file_id)")
+
+    def _mergeDuplicateTags(self):
+        self._exec("""
+        UPDATE OR IGNORE file_tags SET tag_id = (
+            SELECT MIN(t.id) FROM tags t WHERE t.tag = (SELECT tag FROM tags WHERE id = file_tags.tag_id)
         )""")
-        if not query.exec():
-            print(f"Ошибка создания таблицы file_tags: {query.lastError().text()}")
+        self._exec("DELETE FROM file_tags WHERE tag_id NOT IN (SELECT MIN(id) FROM tags GROUP BY tag)")
+        self._exec("DELETE FROM tags WHERE id NOT IN (SELECT MIN(id) FROM tags GROUP BY tag)")
+
+    def invalidate(self, *args):
+        """Сбрасывает кеш результатов запросов"""
+        self._cache.clear()
+
+    def _cached(self, key, sql: str, params, columns: int = 1):
+        if key in self._cache:
+            return self._cache[key]
+        query = self._exec(sql, *params)
+        if query is None:
+            return ()
+        rows = []
+        while query.next():
+            rows.append(query.value(0) if columns == 1 else tuple(query.value(i) for i in range(columns)))
+        if len(self._cache) >= self.cacheSize:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = rows = tuple(rows)
+        return rows
+
+    def _upsert(self, table: str, column: str, value: str):
+        query = self._exec(f"INSERT INTO {table} ({column}) VALUES (?) ON CONFLICT ({column}) DO UPDATE SET {column} = excluded.{column} RETURNING id", value)
+        if query is not None and query.next():
+            return query.value(0)
+        return None
 
     def addFile(self, filename: str):
-        query = QSqlQuery(self.db)
-        query.prepare("INSERT OR IGNORE INTO files (filename) VALUES (?)")
-        query.addBindValue(filename)
-        if not query.exec():
-            print(f"Ошибка добавления файла: {query.lastError().text()}")
+        """Добавляет файл, возвращает его id"""
+        self.invalidate()
+        return self._upsert("files", "filename", filename)
 
     def addTag(self, filename: str, tag: str):
-        query = QSqlQuery(self.db)
-
-        # Проверяем, существует ли файл в базе данных
-        query.prepare("SELECT id FROM files WHERE filename = ?")
-        query.addBindValue(filename)
-        if not query.exec():
-            print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-            return
-        if query.next():
-            fileId = query.value(0)
-        else:
-            # Добавляем файл, если его нет в базе
-            self.addFile(filename)
-            query.prepare("SELECT id FROM files WHERE filename = ?")
-            query.addBindValue(filename)
-            if not query.exec():
-                print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-                return
-            query.next()
-            fileId = query.value(0)
-
-        # Проверяем, существует ли тег в базе данных
-        query.prepare("SELECT id FROM tags WHERE tag = ?")
-        query.addBindValue(tag)
-        if not query.exec():
-            print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-            return
-        if query.next():
-            tagId = query.value(0)
-        else:
-            # Добавляем новый тег, если его нет в базе
-            query.prepare("INSERT INTO tags (tag) VALUES (?)")
-            query.addBindValue(tag)
-            if not query.exec():
-                print(f"Ошибка добавления тега: {query.lastError().text()}")
-                return
-            query.prepare("SELECT id FROM tags WHERE tag = ?")
-            query.addBindValue(tag)
-            if not query.exec():
-                print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-                return
-            query.next()
-            tagId = query.value(0)
-
-        # Добавляем связь между файлом и тегом
-        query.prepare("INSERT OR IGNORE INTO file_tags (file_id, tag_id) VALUES (?, ?)")
-        query.addBindValue(fileId)
-        query.addBindValue(tagId)
-        if not query.exec():
-            print(f"Ошибка добавления связи: {query.lastError().text()}")
+        self.invalidate()
+        with self.transaction():
+            fileId = self.addFile(filename)
+            tagId = self._upsert("tags", "tag", tag)
+            if fileId is not None and tagId is not None:
+                self._exec("INSERT OR IGNORE INTO file_tags (file_id, tag_id) VALUES (?, ?)", fileId, tagId)
 
     def removeTag(self, filename: str, tag: str):
-        query = QSqlQuery(self.db)
-
-        # Находим ID файла
-        query.prepare("SELECT id FROM files WHERE filename = ?")
-        query.addBindValue(filename)
-        if not query.exec():
-            print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-            return
-        if not query.next():
-            return
-        fileId = query.value(0)
-
-        # Находим ID тега
-        query.prepare("SELECT id FROM tags WHERE tag = ?")
-        query.addBindValue(tag)
-        if not query.exec():
-            print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-            return
-        if not query.next():
-            return
-        tagId = query.value(0)
-
-        # Удаляем связь между файлом и тегом
-        query.prepare("DELETE FROM file_tags WHERE file_id = ? AND tag_id = ?")
-        query.addBindValue(fileId)
-        query.addBindValue(tagId)
-        if not query.exec():
-            print(f"Ошибка удаления связи: {query.lastError().text()}")
-
-    def getTagsForFile(self, filename: str):
-        query = QSqlQuery(self.db)
-
-        # Получаем ID файла
-        query.prepare("SELECT id FROM files WHERE filename = ?")
-        query.addBindValue(filename)
-        if not query.exec():
-            print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-            return []
-        if query.next():
-            fileId = query.value(0)
-        else:
+        self.invalidate()
+        self._exec("""
+        DELETE FROM file_tags
+        WHERE file_id = (SELECT id FROM files WHERE filename = ?)
+        AND tag_id = (SELECT id FROM tags WHERE tag = ?)
+        """, filename, tag)
+
+    def addFiles(self, filenames):
+        self.invalidate()
+        with self.transaction():
+            return self._batch("INSERT OR IGNORE INTO files (filename) VALUES (?)", dict.fromkeys(filenames))
+
+    def addTags(self, pairs):
+        """Добавляет пары (файл, тег) одной транзакцией"""
+        pairs = list(pairs)
+        if not pairs:
+            return True
+        self.invalidate()
+        with self.transaction():
+            return (self._batch("INSERT OR IGNORE INTO files (filename) VALUES (?)", dict.fromkeys(f for f, _ in pairs))
+                and self._batch("INSERT OR IGNORE INTO tags (tag) VALUES (?)", dict.fromkeys(t for _, t in pairs))
+                and self._batch("""
+                INSERT OR IGNORE INTO file_tags (file_id, tag_id)
+                SELECT files.id, tags.id FROM files, tags WHERE files.filename = ? AND tags.tag = ?
+                """, [f for f, _ in pairs], [t for _, t in pairs]))
+
+    def tagFiles(self, filenames, tags):
+        """Ставит все теги tags на все файлы filenames"""
+        tags = list(tags)
+        return self.addTags((f, t) for f in filenames for t in tags)
+
+    def retag(self, filename: str, tags):
+        """Заменяет теги файла на tags"""
+        self.invalidate()
+        with self.transaction():
+            self._exec("DELETE FROM file_tags WHERE file_id = (SELECT id FROM files WHERE filename = ?)", filename)
             self.addFile(filename)
-            query.prepare("SELECT id FROM files WHERE filename = ?")
-            query.addBindValue(filename)
-            if not query.exec():
-                print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-                return []
-            query.next()
-            fileId = query.value(0)
-
-        query.prepare("""
-        SELECT tags.tag FROM tags
-        JOIN file_tags ON file_tags.tag_id = tags.id
-        WHERE file_tags.file_id = ?
+            return self.addTags((filename, t) for t in tags)
+
+    def importTags(self, data: dict, replace: bool = False):
+        """Импортирует {файл: [теги]}; replace=True заменяет существующие теги этих файлов"""
+        self.invalidate()
+        with self.transaction():
+            if replace:
+                self._batch("DELETE FROM file_tags WHERE file_id = (SELECT id FROM files WHERE filename = ?)", list(data))
+            self.addFiles(data)
+            return self.addTags((f, t) for f, tags in data.items() for t in tags)
+
+    def exportTags(self) -> dict:
+        """Возвращает {файл: [теги]} для всех файлов с тегами"""
+        query = self._exec("""
+        SELECT files.filename, tags.tag FROM file_tags
+        JOIN files ON files.id = file_tags.file_id
+        JOIN tags ON tags.id = file_tags.tag_id
+        ORDER BY files.filename, tags.tag
         """)
-        query.addBindValue(fileId)
-        if not query.exec():
-            print(f"Ошибка выполнения запроса: {query.lastError().text()}")
-            return []
+        data = {}
+        while query is not None and query.next():
+            data.setdefault(query.value(0), []).append(query.value(1))
+        return data
 
-        tags = []
-        while query.next():
-            tags.append(query.value(0))
-        return tags
+    def _column(self, query):
+        values = []
+        while query is not None and query.next():
+            values.append(query.value(0))
+        return values
 
-    def getFilesForTag(self, tag: str):
-        query = QSqlQuery(self.db)
+    def getTagsForFile(self, filename: str):
+        return list(self._cached(("tags", filename), """
+        SELECT tags.tag FROM files
+        JOIN file_tags ON file_tags.file_id = files.id
+        JOIN tags ON tags.id = file_tags.tag_id
+        WHERE files.filename = ?
+        """, [filename]))
 
-        query.prepare("SELECT id FROM tags WHERE tag = ?")
-        query.addBindValue(tag)
-        if not query.exec():
-            print(f"Error executing query: {query.lastError().text()}")
-            return []
-        if query.next():
-            tagId = query.value(0)
+    def getFilesForTag(self, tag: str):
+        return list(self._cached(("files", tag), """
+        SELECT files.filename FROM tags
+        JOIN file_tags ON file_tags.tag_id = tags.id
+        JOIN files ON files.id = file_tags.file_id
+        WHERE tags.tag = ?
+        """, [tag]))
+
+    def queryFiles(self, expression: str):
+        """Файлы, подходящие под выражение TagQuery, отсортированные по имени"""
+        key = ("query", expression.strip())
+        if key not in self._cache:
+            query = TagQuery(expression)
+            self._cached(key, f"SELECT filename FROM files WHERE id IN ({query.sql}) ORDER BY filename", query.params)
+        return list(self._cache.get(key, ()))
+
+    def countFiles(self, expression: str) -> int:
+        """Количество файлов, подходящих под выражение TagQuery"""
+        key = ("count", expression.strip())
+        if key not in self._cache:
+            query = TagQuery(expression)
+            self._cached(key, f"SELECT COUNT(*) FROM ({query.sql})", query.params)
+        return (self._cache.get(key) or (0,))[0]
+
+    def tagCounts(self, prefix: str = "") -> dict:
+        """{тег: количество файлов} для тегов, начинающихся с prefix"""
+        sql = """
+        SELECT tags.tag, COUNT(file_tags.file_id) FROM tags
+        LEFT JOIN file_tags ON file_tags.tag_id = tags.id
+        {}GROUP BY tags.id ORDER BY tags.tag
+        """
+        if prefix:
+            rows = self._cached(("counts", prefix), sql.format("WHERE tags.tag >= ? AND tags.tag < ? "), [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)], 2)
+        else:
+            rows = self._cached(("counts", prefix), sql.format(""), [], 2)
+        return dict(rows)
+
+class TagService(QtCore.QObject):
+    """
+    TagDB в отдельном потоке: соединение QSqlDatabase создается и используется только в нем, интерфейс не ждет диск.
+    Запись (addTag, removeTag, retag...) возвращает Future сразу: операции копятся и раз в flushInterval мс
+    выполняются одной транзакцией (result() у Future отправляет накопленное сразу). Чтение без callback ждет результат
+    (накопленная запись выполняется перед ним), с callback - возвращает Future, а callback(result) вызывается в потоке интерфейса.
+    После close() новые операции сразу завершаются ошибкой RuntimeError.
+    """
+    flushInterval = 0.2
+    delivered = QtCore.Signal(object, object)
+
+    class WriteFuture(Future):
+        def __init__(self, service):
+            super().__init__()
+            self.service = service
+
+        def result(self, timeout=None):
+            self.service.flush()
+            return super().result(timeout)
+
+        def exception(self, timeout=None):
+            self.service.flush()
+            return super().exception(timeout)
+
+    def __init__(self, dbFile: str, parent=None):
+        super().__init__(parent)
+        self.dbFile = dbFile
+        self.name = f"tagdb-{uuid.uuid4().hex[:8]}"
+        self.db = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flushTimer = None
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vt-tagdb")
+        self._executor.submit(self._open)
+        self.delivered.connect(self._deliver, QtCore.Qt.ConnectionType.QueuedConnection)
+
+    def _open(self):
+        self.db = TagDB(self.dbFile, self.name)
+
+    def submit(self, function, *args, callback=None):
+        """Выполняет function(db, *args) в потоке базы после накопленной записи"""
+        self.flush()
+        with self._lock:
+            if self._closed:
+                future = self._closedFuture(Future())
+            else:
+                future = self._executor.submit(lambda: function(self.db, *args))
+        if callback is not None:
+            future.add_done_callback(lambda f: self.delivered.emit(callback, f))
+        return future
+
+    def _deliver(self, callback, future):
+        if future.exception() is not None:
+            print(f"Ошибка запроса к базе тегов: {future.exception()}")
         else:
-            print("Tag not found")
-            return []
+            callback(future.result())
+
+    def _closedFuture(self, future):
+        future.set_exception(RuntimeError("TagService is closed"))
+        return future
+
+    def write(self, name: str, *args):
+        future = self.WriteFuture(self)
+        with self._lock:
+            if self._closed:
+                # После close() запись не выполнится: Future завершается ошибкой, а не ждет вечно
+                return self._closedFuture(future)
+            self._pending.append((name, args, future))
+            if self._flushTimer is None:
+                self._flushTimer = threading.Timer(self.flushInterval, self.flush)
+                self._flushTimer.daemon = True
+                self._flushTimer.start()
+        return future
+
+    def read(self, name: str, *args, callback=None):
+        future = self.submit(lambda db, *a: getattr(db, name)(*a), *args, callback=callback)
+        return future if callback is not None else future.result()
 
-        query.prepare("""
-        SELECT files.filename FROM files
-        JOIN file_tags ON file_tags.file_id = files.id
-        WHERE file_tags.tag_id = ?
-        """)
-        query.addBindValue(tagId)
-        if not query.exec():
-            print(f"Error executing query: {query.lastError().text()}")
-            return []
+    def flush(self):
+        """Отправляет накопленную запись в поток базы одной транзакцией. Можно вызывать из любого потока"""
+        with self._lock:
+            if self._flushTimer is not None:
+                self._flushTimer.cancel()
+                self._flushTimer = None
+            batch, self._pending = self._pending, []
+            if batch and self._executor is not None:
+                # Отправка под блокировкой: пакеты уходят в поток базы в том же порядке, в каком копились
+                return self._executor.submit(self._commit, batch)
+        return None
+
+    def _commit(self, batch):
+        try:
+            results = self.db.apply([(name, args) for name, args, _ in batch])
+        except Exception as e:
+            for *_, future in batch: future.set_exception(e)
+            return
+        if self.db._failed:
+            # Не удалось сохранить транзакцию целиком
+            for *_, future in batch: future.set_exception(RuntimeError(f"TagDB commit failed: {self.db._error}"))
+            return
+        for (*_, future), (result, error) in zip(batch, results):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
 
-        files = []
-        while query.next():
-            files.append(query.value(0))
-        return files
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush()
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def _close(self):
+        self.db.db.close()
+        self.db = None
+        QSqlDatabase.removeDatabase(self.name)
+
+    def invalidate(self, *args):
+        self.submit(lambda db: db.invalidate())
+
+    def addFile(self, filename: str): return self.write("addFile", filename)
+    def addTag(self, filename: str, tag: str): return self.write("addTag", filename, tag)
+    def removeTag(self, filename: str, tag: str): return self.write("removeTag", filename, tag)
+    def addFiles(self, filenames): return self.write("addFiles", list(filenames))
+    def addTags(self, pairs): return self.write("addTags", list(pairs))
+    def tagFiles(self, filenames, tags): return self.write("tagFiles", list(filenames), list(tags))
+    def retag(self, filename: str, tags): return self.write("retag", filename, list(tags))
+    def importTags(self, data: dict, replace: bool = False): return self.write("importTags", dict(data), replace)
+
+    def getTagsForFile(self, filename: str, callback=None): return self.read("getTagsForFile", filename, callback=callback)
+    def getFilesForTag(self, tag: str, callback=None): return self.read("getFilesForTag", tag, callback=callback)
+    def queryFiles(self, expression: str, callback=None): return self.read("queryFiles", expression, callback=callback)
+    def countFiles(self, expression: str, callback=None): return self.read("countFiles", expression, callback=callback)
+    def tagCounts(self, prefix: str = "", callback=None): return self.read("tagCounts", prefix, callback=callback)
+    def exportTags(self, callback=None): return self.read("exportTags", callback=callback)
 
 class StatusBar(QtWidgets.QStatusBar):
     def __init__(self, parent=None):
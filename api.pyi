@@ -1,4 +1,5 @@
-from typing import List, Optional, Any, Required
+from typing import List, Optional, Any, Required, Iterator, Callable
+import re
 
 class QApplication():
     def __init__(self): """PyQt6.QtWidgets.QApplication"""
@@ -81,9 +82,26 @@ api.addWindow(w)
         def runCommand(self, command: dict) -> None: """Запускает команду (передача информации в формате JSON)"""
         def addToolBar(self, items: List[QAction], flags: List[int] = []) -> None: """Добавляет ToolBar по списку PyQt6.QtGui.QAction"""
         def getCommand(self, name: str) -> Optional[dict]: """Ищет команду в загруженных командах. Возвращает полну. информацию в виде словаря"""
+        def commandMetrics(self) -> dict: """Статистика выполнения команд: {'commands': {...}, 'plugins': {...}} с count, errors, mean_ms, max_ms, p50_ms, p95_ms, p99_ms и гистограммой"""
+        def setCommandMetricsEnabled(self, enabled: bool) -> None: """Включает или выключает сбор статистики команд"""
+        def exportCommandMetrics(self, path: str) -> None: """Сохраняет статистику команд в JSON-файл"""
+        def resetCommandMetrics(self) -> None: """Сбрасывает статистику команд"""
+        def tasks(self) -> List['VtAPI.Task']: """Список выполняющихся фоновых команд"""
+        def cancelTasks(self) -> None: """Запрашивает отмену всех фоновых команд окна"""
+        def findTagFiles(self, expression: str, callback: Optional[Callable] = None) -> List[str]: """Ищет файлы по выражению над тегами: "a AND (b OR c) AND NOT d", "py*" - префикс. Результаты кешируются (с callback - асинхронно: возвращает [] и вызывает callback(files) в потоке интерфейса)"""
+        def countTagFiles(self, expression: str, callback: Optional[Callable] = None) -> int: """Количество файлов по выражению над тегами (с callback - асинхронно, возвращает 0)"""
+        def tagCounts(self, prefix: str = "", callback: Optional[Callable] = None) -> dict: """{тег: количество файлов} для тегов с префиксом prefix (с callback - асинхронно, возвращает {})"""
+        def spawn(self, coro) -> Any: """Запускает корутину в цикле asyncio окна (asyncio.Task)"""
+        def asyncTasks(self) -> List[Any]: """Список выполняющихся корутин окна"""
+        def cancelAsyncTasks(self) -> None: """Отменяет все корутины окна (вызывается при закрытии окна)"""
         def getTheme(self) -> str: """Получает тему окна"""
         def setTheme(self, theme: str) -> None: """Устанавливает тему для окна"""
+        def translate(self, text: str, trtype: str = "Console") -> str: """Переводит строку, результаты кешируются по (контекст, строка, язык)"""
+        def getLocale(self) -> str: """Получает язык окна"""
+        def setLocale(self, s: str, auto: bool = False) -> str: """Устанавливает язык окна и сбрасывает кеш переводов"""
+        def translationCacheInfo(self) -> dict: """Статистика кеша переводов: {'hits', 'misses', 'size'}"""
         def getLog(self) -> str: """Получает лог окна"""
+        def getLogRecords(self) -> List[Any]: """Получает записи лога (time, color, message), хранятся последние logCapacity записей"""
         def setLogMsg(self, msg: str, t: str = "") -> None: """Записывает сообщение в лог, можно устанавливать разные цвета"""
         def getTreeModel(self) -> QFileSystemModel: """Получает FileSystemModel окна"""
         def getModelElement(self, i: int) -> str: """Отладочная функция для получения имени выбранного элемента в TreeWidget"""
@@ -119,6 +137,7 @@ api.addWindow(w)
         def getText(self) -> str: """Получает текст вкладки"""
         def getHtml(self) -> str: """Получает текст вкладки в формате HTML """
         def setText(self, text: str) -> str: """Устанавливает текст для вкладки. Примечание, текст вкладки заменяется а не вставляется. Для вставки испольховать insert"""
+        def loadFile(self, file: "VtAPI.File | str", progress: Optional[callable] = None) -> None: """Загружает файл во вкладку по блокам, не создавая полной копии текста. Файлы больше largeFileThreshold (Main.settings) открываются в режиме больших файлов"""
         def getFile(self) -> Optional[str]: """Получает файл в который сохраняется текст вкладки"""
         def setFile(self, file: str) -> str: """Устанавливает файл в который сохраняется текст вкладки"""
         def getCanSave(self) -> bool: """Проверяет можно ли сохранять текст вкладки как файл"""
@@ -133,9 +152,18 @@ api.addWindow(w)
         def setSaved(self, b: bool) -> bool: """Устанавливает сохранена ли вкладка"""
         def size(self) -> int: """Возвращает длинну текста"""
         def substr(self, region: 'VtAPI.Region') -> str: """Извлекает текст из региона и возвращает его как строку"""
-        def insert(self, string: str, point: Optional['VtAPI.Point'] = None) -> None: """Вставляет текст в точке"""
-        def erase(self, region: 'VtAPI.Region') -> None: """Очищает регион"""
-        def replace(self, region: 'VtAPI.Region', string: str) -> None: """Заменяет текст в регионе на другой"""
+        def findAll(self, pattern: str, flags: int = 0, literal: bool = False) -> 'VtAPI.RegionArray': """Все совпадения шаблона одним массивом регионов, без создания объектов Region"""
+        def finder(self) -> 'VtAPI.Finder': """Состояние поиска документа (одно на вкладку)"""
+        def find(self, pattern: str, flags: int = 0, literal: bool = False) -> 'VtAPI.RegionArray': """Ищет шаблон через finder() и возвращает совпадения"""
+        def replaceAll(self, pattern: str, replacement: str, flags: int = 0, literal: bool = False) -> int: """Заменяет все совпадения одним шагом отмены, возвращает их число"""
+        def rowcol(self, offset: int) -> tuple: """Переводит позицию в (строка, столбец) с нуля за O(log n), без копирования текста"""
+        def textPoint(self, row: int, col: int = 0) -> int: """Переводит (строка, столбец) в позицию; столбец ограничивается длиной строки"""
+        def line(self, region: 'VtAPI.Region | int') -> 'VtAPI.Region': """Регион целых строк, покрывающих регион или позицию (без перевода строки в конце)"""
+        def insert(self, string: str, point: Optional['VtAPI.Point'] = None) -> None: """Вставляет текст в точке (без перезаписи документа, с отменой)"""
+        def erase(self, region: 'VtAPI.Region') -> None: """Очищает регион (без перезаписи документа, с отменой)"""
+        def replace(self, region: 'VtAPI.Region', string: str) -> None: """Заменяет текст в регионе на другой (без перезаписи документа, с отменой)"""
+        def edit(self) -> 'VtAPI.TextEdits': """Пакет правок в координатах текущего текста, применяется одним шагом отмены: with view.edit() as e: ..."""
+        def applyEdits(self, edits: List[tuple]) -> None: """Применяет отсортированные непересекающиеся правки (begin, end, text) одним шагом отмены; позиции прижимаются к границам текста"""
         def undo(self) -> None: """На одно действие назад"""
         def redo(self) -> None: """На одно действие вперед"""
         def cut(self) -> None: """Вырезает текст"""
@@ -239,21 +267,93 @@ api.addWindow(w)
     }
     ```
             """
+        def setAddititionalHL(self, data: 'List[dict] | VtAPI.RegionArray', style: Optional[dict] = None) -> None: """Заменяет дополнительные участки подсветки ({'line': 0, 'pos': (0, 5), 'color': '#ff0000', 'bg': ..., 'weight': 'bold'}). Со style data - регионы документа (RegionArray, Region или кортежи), они режутся по строкам. Переподсвечиваются только затронутые строки"""
+        def addAdditionalHL(self, data: 'List[dict] | VtAPI.RegionArray', style: Optional[dict] = None) -> None: """Добавляет дополнительные участки подсветки (со style - регионы документа)"""
+        def removeAdditionalHL(self, data: List[dict]) -> None: """Удаляет дополнительные участки подсветки"""
+        def clearAdditionalHL(self, lines: Optional[List[int]] = None) -> None: """Очищает дополнительную подсветку на строках (или везде)"""
         def rehighlite(self) -> None: """Перезагружает подсветку синтаксиса"""
         def setMmapHidden(self, b: bool) -> None: """Скрывает миникарту"""
         def isMmapHidden(self) -> bool: """Проверяет скрыта ли миникарта"""
+        def isLargeFile(self) -> bool: """Проверяет открыт ли файл в режиме больших файлов (в документе только видимое окно строк)"""
         def initTagFile(self, path: str) -> None: """Добавляет файл в БД с хэштегами"""
-        def getTags(self, path: str) -> list: """Получает хэштеги файла"""
+        def getTags(self, path: str, callback: Optional[Callable] = None) -> list: """Получает хэштеги файла. С callback не ждет базу: возвращает [] и вызывает callback(tags) в потоке интерфейса"""
         def addTag(self, path: str, tag: str) -> None: """Добавляет хэштег файлу"""
         def removeTag(self, path: Optional[str] = None, tag: Optional[str] = None, show: bool = False) -> None: """Удаляет хэштег файла"""
-        def getTagFiles(self, tag: str) -> list: """Получает все файлы с хэштегом %s"""
+        def getTagFiles(self, tag: str, callback: Optional[Callable] = None) -> list: """Получает все файлы с хэштегом %s (с callback - асинхронно, как getTags)"""
+        def findTagFiles(self, expression: str, callback: Optional[Callable] = None) -> List[str]: """Ищет файлы по выражению над тегами: "a AND (b OR c) AND NOT d", "py*" - префикс. Результаты кешируются (с callback - асинхронно)"""
+        def countTagFiles(self, expression: str, callback: Optional[Callable] = None) -> int: """Количество файлов по выражению над тегами (с callback - асинхронно, возвращает 0)"""
+        def tagCounts(self, prefix: str = "", callback: Optional[Callable] = None) -> dict: """{тег: количество файлов} для тегов с префиксом prefix (с callback - асинхронно, возвращает {})"""
+    class TextEdits:
+        """Пакет правок вида (begin, end, text) в координатах текста на момент начала пакета (как таблица кусков)"""
+        def __init__(self, view: 'VtAPI.View') -> None: ...
+        def replace(self, region: 'VtAPI.Region | int', string: str) -> None: """Заменяет регион; пересечение с другой правкой - ValueError"""
+        def insert(self, point: int, string: str) -> None: """Вставляет текст в позицию"""
+        def erase(self, region: 'VtAPI.Region') -> None: """Удаляет регион"""
+        def apply(self) -> None: """Применяет правки (вызывается при выходе из with)"""
+    class Finder:
+        """Поиск в документе: скомпилированный шаблон (из общего кэша), индекс совпадений RegionArray и текущее совпадение. Индекс обновляется при правках: позиции сдвигаются, заново ищется только в измененных строках"""
+        pattern: Optional[re.Pattern]
+        index: int
+        """Номер текущего совпадения, -1 если не выбрано"""
+        def find(self, pattern: str, flags: int = 0, literal: bool = False) -> 'VtAPI.RegionArray': """Находит все совпадения. При наборе буквального шаблона по символу перепроверяются только прошлые совпадения"""
+        def clear(self) -> None: """Сбрасывает поиск"""
+        def count(self) -> int: """Число совпадений"""
+        def regions(self) -> 'VtAPI.RegionArray': """Копия индекса совпадений"""
+        def next(self, point: Optional[int] = None, forward: bool = True, wrap: bool = True) -> Optional['VtAPI.Region']: """Выделяет следующее (или предыдущее) совпадение от point или курсора"""
+        def replace(self, replacement: str) -> Optional['VtAPI.Region']: """Заменяет текущее совпадение и выделяет следующее"""
+        def replaceAll(self, replacement: str) -> int: """Заменяет все совпадения одной правкой и одним шагом отмены, возвращает их число"""
+    class AsyncLoop(QObject):
+        """Цикл asyncio, который крутится внутри цикла событий Qt. Корутины выполняются в потоке интерфейса"""
+        maxInterval: int
+        """Наибольший промежуток между итерациями в мс, пока есть незавершенные задачи. Раньше цикл будят готовые колбэки, таймеры asyncio и сокеты"""
+        def wake(self) -> None: """Запускает итерацию цикла как можно скорее (например, после завершения future вне цикла)"""
+        def spawn(self, coro, window: Optional['VtAPI.Window'] = None) -> Any: """Запускает корутину, задача привязывается к окну"""
+        def spawnThreadsafe(self, coro) -> Any: """Запускает корутину из другого потока (concurrent.futures.Future)"""
+        def windowTasks(self, window: Optional['VtAPI.Window'] = None) -> List[Any]: """Задачи окна (или все задачи)"""
+        def cancel(self, window: Optional['VtAPI.Window'] = None) -> None: """Отменяет задачи окна (или все задачи)"""
+        def close(self) -> None: """Отменяет задачи и закрывает цикл"""
+    class Task(QObject):
+        """Задача в общем фоновом пуле потоков. Сигналы всегда вызываются в потоке интерфейса"""
+        progressChanged: pyqtSignal
+        finished: pyqtSignal
+        failed: pyqtSignal
+        def __init__(self, name: str = "") -> None: ...
+        def start(self, function: Callable, *args, **kwargs) -> 'VtAPI.Task': """Отправляет функцию в пул"""
+        def cancel(self) -> None: """Запрашивает отмену (функция должна проверять isCancelled)"""
+        def isCancelled(self) -> bool: ...
+        def isDone(self) -> bool: ...
+        def result(self, timeout: Optional[float] = None) -> Any: """Ждет и возвращает результат"""
+        def setProgress(self, value: int, text: str = "") -> None: ...
     class Selection:
-        def __init__(self, regions: Optional[List['VtAPI.Region']] = None) -> None: """Задается список регионов выделения"""
+        """Отсортированный набор регионов в двух массивах int64 (начала и концы); пересекающиеся и соседние регионы сливаются"""
+        def __init__(self, regions: Optional[List['VtAPI.Region | tuple']] = None) -> None: """Задается список регионов выделения"""
+        def __len__(self) -> int: ...
+        def __iter__(self) -> Iterator['VtAPI.Region']: ...
+        def __getitem__(self, i: int) -> 'VtAPI.Region': ...
+        def regions(self) -> List['VtAPI.Region']: """Список регионов по порядку"""
+        def pairs(self) -> List[tuple]: """Список (начало, конец) по порядку"""
         def clear(self) -> None: """Очищает все регионы в текущем выделении"""
-        def add(self, region: 'VtAPI.Region') -> None: """Добавляет новый регион в текущее выделение."""
-        def subtract(self, region: 'VtAPI.Region') -> None: """Удаляет указанный регион из текущего выделения."""
-        def contains(self, point: 'VtAPI.Point') -> bool: """Проверяет наличие точки в выделении"""
-        def text(self, view: 'VtAPI.View', region: 'VtAPI.Region') -> str: """Возвращает текст выделения"""
+        def add(self, region: 'VtAPI.Region | tuple') -> None: """Добавляет новый регион в текущее выделение (со слиянием)"""
+        def addAll(self, regions) -> None: """Добавляет много регионов одной сортировкой и одним проходом слияния"""
+        def subtract(self, region: 'VtAPI.Region | tuple') -> None: """Вычитает регион из выделения (регионы обрезаются или делятся); пустой регион убирает курсор в этой точке"""
+        def contains(self, point: int) -> bool: """Проверяет наличие позиции в выделении (двоичный поиск)"""
+        def union(self, other: 'VtAPI.Selection') -> 'VtAPI.Selection': """Объединение выделений"""
+        def intersection(self, other: 'VtAPI.Selection') -> 'VtAPI.Selection': """Пересечение выделений"""
+        def texts(self, view: 'VtAPI.View') -> List[str]: """Тексты всех регионов за одно чтение документа"""
+        def regionArray(self) -> 'VtAPI.RegionArray': """Регионы выделения одним массивом RegionArray"""
+        def text(self, view: 'VtAPI.View', region: Optional['VtAPI.Region'] = None) -> str: """Возвращает текст региона, без region - все регионы через перевод строки"""
+    class RegionArray:
+        """Массив регионов фиксированного размера: плоские пары (начало, конец) int64. Изменяемый буфер int64 (array('q'), numpy, плоский или (N, 2)) оборачивается без копирования, буфер только для чтения и bytes копируются; срезы разделяют память с родителем"""
+        def __init__(self, regions: Optional[Any] = None) -> None: """Регионы, кортежи, другой RegionArray или буфер int64 (плоский или (N, 2) C-порядка)"""
+        def __len__(self) -> int: ...
+        def __iter__(self) -> Iterator['VtAPI.Region']: ...
+        def __getitem__(self, index: 'int | slice') -> 'VtAPI.Region | VtAPI.RegionArray': """Регион по индексу или срез без копирования"""
+        def pairs(self) -> List[tuple]: """Список (начало, конец)"""
+        def buffer(self) -> memoryview: """Плоский memoryview int64 без копирования"""
+        def bisect(self, point: int) -> int: """Число регионов, начинающихся до point (регионы должны быть отсортированы)"""
+        def copy(self) -> 'VtAPI.RegionArray': """Копия с собственной памятью"""
+        def shift(self, delta: int, start: int = 0) -> None: """Сдвигает все позиции не меньше start на delta"""
+        def adjust(self, begin: int, end: int, length: int) -> None: """Пересчитывает позиции после замены [begin, end) на length символов; позиции внутри схлопываются в begin"""
     class Region:
         def __init__(self, a: int, b: int) -> None: """Задаются границы региона"""
         def begin(self) -> int: """Получает начальную точку региона"""
@@ -290,6 +390,12 @@ api.addWindow(w)
         """Упрощение доступа к файлам"""
         def __init__(self, path: Optional[str] = None, encoding="utf-8"): ...
         def read(self, chunk=1024) -> List[str]: """Возвращает список состоящий из блоков текста, разюитого по длинне чанка"""
+        def readAll(self, progress: Optional[callable] = None) -> str: """Читает файл целиком в одну строку (большие файлы читаются через mmap). progress(done, total) получает количество байт"""
+        def blocks(self, progress: Optional[callable] = None) -> Iterator[str]: """Лениво отдаёт блоки текста файла (размер блока растёт от 64 КБ до 4 МБ)"""
+        def lines(self, progress: Optional[callable] = None, keepends: bool = False) -> Iterator[str]: """Лениво отдаёт строки файла"""
+        def size(self) -> int: """Возвращает размер файла в байтах"""
+        async def readAsync(self, progress: Optional[callable] = None) -> str: """readAll в фоновом пуле, для использования в корутинах"""
+        async def writeAsync(self, content: str, chunk=1024) -> None: """write в фоновом пуле, для использования в корутинах"""
         def exists(self) -> bool: """Проверяет существует ли файл"""
         def create(self, rewrite=False) -> None: """Очищает/создает файл"""
     class Theme:
@@ -325,8 +431,14 @@ api.addWindow(w)
             def description(self) -> str: ...
         class ApplicationCommand:
             """Команда в которую можно использовать для чего угодно или использовать как базу для других типов команд"""
+            background: bool
+            """True - run() выполняется в фоновом пуле потоков. async run() без background выполняется в цикле asyncio интерфейса"""
+            task: Optional['VtAPI.Task']
             def __init__(self, api: 'VtAPI') -> None: ...
             def run(self) -> None: ...
+            def isCancelled(self) -> bool: """Проверяет, запрошена ли отмена фоновой команды"""
+            def setProgress(self, value: int, text: str = "") -> None: """Сообщает прогресс фоновой команды (показывается в строке состояния)"""
+            def runOnGui(self, function: Callable, *args, **kwargs) -> None: """Вызывает функцию в потоке интерфейса"""
             def is_enabled(self) -> bool: ...
             def is_visible(self) -> bool: ...
             def description(self) -> str: ...
@@ -359,10 +471,22 @@ api.addWindow(w)
             def parent(self) -> Optional[QWidget]: ...
         class Process(QProcess):
             def __init__(self) -> None: ...
+            async def runAsync(self, program: str, arguments: Optional[List[str]] = None, input: Optional[str | bytes] = None) -> tuple: """Запускает процесс и ждет его завершения, не блокируя интерфейс. Возвращает (код, stdout, stderr)"""
         class ToolBar(QToolBar):
             def __init__(self, *args, **kwargs): ...
         class Action(QAction):
             def __init__(self, *args, **kwargs): ...
+        class Signal(QObject):
+            """Сигнал с приоритетами. Слоты хранятся отсортированными, число аргументов слота определяется при подключении"""
+            def __init__(self, *args, interval: int = 0) -> None: ...
+            def connect(self, slot: Callable, priority: int = 1) -> None: """Подключает слот, слоты с большим приоритетом вызываются раньше"""
+            def disconnect(self, slot: Callable) -> None: """Отключает слот"""
+            def emit(self, *args, **kwargs) -> None: """Вызывает слоты по порядку приоритета"""
+            def dispatch(self, slots: list, *args, **kwargs) -> None: """Вызывает только переданные записи слотов (из _slots)"""
+            def emitQueued(self, *args, **kwargs) -> None: """Вызывает слоты на следующем проходе цикла событий"""
+            def emitCoalesced(self, *args, **kwargs) -> None: """Объединяет частые вызовы: слоты вызываются раз в interval мс с последними аргументами"""
+            def setInterval(self, msec: int) -> None: """Задаёт интервал для emitCoalesced"""
+            def slotCount(self) -> int: """Количество подключённых слотов"""
     def activeWindow(self) -> 'Window': """Получает активное окно (активным окном считается последнее окно в котором находился курсор)"""
     def windows(self) -> List['Window']: """Получает список окон"""
     def addWindow(self, window: 'Window') -> None: """Добавляет окно"""
@@ -370,6 +494,11 @@ api.addWindow(w)
     def saveSettings(self, data: dict, path: Optional[str] = None, pl: Optional[str] = None) -> None: """Сохраняет настройки в файл. Не работает и не нужно"""
     def importModule(self, name: str) -> Any: """Импортирует модуль по его названию"""
     def setTimeout(self, function: callable, delay: int) -> None: """Ставит таймер"""
+    def runOnGui(self, function: Callable, *args, **kwargs) -> None: """Вызывает функцию в потоке интерфейса (из любого потока)"""
+    def runTask(self, function: Callable, *args, task: Optional['VtAPI.Task'] = None, **kwargs) -> 'VtAPI.Task': """Выполняет функцию в фоновом пуле потоков"""
+    def setTaskWorkers(self, count: int) -> None: """Задает число потоков фонового пула"""
+    def asyncLoop(self) -> 'VtAPI.AsyncLoop': """Получает цикл asyncio, встроенный в цикл событий Qt"""
+    def spawn(self, coro, window: Optional['VtAPI.Window'] = None) -> Any: """Запускает корутину в цикле asyncio интерфейса"""
     async def setTimeout_async(self, function: callable, delay: int) -> None: """Ставит асинхронный таймер"""
     def version(self) -> str: """Получает версию API"""
     def platform(self) -> str: """Получает название системы"""
@@ -1,8 +1,10 @@
 from PySide6 import QtWidgets, QtGui
-import os, sys, importlib, inspect, builtins, traceback
+import os, sys, importlib, inspect, builtins, traceback, json, time, bisect
 import importlib.util
 from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from api import VtAPI
+from addit import tracer
 
 BLOCKED = [ # не позволяет добавить импорт сторонней версии PyQt|PySide. Защищает от вылета
     "PyQt6",
@@ -30,6 +32,97 @@ class SafeImporter:
                 raise ImportError(f"Importing '{name}' is not allowed.")
         return self.original_import(name, *args, **kwargs)
 
+MANIFEST_CACHE = "plugins.vt-cache"
+
+class LazyPlugin:
+    """Модуль плагина, который импортируется при первом обращении (команда, меню или сигнал)"""
+    def __init__(self, manager, name):
+        self._manager = manager
+        self._name = name
+
+    def load(self):
+        return self._manager.activatePlugin(self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __str__(self):
+        return self._name
+
+class CommandStat:
+    """Счётчики одной команды или плагина: вызовы, ошибки и гистограмма задержек"""
+    BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000) # мс
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+
+    def add(self, ms, error=False):
+        self.count += 1
+        self.errors += error
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.buckets[bisect.bisect_left(self.BOUNDS, ms)] += 1
+
+    def percentile(self, p):
+        """Верхняя граница корзины, в которую попадает p-й перцентиль (последняя корзина - максимум)"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def data(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": self.total,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "max_ms": self.max,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "histogram": dict(zip([f"<={b}" for b in self.BOUNDS] + [f">{self.BOUNDS[-1]}"], self.buckets)),
+        }
+
+class CommandMetrics:
+    """Задержки выполнения команд по имени команды и по плагину"""
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.commands = {}
+        self.plugins = {}
+
+    def record(self, command, plugin, seconds, error=False):
+        if not self.enabled:
+            return
+        ms = seconds * 1000
+        for table, key in ((self.commands, command), (self.plugins, plugin)):
+            stat = table.get(key)
+            if stat is None:
+                stat = table[key] = CommandStat()
+            stat.add(ms, error)
+
+    def data(self):
+        return {
+            "commands": {name: stat.data() for name, stat in self.commands.items()},
+            "plugins": {name: stat.data() for name, stat in self.plugins.items()},
+        }
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.data(), f, indent=2)
+
+    def reset(self):
+        self.commands.clear()
+        self.plugins.clear()
+
 class PluginManager:
     def __init__(self, plugin_directory: str, w):
         self.plugin_directory = plugin_directory
@@ -37,8 +130,16 @@ class PluginManager:
         self.__window: QtWidgets.QMainWindow = w
         self.__windowApi: VtAPI = self.__window.api
         self.__menu_map = {}
-        self.shortcuts = []
+        self.shortcuts = {}
+        self.shortcutPrefixes = set()
         self.regCommands = {}
+        self.metrics = CommandMetrics((getattr(w, "settData", None) or {}).get("commandMetrics", True))
+        self.tasks = set()
+        self.manifests = {}
+        self.modules = {}
+        self.lazyPlugins = {}
+        self.lazyDefault = (getattr(w, "settData", None) or {}).get("lazyPlugins", False)
+        self.manifestCache = self.readManifestCache()
         self.dPath = os.getcwd()
 
     def importModule(self, path, n):
@@ -48,6 +149,88 @@ class PluginManager:
         spec.loader.exec_module(module)
         return module
 
+    def manifestCachePath(self):
+        try:
+            return VtAPI.Path.joinPath(self.__windowApi.getFolder("cache"), MANIFEST_CACHE)
+        except Exception:
+            return None
+
+    def readManifestCache(self):
+        path = self.manifestCachePath()
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, TypeError, ValueError):
+            return {}
+
+    def saveManifestCache(self):
+        path = self.manifestCachePath()
+        if not path: return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.manifestCache, f)
+        except OSError:
+            pass
+
+    def readCached(self, path):
+        """Читает JSON-файл плагина, повторно разбирает его только при смене mtime или размера"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.manifestCache.get(path)
+        if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return entry["data"]
+        data = VtAPI.Settings().fromFile(VtAPI.File(path)).data()
+        self.manifestCache[path] = {"mtime": st.st_mtime_ns, "size": st.st_size, "data": data}
+        self._cacheChanged = True
+        return data
+
+    def readManifest(self, fullPath):
+        """Разбирает config.vt-conf и меню плагина. Пути в манифесте становятся абсолютными"""
+        configPath = VtAPI.Path.joinPath(fullPath, "config.vt-conf")
+        if not os.path.isfile(configPath):
+            return None
+        config = self.readCached(configPath)
+        manifest = dict(config)
+        manifest["path"] = fullPath
+        manifest["name"] = config.get('name', 'Unknown')
+        manifest["version"] = config.get('version', '1.0')
+        for key in ("main", "menu"):
+            value = config.get(key, '')
+            manifest[key] = os.path.join(fullPath, value) if value else ''
+        manifest["menuData"] = None
+        if manifest["menu"] and os.path.isfile(manifest["menu"]):
+            try:
+                manifest["menuData"] = self.readCached(manifest["menu"])
+            except Exception:
+                pass
+        return manifest
+
+    def discoverPlugins(self):
+        """Читает манифесты всех плагинов параллельно"""
+        self._cacheChanged = False
+        names = list(self.plugins)
+        with ThreadPoolExecutor(max_workers=min(8, len(names) or 1)) as pool:
+            futures = {name: pool.submit(self.readManifest, self.plugins[name]) for name in names}
+        for name in names:
+            try:
+                manifest = futures[name].result()
+            except Exception as e:
+                self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Failed load plugin '{}' commands: {}").format(name, e), self.__windowApi.Color.ERROR)
+                continue
+            if manifest:
+                self.manifests[name] = manifest
+        if self._cacheChanged:
+            self.saveManifestCache()
+
+    def isLazy(self, manifest):
+        """
+        Плагин откладывается, только если он сам это разрешил ("activation": "lazy" в манифесте, или настройка lazyPlugins)
+        и его есть чем активировать: меню или сигналы из activationSignals. Иначе initAPI выполняется при запуске,
+        как раньше - плагины могут подключаться к сигналам окна (windowStateRestoring, fileSaved...) в initAPI.
+        """
+        activation = manifest.get("activation") or ("lazy" if self.lazyDefault else "startup")
+        return activation == "lazy" and bool(manifest.get("menuData") or manifest.get("activationSignals"))
+
     def loadPlugins(self):
         try:
             sys.path.insert(0, self.plugin_directory)
@@ -55,49 +238,95 @@ class PluginManager:
                 if self.__windowApi.Path(VtAPI.Path.joinPath(self.plugin_directory, plugDir)).isDir():
                     self.fullPath = VtAPI.Path.joinPath(self.plugin_directory, plugDir)
                     self.plugins[plugDir] = self.fullPath
+            with tracer.span("discoverPlugins", plugins=len(self.plugins)):
+                self.discoverPlugins()
             # self.__windowApi.activeWindow.setLogMsg(f"Modules {self.__windowApi.activeWindow.appName()} loading...")
             bP = self.plugins.get("Basic")
             if not bP:
                 if self.__windowApi.activeWindow.getCommand("LoadBasicCommand"):
                     self.__windowApi.activeWindow.runCommand({"command": "LoadBasicCommand", "kwargs": {"url": "https://github.com/cherry220-v/Basic"}})
             else:
-                self.loadPlugin("Basic")
+                with tracer.span("loadPlugin Basic", plugin="Basic"):
+                    self.loadPlugin("Basic")
                 self.plugins.pop("Basic")
             for pl in self.plugins:
-                self.loadPlugin(pl)
+                manifest = self.manifests.get(pl)
+                lazy = bool(manifest) and self.isLazy(manifest)
+                with tracer.span(f"loadPlugin {pl}", plugin=pl, lazy=lazy):
+                    self.loadPlugin(pl, lazy=lazy)
         except Exception as e:
             self.__windowApi.activeWindow.setLogMsg(e, self.__windowApi.Color.ERROR)
         finally:
             VtAPI.Path.chdir(self.dPath)
 
-    def loadPlugin(self, name):
+    def loadPlugin(self, name, lazy=False):
         self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Loading plugin '{}'").format(name))
-        fullPath = self.plugins.get(name)
-        VtAPI.Path.chdir(fullPath)
-        if VtAPI.Path(fullPath).isDir() and VtAPI.Path(f"config.vt-conf").isFile():
-            self.initPlugin(VtAPI.Path.joinPath(fullPath, "config.vt-conf"))
-            if self.mainFile:
-                pyFile = self.mainFile
-                try:
-                    with SafeImporter(BLOCKED):
-                        sys.path.insert(0, fullPath)
-                        self.module = self.importModule(pyFile, self.name + "Plugin")
-                        if hasattr(self.module, "initAPI"):
-                            self.module.initAPI(self.__windowApi)
-                    self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Loaded plugin '{}'").format(self.name), self.__windowApi.Color.SUCCESS)
-                except Exception as e:
-                    self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Failed load plugin '{}' commands: {}").format(self.name, e), self.__windowApi.Color.ERROR)
-                    self.module = None
-                finally:
-                    sys.path.pop(0)
-            if self.menuFile:
-                self.loadMenu(self.menuFile, module=self.module, path=fullPath)
-            VtAPI.Path.chdir(self.__windowApi.getFolder("packages"))
-            return self.module
-
-    def loadMenu(self, f, module=None, path=None):
+        manifest = self.manifests.get(name)
+        if not manifest:
+            fullPath = self.plugins.get(name)
+            manifest = self.readManifest(fullPath) if fullPath and VtAPI.Path(fullPath).isDir() else None
+            if not manifest:
+                return None
+            self.manifests[name] = manifest
+        self.name, self.version = manifest["name"], manifest["version"]
+        self.mainFile, self.menuFile = manifest["main"], manifest["menu"]
+        if lazy:
+            module = self.lazyPlugins.setdefault(name, LazyPlugin(self, name))
+            for signalName in manifest.get("activationSignals") or []:
+                signal = self.__windowApi.activeWindow.signals.findSignal(signalName)
+                if signal: self.activateOnSignal(name, signal)
+        else:
+            module = self.activatePlugin(name)
+        self.module = module
+        if manifest["menuData"] is not None:
+            self.loadMenu(manifest["menu"], module=module, path=manifest["path"], data=manifest["menuData"])
+        return module
+
+    def activatePlugin(self, name):
+        """Импортирует модуль плагина (один раз) и вызывает его initAPI"""
+        if name in self.modules:
+            return self.modules[name]
+        manifest = self.manifests.get(name)
+        if not manifest or not manifest["main"]:
+            self.modules[name] = None
+            return None
+        module = None
+        cwd = os.getcwd()
+        VtAPI.Path.chdir(manifest["path"])
         try:
-            menuFile = VtAPI.Settings().fromFile(VtAPI.File(f)).data()
+            with SafeImporter(BLOCKED):
+                sys.path.insert(0, manifest["path"])
+                with tracer.span(f"import {name}", "import", plugin=name):
+                    module = self.importModule(manifest["main"], manifest["name"] + "Plugin")
+                self.modules[name] = module
+                if hasattr(module, "initAPI"):
+                    with tracer.span(f"initAPI {name}", "import", plugin=name):
+                        module.initAPI(self.__windowApi)
+            self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Loaded plugin '{}'").format(manifest["name"]), self.__windowApi.Color.SUCCESS)
+        except Exception as e:
+            self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Failed load plugin '{}' commands: {}").format(manifest["name"], e), self.__windowApi.Color.ERROR)
+            module = self.modules[name] = None
+        finally:
+            sys.path.remove(manifest["path"])
+            VtAPI.Path.chdir(cwd)
+        return module
+
+    def activateOnSignal(self, name, signal):
+        """Активирует ленивый плагин при первом срабатывании сигнала и передаёт сигнал его новым слотам"""
+        def activate(*args, **kwargs):
+            signal.disconnect(activate)
+            before = signal._slots
+            self.activatePlugin(name)
+            signal.dispatch([s for s in signal._slots if s not in before], *args, **kwargs)
+        signal.connect(activate)
+
+    def loadMenu(self, f, module=None, path=None, data=None):
+        with tracer.span(f"loadMenu {os.path.basename(f)}"):
+            self._loadMenu(f, module, path, data)
+
+    def _loadMenu(self, f, module, path, data):
+        try:
+            menuFile = data if data is not None else self.readCached(f)
             localeDir = VtAPI.Path.joinPath(path if path else "", "locale")
             if VtAPI.Path(localeDir).isDir():
                 self.__window.addTranslation(localeDir)
@@ -111,14 +340,6 @@ class PluginManager:
         except Exception as e:
             self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Failed load menu from '{}': {}").format(f, e))
 
-    def initPlugin(self, path):
-        config = VtAPI.Settings().fromFile(VtAPI.File(path)).data()
-
-        self.name = config.get('name', 'Unknown')
-        self.version = config.get('version', '1.0')
-        self.mainFile = config.get('main', '')
-        self.menuFile = config.get('menu', '')
-
     def parseMenu(self, data, parent, pl=None, localemenu="MainMenu", regc=True):
         if isinstance(data, dict):
             data = [data]
@@ -142,15 +363,13 @@ class PluginManager:
             else:
                 action = QtGui.QAction(self.__window.translate(localemenu, item.get('caption', 'Unnamed')), self.__window)
                 if 'shortcut' in item:
-                    if not item['shortcut'] in self.shortcuts:
-                        if type(item["shortcut"]) != list:
-                            item["shortcut"] = [item['shortcut']]
-                        action.setShortcuts(item["shortcut"])
+                    if type(item["shortcut"]) != list:
+                        item["shortcut"] = [item['shortcut']]
+                    keys = [key for key in item["shortcut"] if self.registerShortcut(key, action, item.get('command'))]
+                    if keys:
+                        action.setShortcuts([QtGui.QKeySequence(key) for key in keys])
                             # action.setStatusTip(item['shortcut'])
-                        self.shortcuts.append(key for key in item["shortcut"])
                         self.__window.addAction(action)
-                    else:
-                        self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Shortcut '{}' for function '{}' is already used.").format(item['shortcut'], item['command']))
 
                 if 'command' in item:
                     args = item.get('command').get("args")
@@ -171,6 +390,7 @@ class PluginManager:
         command = c
         c = self.regCommands.get(command.get("command"))
         if c:
+            start = time.perf_counter()
             try:
                 args = command.get("args") or []
                 kwargs = command.get("kwargs") or {}
@@ -184,6 +404,12 @@ class PluginManager:
                             else:
                                 action.setChecked(not value)
                 cl = c.get("command")
+                if cl is None and isinstance(c.get("plugin"), LazyPlugin):
+                    cl = c["command"] = getattr(c["plugin"].load(), command.get("command"), None)
+                if cl is None:
+                    start = None
+                    self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Command '{}' not found in plugin '{}'").format(command.get("command"), self.pluginName(c.get("plugin"))), self.__windowApi.Color.WARNING)
+                    return
                 if issubclass(cl, VtAPI.Plugin.TextCommand):
                     cnd = cl(self.__windowApi, self.__windowApi.activeWindow.activeView)
                 elif issubclass(cl, VtAPI.Plugin.WindowCommand):
@@ -193,16 +419,64 @@ class PluginManager:
                 else:
                     cnd = VtAPI.Plugin.ApplicationCommand(self.__windowApi)
                     cnd.run = lambda: self.__windowApi.activeWindow.setLogMsg("ERROR", self.__windowApi.Color.ERROR)
+                if getattr(cnd, "background", False) or inspect.iscoroutinefunction(cnd.run):
+                    self.runBackground(cnd, command, c.get("plugin"), args, kwargs, start)
+                    start = None
+                    return
                 out = cnd.run(*args or [], **kwargs or {})
+                self.metrics.record(command.get("command"), self.pluginName(c.get("plugin")), time.perf_counter() - start, bool(out))
+                start = None
                 self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Executed command '{}'").format(command), self.__windowApi.Color.INFO)
                 if out:
                     self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Command '{}' returned '{}'").format(command, out), self.__windowApi.Color.ERROR)
             except Exception as e:
+                if start is not None:
+                    self.metrics.record(command.get("command"), self.pluginName(c.get("plugin")), time.perf_counter() - start, True)
                 traceback.print_exc()
                 self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Found error in '{}' - '{}'").format(command, e), self.__windowApi.Color.ERROR)
         else:
             self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Command '{}' not found").format(command), self.__windowApi.Color.WARNING)
 
+    def runBackground(self, cnd, command, plugin, args, kwargs, start):
+        window = self.__windowApi.activeWindow
+        name = command.get("command")
+        task = cnd.task = VtAPI.Task(name)
+        self.tasks.add(task)
+
+        def progress(value, text):
+            window.statusMessage(f"{name}: {value}% {text}".strip())
+
+        def finished(out):
+            self.tasks.discard(task)
+            self.metrics.record(name, self.pluginName(plugin), time.perf_counter() - start, bool(out))
+            window.setLogMsg(window.translate("Executed command '{}'").format(command), self.__windowApi.Color.INFO)
+            if out:
+                window.setLogMsg(window.translate("Command '{}' returned '{}'").format(command, out), self.__windowApi.Color.ERROR)
+
+        def failed(e):
+            self.tasks.discard(task)
+            self.metrics.record(name, self.pluginName(plugin), time.perf_counter() - start, True)
+            window.setLogMsg(window.translate("Found error in '{}' - '{}'").format(command, e), self.__windowApi.Color.ERROR)
+
+        task.progressChanged.connect(progress)
+        task.finished.connect(finished)
+        task.failed.connect(failed)
+        if inspect.iscoroutinefunction(cnd.run) and not getattr(cnd, "background", False):
+            return task.spawn(cnd.run(*args or [], **kwargs or {}), window)
+        return task.start(cnd.run, *args or [], **kwargs or {})
+
+    def cancelTasks(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+    @staticmethod
+    def pluginName(plugin):
+        if plugin is None:
+            return ""
+        if isinstance(plugin, str):
+            return plugin
+        return getattr(plugin, "__name__", None) or str(plugin)
+
     def registerClass(self, data):
         commandClass = data.get("command")
         if inspect.isclass(commandClass):
@@ -213,9 +487,8 @@ class PluginManager:
             action = data.get("action") or QtGui.QAction("", self.__window)
             chkdStatePath = data.get("checkedStatePath")
             if 'shortcut' in data:
-                if not data['shortcut'] in self.shortcuts:
+                if self.registerShortcut(data['shortcut'], action, commandN):
                     action.setShortcut(QtGui.QKeySequence(data['shortcut']))
-                    self.shortcuts.append(data['shortcut'])
                     action.triggered.connect(lambda: self.executeCommand({"command": commandN, "args": args, "kwargs": kwargs}))
                     self.__window.addAction(action)
             self.regCommands[commandN] = {
@@ -244,12 +517,21 @@ class PluginManager:
         chkdStatePath = commandInfo.get("checkedStatePath")
         action.triggered.connect(lambda: self.executeCommand({"command": commandN, "args": args, "kwargs": kwargs}))
         if 'shortcut' in commandInfo:
-            if not commandInfo['shortcut'] in self.shortcuts:
+            if self.registerShortcut(commandInfo['shortcut'], action, commandN):
                 action.setShortcut(QtGui.QKeySequence(commandInfo['shortcut']))
-                self.shortcuts.append(commandInfo['shortcut'])
                 self.__window.addAction(action)
 
-        if pl:
+        if isinstance(pl, LazyPlugin):
+            # Модуль импортируется при первом запуске команды
+            self.regCommands[commandN] = {
+                "action": action,
+                "command": None,
+                "args": args,
+                "kwargs": kwargs,
+                "plugin": pl,
+                "checkedStatePath": chkdStatePath,
+            }
+        elif pl:
             try:
                 command_func = getattr(pl, commandN)
                 self.regCommands[commandN] = {
@@ -297,12 +579,38 @@ class PluginManager:
 
         return None
 
+    @staticmethod
+    def normalizeShortcut(shortcut):
+        """Приводит сочетание к единому виду: 'ctrl+k,ctrl+c' -> 'Ctrl+K, Ctrl+C'"""
+        if not isinstance(shortcut, QtGui.QKeySequence):
+            shortcut = QtGui.QKeySequence(shortcut)
+        return shortcut.toString(QtGui.QKeySequence.SequenceFormat.PortableText)
+
+    def registerShortcut(self, shortcut, action, command=None):
+        """Добавляет сочетание в таблицу. Возвращает False, если сочетание уже занято или перекрывается с другим ('Ctrl+K' и 'Ctrl+K, Ctrl+C')"""
+        key = self.normalizeShortcut(shortcut)
+        if not key:
+            return False
+        if key in self.shortcuts:
+            self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Shortcut '{}' for function '{}' is already used.").format(shortcut, command))
+            return False
+        chords = key.split(", ")
+        conflict = key in self.shortcutPrefixes or any(", ".join(chords[:i]) in self.shortcuts for i in range(1, len(chords)))
+        if conflict:
+            # Одно сочетание начало другого: более длинное никогда бы не сработало
+            self.__windowApi.activeWindow.setLogMsg(self.__windowApi.activeWindow.translate("Shortcut '{}' for function '{}' conflicts with another shortcut.").format(shortcut, command))
+            return False
+        self.shortcuts[key] = action
+        for i in range(1, len(chords)):
+            self.shortcutPrefixes.add(", ".join(chords[:i]))
+        return True
+
     def findActionShortcut(self, shortcut):
-        key_sequence = QtGui.QKeySequence(shortcut)
-        actions = self.__window.actions()
-        for action in actions:
-            if action.shortcut() == key_sequence:
-                return action
+        return self.shortcuts.get(self.normalizeShortcut(shortcut))
+
+    def isShortcutPrefix(self, shortcut):
+        """Проверяет, начинается ли с этих аккордов какое-либо многоаккордное сочетание"""
+        return self.normalizeShortcut(shortcut) in self.shortcutPrefixes
 
     def findMenu(self, menubar, menu_id):
         for action in menubar.actions():
@@ -0,0 +1,38 @@
+"""
+Скорость поиска и замены в документе через View.finder().
+
+    python benchmarks/find.py [matches]
+
+"find" - полный поиск, "edit" - обновление индекса совпадений после одной правки,
+"replaceAll" - замена всех совпадений одним шагом отмены.
+"""
+import sys, os, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6 import QtWidgets
+from api2 import VtAPI
+from ui import MainWindow
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def main():
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    window = MainWindow(VtAPI(app))
+    window.api.activeWindow.newFile()
+    view = window.api.activeWindow.activeView
+    view.setText("word x\n" * matches)
+    finder = view.finder()
+    found, elapsed = timed(lambda: len(finder.find("x", literal=True)))
+    print(f"{'find':>10}: {found} matches in {elapsed * 1000:.1f} ms")
+    _, elapsed = timed(lambda: view.insert("x", window.api.Point(matches // 2, 0)))
+    print(f"{'edit':>10}: {finder.count()} matches in {elapsed * 1000:.1f} ms")
+    replaced, elapsed = timed(lambda: finder.replaceAll("yy"))
+    print(f"{'replaceAll':>10}: {replaced} matches in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Скорость полной переподсветки StandartHighlighter (блоков в секунду).
+
+    python benchmarks/highlighter.py [lines]
+
+"before" повторяет старый highlightBlock, который создавал QRegularExpression
+и QTextCharFormat для каждого правила в каждом блоке.
+"""
+import sys, os, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6 import QtCore, QtGui, QtWidgets
+from addit import StandartHighlighter
+
+RULES = {
+    "keywords": {"pattern": [r"\b%s\b" % w for w in [
+        "and", "assert", "break", "class", "continue", "def", "del", "elif", "else", "except",
+        "finally", "for", "from", "global", "if", "import", "in", "is", "lambda", "not", "or",
+        "pass", "raise", "return", "try", "while", "yield", "None", "True", "False"]], "color": "#c87832", "weight": "bold"},
+    "operators": {"pattern": ["=", "==", "!=", "<", "<=", ">", ">=", r"\+", "-", r"\*", "/"], "color": "#969696"},
+    "braces": {"pattern": [r"\{", r"\}", r"\(", r"\)", r"\[", r"\]"], "color": "darkGray"},
+    "string": {"pattern": [r'"[^"\\]*(\\.[^"\\]*)*"', r"'[^'\\]*(\\.[^'\\]*)*'"], "color": "#146e64"},
+    "self": {"pattern": [r"\bself\b"], "color": "#96558c", "weight": "italic"},
+    "comment": {"pattern": [r"#[^\n]*"], "color": "#808080"},
+    "numbers": {"pattern": [r"\b[+-]?[0-9]+[lL]?\b", r"\b[+-]?[0-9]+(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?\b"], "color": "#6496be"},
+}
+
+SOURCE = '''class Example(object):
+    def method(self, value=10):
+        # comment line with words
+        if value >= 3 and self.flag is not None:
+            return {"key": [value * 2.5, 'text']}
+        for i in range(value):
+            self.items.append(i + 1)
+'''
+
+class BeforeHighlighter(StandartHighlighter):
+    def highlightBlock(self, text):
+        for category, rule in self.highlightingRules.items():
+            text_format = self.createTextFormat(rule)
+            for pattern in rule['pattern']:
+                match = QtCore.QRegularExpression(pattern).globalMatch(text)
+                while match.hasNext():
+                    match_item = match.next()
+                    self.setFormat(match_item.capturedStart(), match_item.capturedLength(), text_format)
+        self.setCurrentBlockState(0)
+
+def run(cls, document, merge=False):
+    highlighter = cls(None)
+    for category, rule in RULES.items():
+        highlighter.addHighlightingRule(category, rule)
+    highlighter.setMergeRules(merge)
+    highlighter.setDocument(document)
+    start = time.perf_counter()
+    highlighter.rehighlight()
+    elapsed = time.perf_counter() - start
+    highlighter.setDocument(None)
+    return document.blockCount() / elapsed
+
+def main():
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    document = QtGui.QTextDocument((SOURCE * (lines // SOURCE.count("\n") + 1)))
+    for name, cls, merge in [("before", BeforeHighlighter, False), ("compiled", StandartHighlighter, False), ("merged", StandartHighlighter, True)]:
+        print(f"{name:>9}: {run(cls, document, merge):>10.0f} blocks/s")
+
+if __name__ == "__main__":
+    main()
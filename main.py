@@ -1,13 +1,21 @@
-from ui import MainWindow, QtWidgets
+import time
+importStart = time.perf_counter()
+
+from ui import MainWindow, QtWidgets, tracer
 from api import VtAPI
 
 import sys
 
+tracer.setOrigin(importStart)
+tracer.addSpan("import ui, api", importStart, time.perf_counter(), "import")
+
 def main():
     sys.path.insert(0, ".")
-    app = QtWidgets.QApplication(sys.argv)
-    api = VtAPI(app)
-    w = MainWindow(api)
+    with tracer.span("QApplication"):
+        app = QtWidgets.QApplication(sys.argv)
+        api = VtAPI(app)
+    with tracer.span("MainWindow"):
+        w = MainWindow(api)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
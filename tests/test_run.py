@@ -1,5 +1,6 @@
 import pytest
 from PySide6.QtWidgets import QApplication
+from PySide6 import QtGui
 from ui import MainWindow
 from api2 import VtAPI
 
@@ -71,4 +72,749 @@ def test_add_and_remove_tags(main_window):
     main_window.api.activeWindow.activeView.addTag(test_file, test_tag)
     assert test_tag in main_window.api.activeWindow.activeView.getTags(test_file)
     main_window.api.activeWindow.activeView.removeTag(test_file, test_tag)
-    assert test_tag not in main_window.api.activeWindow.activeView.getTags(test_file)
\ No newline at end of file
+    assert test_tag not in main_window.api.activeWindow.activeView.getTags(test_file)
+def test_file_streaming_read(api, tmp_path):
+    """Тестируем чтение файла одним буфером и построчно."""
+    path = tmp_path / "big.txt"
+    path.write_text("строка\r\n" * 400000 + "end", encoding="utf-8", newline="")
+    f = api.File(str(path))
+    assert f.readAll() == path.read_bytes().decode("utf-8")
+    lines = list(f.lines())
+    assert len(lines) == 400001
+    assert lines[0] == "строка" and lines[-1] == "end"
+    progress = []
+    assert "".join(f.blocks(lambda done, total: progress.append((done, total)))) == f.readAll()
+    assert progress[-1] == (f.size(), f.size())
+
+    # Файл, обрезанный во время чтения (ротация лога), просто заканчивается
+    blocks = f.blocks()
+    first = next(blocks)
+    path.write_bytes(b"")
+    assert "".join(blocks) == "" and first
+
+def test_view_load_file(main_window, tmp_path):
+    """Тестируем загрузку файла во вкладку по блокам."""
+    path = tmp_path / "load.txt"
+    path.write_text("line\n" * 1000, encoding="utf-8", newline="")
+    view = main_window.api.activeWindow.activeView
+    view.loadFile(str(path))
+    assert view.getText() == "line\n" * 1000
+
+def test_view_large_file_mode(main_window, tmp_path):
+    """Тестируем режим больших файлов: в документе только окно строк."""
+    path = tmp_path / "large.log"
+    text = "".join(f"log line {i}\n" for i in range(10000))
+    path.write_text(text, encoding="utf-8", newline="")
+    view = main_window.api.activeWindow.activeView
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    textEdit.largeFileThreshold = 1024
+    view.loadFile(str(path))
+    assert view.isLargeFile()
+    assert textEdit.document().blockCount() == textEdit.windowLines
+    assert view.size() == len(text)
+    assert view.substr(main_window.api.Region(len(text) - 14, len(text))) == text[-14:]
+    pos = text.index("log line 9000")
+    view.replace(main_window.api.Region(pos, pos + 3), "LOG")
+    text = text[:pos] + "LOG" + text[pos + 3:]
+    view.insert("header\n", main_window.api.Point(0, 0))
+    text = "header\n" + text
+    assert view.getText() == text
+    assert textEdit.toPlainText().startswith("header\nlog line 0")
+
+def test_word_index_incremental(main_window):
+    """Тестируем обновление индекса автодополнения по изменённым блокам."""
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    textEdit.setPlainText("alpha beta\nalphabet alpha\ngamma")
+    assert textEdit.wordIndex.complete("alp") == ["alpha", "alphabet"]
+    cursor = textEdit.textCursor()
+    cursor.setPosition(len("alpha beta\n"))
+    cursor.movePosition(QtGui.QTextCursor.MoveOperation.EndOfBlock, QtGui.QTextCursor.MoveMode.KeepAnchor)
+    cursor.insertText("delta\nalpine")
+    assert textEdit.wordIndex.complete("alp") == ["alpha", "alpine"]
+    assert textEdit.wordIndex.complete("del") == ["delta"]
+    textEdit.wordIndex.rebuild()
+    assert textEdit.wordIndex.complete("alp") == ["alpha", "alpine"]
+
+def test_highlighter_compiled_rules(main_window):
+    """Тестируем подсветку скомпилированными и объединёнными правилами."""
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    highLighter = textEdit.highLighter
+    highLighter.addHighlightingRule("keywords", {"pattern": [r"\bdef\b", r"\b(return)\b"], "color": "#ff0000"})
+    highLighter.addHighlightingRule("numbers", {"pattern": [r"\b[0-9]+\b"], "color": "#0000ff"})
+    textEdit.setPlainText("def f():\n    return 42")
+
+    def formats():
+        highLighter.rehighlight()
+        block = textEdit.document().begin()
+        result = []
+        while block.isValid():
+            result.append([(r.start, r.length, r.format.foreground().color().name()) for r in block.layout().formats()])
+            block = block.next()
+        return result
+
+    plain = formats()
+    assert plain == [[(0, 3, "#ff0000")], [(4, 6, "#ff0000"), (11, 2, "#0000ff")]]
+    highLighter.setMergeRules(True)
+    assert formats() == plain
+
+    # Правило со ссылкой на группу по номеру выполняется отдельно от общего выражения
+    highLighter.addHighlightingRule("doubles", {"pattern": [r"\b(\w)\1\b"], "color": "#00ff00"})
+    textEdit.setPlainText("def f():\n    return 42 aa ab")
+    assert formats()[1] == [(4, 6, "#ff0000"), (11, 2, "#0000ff"), (14, 2, "#00ff00")]
+
+def test_additional_highlighting_by_line(main_window):
+    """Тестируем дополнительную подсветку, индексированную по строкам."""
+    view = main_window.api.activeWindow.activeView
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    textEdit.setPlainText("first line\nsecond line\nthird line")
+    spans = [{"line": 1, "pos": (0, 6), "color": "#ff0000"}, {"line": 2, "pos": (6, 10), "bg": "#00ff00"}]
+    view.setAddititionalHL(spans)
+
+    def formats(line):
+        return [(r.start, r.length) for r in textEdit.document().findBlockByNumber(line).layout().formats()]
+
+    assert formats(0) == [] and formats(1) == [(0, 6)] and formats(2) == [(6, 4)]
+    view.removeAdditionalHL([spans[0]])
+    assert formats(1) == [] and formats(2) == [(6, 4)]
+    view.addAdditionalHL([{"line": 0, "pos": (0, 5), "weight": "bold"}])
+    assert formats(0) == [(0, 5)]
+    view.clearAdditionalHL()
+    assert textEdit.highLighter.additData == [] and formats(2) == []
+
+def test_highlighter_deferred_blocks(main_window, qtbot):
+    """Тестируем отложенную подсветку: результат совпадает с полной подсветкой, состояния многострочных правил сохраняются."""
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    highLighter = textEdit.highLighter
+    highLighter.addHighlightingRule("keywords", {"pattern": [r"\bdef\b"], "color": "#ff0000"})
+    highLighter.addHighlightingRule("multi_line_strings", {"start": '"""', "end": '"""', "color": "#00ff00"})
+    lines = ["def f():"] * 600
+    lines[10], lines[500] = 'x = """', '""" def'
+    textEdit.setPlainText("\n".join(lines))
+
+    def formats():
+        block = textEdit.document().begin()
+        result = []
+        while block.isValid():
+            result.append((block.userState(), [(r.start, r.length) for r in block.layout().formats()]))
+            block = block.next()
+        return result
+
+    highLighter.sliceTime = 60
+    highLighter.rehighlight()
+    expected = formats()
+    assert expected[20] == (1, [(0, 8)]) and expected[550] == (0, [(0, 3)])
+
+    highLighter.sliceTime = 0.001
+    highLighter.rehighlight()
+    assert highLighter.isHighlightPending()
+    qtbot.waitUntil(lambda: not highLighter.isHighlightPending(), timeout=20000)
+    assert formats() == expected
+
+def test_minimap_renders_changed_blocks(main_window, qtbot):
+    """Тестируем миникарту: перерисовываются только изменённые блоки, пиксели строятся по тексту документа."""
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    minimap = textEdit.minimap
+    minimap.resize(150, 200)
+    textEdit.setPlainText("\n".join(["    line"] * 50))
+    qtbot.waitUntil(lambda: minimap._dirty is None and not minimap._cache.isNull())
+
+    image = minimap._cache.toImage()
+    base = image.pixelColor(0, 0)
+    assert image.pixelColor(6, 0) != base
+    assert image.pixelColor(2 * minimap.lineHeight * 3, 5 * minimap.lineHeight) == base
+
+    cursor = QtGui.QTextCursor(textEdit.document().findBlockByNumber(5))
+    cursor.insertText("x" * 20)
+    assert minimap._dirty == (5, 5)
+    qtbot.waitUntil(lambda: minimap._dirty is None)
+    image = minimap._cache.toImage()
+    assert image.pixelColor(20, 5 * minimap.lineHeight) != base
+    assert image.pixelColor(20, 6 * minimap.lineHeight) == base
+
+def test_line_number_area_width_and_repaints(main_window):
+    """Тестируем область номеров строк: ширина меняется только с числом разрядов, лишние перерисовки пропускаются."""
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    area = textEdit.line_number_area
+    textEdit.setPlainText("\n".join(["line"] * 20))
+    width = area.width()
+    assert area._digits == 2
+    textEdit.append("more")
+    assert area.width() == width
+    textEdit.setPlainText("\n".join(["line"] * 150))
+    assert area._digits == 3 and area.width() > width
+
+    textEdit.resize(400, 300)
+    textEdit.verticalScrollBar().setValue(textEdit.verticalScrollBar().maximum())
+    area.grab()
+    assert area._paintedState == area.viewState()
+    textEdit.verticalScrollBar().setValue(0)
+    assert area._paintedState != area.viewState()
+
+def test_signal_priority_and_arity(main_window, qtbot):
+    """Тестируем сигнал: порядок по приоритету, слоты без аргументов, объединённый вызов."""
+    from api import VtAPI
+    signal = VtAPI.Widgets.Signal(str)
+    calls = []
+    def low(value): calls.append(("low", value))
+    def high(): calls.append(("high",))
+    def default(*args): calls.append(("default",) + args)
+    signal.connect(low, priority=0)
+    signal.connect(high, priority=5)
+    signal.connect(default)
+    signal.connect(print)
+    signal.disconnect(print)
+    signal.emit("a")
+    assert calls == [("high",), ("default", "a"), ("low", "a")]
+    assert signal.slotCount() == 3
+
+    calls.clear()
+    signal.emitCoalesced("b")
+    signal.emitCoalesced("c")
+    assert calls == []
+    qtbot.waitUntil(lambda: len(calls) == 3)
+    assert calls == [("high",), ("default", "c"), ("low", "c")]
+
+def test_logger_ring_buffer(main_window, tmp_path, monkeypatch):
+    """Тестируем лог: ограниченный буфер записей, сигнал получает только новую запись, запись в файл в фоне."""
+    logger = main_window.logger
+    window = main_window.api.activeWindow
+    received = []
+    window.signals.logWrited.connect(received.append)
+    logger.setCapacity(3)
+    path = tmp_path / "log.txt"
+    logger.setFile(open(path, "w"))
+    for i in range(5):
+        window.setLogMsg(f"message {i}", main_window.api.Color.ERROR)
+    assert [r.message for r in window.getLogRecords()] == ["message 2", "message 3", "message 4"]
+    assert "message 1" not in window.getLog() and "message 4" in window.getLog()
+    assert "message 4" in received[-1] and "message 3" not in received[-1]
+    # Полный буфер: чтение лога склеивает готовые фрагменты, записи заново не рендерятся
+    rendered = []
+    render = logger.render
+    monkeypatch.setattr(logger, "render", lambda record: rendered.append(record) or render(record))
+    window.setLogMsg("message 5", main_window.api.Color.ERROR)
+    log = window.getLog()
+    assert len(rendered) == 1 and "message 2" not in log and log.endswith(received[-1])
+    logger.setFile(None)
+    assert path.read_text().count("message") == 6
+
+def test_translation_cache(main_window):
+    """Тестируем кеш переводов: повторный перевод берётся из кеша, смена языка сбрасывает кеш."""
+    window = main_window.api.activeWindow
+    start = window.translationCacheInfo()
+    assert window.translate("Unique test string") == "Unique test string"
+    assert window.translate("Unique test string") == "Unique test string"
+    info = window.translationCacheInfo()
+    assert info["misses"] == start["misses"] + 1 and info["hits"] == start["hits"] + 1
+    window.setLocale("en")
+    assert window.translationCacheInfo()["size"] == 0
+
+def test_shortcut_registry(main_window):
+    """Тестируем таблицу сочетаний: нормализация, конфликты, многоаккордные сочетания."""
+    from PySide6 import QtCore
+    pl = main_window.pl
+    triggered = []
+    single, chord = QtGui.QAction(main_window), QtGui.QAction(main_window)
+    single.triggered.connect(lambda: triggered.append("single"))
+    chord.triggered.connect(lambda: triggered.append("chord"))
+    assert pl.registerShortcut("ctrl+alt+j", single)
+    assert not pl.registerShortcut("Ctrl+Alt+J", chord)
+    assert pl.registerShortcut("Ctrl+Alt+K, Ctrl+Alt+U", chord)
+    assert pl.findActionShortcut("Alt+Ctrl+J") is single
+    assert pl.isShortcutPrefix("Ctrl+Alt+K")
+
+    def press(key):
+        mods = QtCore.Qt.KeyboardModifier.ControlModifier | QtCore.Qt.KeyboardModifier.AltModifier
+        main_window.keyPressEvent(QtGui.QKeyEvent(QtCore.QEvent.Type.KeyPress, key, mods))
+    press(QtCore.Qt.Key.Key_J)
+    press(QtCore.Qt.Key.Key_K)
+    assert triggered == ["single"]
+    press(QtCore.Qt.Key.Key_U)
+    assert triggered == ["single", "chord"]
+
+    # Сочетание не может быть началом другого и наоборот
+    other = QtGui.QAction(main_window)
+    assert not pl.registerShortcut("Ctrl+Alt+K", other)
+    assert not pl.registerShortcut("Ctrl+Alt+J, Ctrl+Alt+U", other)
+    assert pl.findActionShortcut("Ctrl+Alt+K") is None and not pl.isShortcutPrefix("Ctrl+Alt+J")
+    # Аккорд, прервавший сочетание, сам начинает новое
+    press(QtCore.Qt.Key.Key_K)
+    press(QtCore.Qt.Key.Key_J)
+    assert triggered == ["single", "chord", "single"]
+    press(QtCore.Qt.Key.Key_K)
+    press(QtCore.Qt.Key.Key_K)
+    press(QtCore.Qt.Key.Key_U)
+    assert triggered == ["single", "chord", "single", "chord"]
+
+def test_lazy_plugin_activation(main_window, tmp_path):
+    """Тестируем ленивую загрузку плагинов: манифесты кешируются, модуль импортируется при первой команде или сигнале."""
+    import json, sys
+    from api2 import PluginManager, LazyPlugin
+    for name in ("LazyMenu", "LazySignal", "EagerMenu"):
+        plugin = tmp_path / name
+        plugin.mkdir()
+        manifest = {"name": name, "main": "main.py", "menu": "menu.vt-menu" if "Menu" in name else "", "activationSignals": ["fileSaved"]}
+        if name.startswith("Lazy"):
+            manifest["activation"] = "lazy"
+        (plugin / "config.vt-conf").write_text(json.dumps(manifest))
+        (plugin / "main.py").write_text(
+            "from api import VtAPI\n"
+            "calls = []\n"
+            "def initAPI(api): api.activeWindow.signals.fileSaved.connect(lambda v: calls.append(('saved', v)))\n"
+            "class HelloCommand(VtAPI.Plugin.ApplicationCommand):\n"
+            "    def run(self): calls.append('hello')\n"
+        )
+    (tmp_path / "LazyMenu" / "menu.vt-menu").write_text(json.dumps({"menuBar": [{"caption": "Hello", "command": {"command": "HelloCommand"}}, {"caption": "Missing", "command": {"command": "MissingCommand"}}]}))
+    (tmp_path / "EagerMenu" / "menu.vt-menu").write_text(json.dumps({"menuBar": []}))
+
+    pl = PluginManager(str(tmp_path), main_window)
+    pl.loadPlugins()
+    assert isinstance(pl.module, LazyPlugin)
+    assert "LazyMenuPlugin" not in sys.modules and "LazySignalPlugin" not in sys.modules
+    # Без "activation": "lazy" плагин загружается при запуске
+    assert "EagerMenuPlugin" in sys.modules
+    assert any(p.endswith("config.vt-conf") for p in pl.manifestCache)
+
+    pl.executeCommand({"command": "HelloCommand"})
+    assert sys.modules["LazyMenuPlugin"].calls == ["hello"]
+    pl.executeCommand({"command": "MissingCommand"})
+    log = main_window.api.activeWindow.getLog()
+    assert "Command 'MissingCommand' not found in plugin 'LazyMenuPlugin'" in log and "Found error" not in log
+
+    main_window.api.activeWindow.signals.fileSaved.emit("view")
+    assert sys.modules["LazySignalPlugin"].calls == [("saved", "view")]
+
+def test_startup_tracer(tmp_path):
+    """Тестируем трассировку запуска: отрезки пишутся в JSON и в формат Chrome trace."""
+    import json
+    from addit import StartupTracer
+    tracer = StartupTracer()
+    with tracer.span("settings"):
+        pass
+    with tracer.span("import Plugin", "import", plugin="Plugin"):
+        pass
+    tracer.enable(str(tmp_path / "trace.json"))
+    tracer.finish()
+    report = json.loads((tmp_path / "trace.json").read_text())
+    assert [s["name"] for s in report["spans"]] == ["settings", "import Plugin"]
+    events = json.loads((tmp_path / "trace.chrome.json").read_text())["traceEvents"]
+    assert events[1]["ph"] == "X" and events[1]["cat"] == "import" and events[1]["args"] == {"plugin": "Plugin"}
+
+def test_command_metrics(main_window, tmp_path):
+    """Тестируем статистику команд: количество вызовов, ошибки, перцентили и экспорт."""
+    import json
+    from api import VtAPI
+    window = main_window.api.activeWindow
+
+    class MetricsCommand(VtAPI.Plugin.ApplicationCommand):
+        def run(self, fail=False):
+            if fail: raise ValueError("fail")
+
+    window.registerCommandClass({"command": MetricsCommand})
+    window.resetCommandMetrics()
+    for _ in range(3):
+        window.runCommand({"command": "MetricsCommand"})
+    window.runCommand({"command": "MetricsCommand", "kwargs": {"fail": True}})
+    stat = window.commandMetrics()["commands"]["MetricsCommand"]
+    assert stat["count"] == 4 and stat["errors"] == 1
+    assert 0 <= stat["p50_ms"] <= stat["p99_ms"] <= max(stat["max_ms"], 0.1)
+    assert sum(stat["histogram"].values()) == 4
+    assert window.commandMetrics()["plugins"][MetricsCommand.__module__]["count"] == 4
+
+    window.exportCommandMetrics(str(tmp_path / "metrics.json"))
+    assert json.loads((tmp_path / "metrics.json").read_text())["commands"]["MetricsCommand"]["count"] == 4
+
+def test_background_command(main_window, qtbot):
+    """Тестируем фоновые команды: выполнение в пуле, прогресс, отмену и возврат в поток интерфейса."""
+    import threading
+    from api import VtAPI
+    window = main_window.api.activeWindow
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    class SlowCommand(VtAPI.Plugin.ApplicationCommand):
+        background = True
+        def run(self):
+            calls.append(threading.current_thread() is threading.main_thread())
+            started.set()
+            self.setProgress(50, "half")
+            release.wait(5)
+            if self.isCancelled(): return "cancelled"
+            self.runOnGui(lambda: calls.append(threading.current_thread() is threading.main_thread()))
+
+    window.registerCommandClass({"command": SlowCommand})
+    window.runCommand({"command": "SlowCommand"})
+    assert started.wait(5)
+    # На старте окна может работать фоновая установка Basic (LoadBasicCommand), считаем только свои задачи
+    slowTasks = lambda: [t for t in window.tasks() if t.name == "SlowCommand"]
+    assert len(slowTasks()) == 1
+    release.set()
+    qtbot.waitUntil(lambda: not slowTasks(), timeout=5000)
+    qtbot.waitUntil(lambda: len(calls) == 2, timeout=5000)
+    assert calls == [False, True]
+
+    release.clear(); started.clear()
+    window.runCommand({"command": "SlowCommand"})
+    assert started.wait(5)
+    window.cancelTasks()
+    release.set()
+    qtbot.waitUntil(lambda: not slowTasks(), timeout=5000)
+    assert "cancelled" in window.getLog()
+
+    task = main_window.api.runTask(lambda a, b: a + b, 2, 3)
+    assert task.result(5) == 5
+
+def test_async_loop(main_window, qtbot, tmp_path):
+    """Тестируем цикл asyncio внутри Qt: корутины окна, асинхронные файлы, процессы и отмену при закрытии."""
+    import asyncio, sys
+    from api import VtAPI
+    api = main_window.api
+    window = api.activeWindow
+    results = []
+
+    async def work():
+        path = str(tmp_path / "async.txt")
+        await api.File(path).writeAsync("hello")
+        text = await api.File(path).readAsync()
+        code, out, err = await VtAPI.Widgets.Process().runAsync(sys.executable, ["-c", "print(input())"], "ping")
+        results.append((text, code, out.strip()))
+
+    window.spawn(work())
+    qtbot.waitUntil(lambda: bool(results), timeout=10000)
+    assert results == [("hello", 0, b"ping")]
+
+    window.spawn(asyncio.sleep(60))
+    assert len(window.asyncTasks()) == 1
+    window.cancelAsyncTasks()
+    qtbot.waitUntil(lambda: not window.asyncTasks(), timeout=5000)
+
+    class AsyncCommand(VtAPI.Plugin.ApplicationCommand):
+        async def run(self):
+            await asyncio.sleep(0)
+            results.append("command")
+
+    window.registerCommandClass({"command": AsyncCommand})
+    window.runCommand({"command": "AsyncCommand"})
+    qtbot.waitUntil(lambda: "command" in results and not [t for t in window.tasks() if t.name == "AsyncCommand"], timeout=5000)
+    # Без задач цикл не опрашивается
+    qtbot.waitUntil(lambda: not api.asyncLoop().timer.isActive(), timeout=5000)
+
+@pytest.fixture
+def tag_service(app, tmp_path):
+    """База тегов во временной папке: тесты не трогают настоящую базу .ft."""
+    from addit import TagService
+    service = TagService(str(tmp_path / "tags.db"))
+    yield service
+    service.close()
+
+def test_tagdb_bulk(tag_service):
+    """Тестируем пакетные операции TagDB: теги на много файлов одной транзакцией, retag, импорт и отсутствие побочных эффектов."""
+    db = tag_service
+    files = [f"/project/file{i}.py" for i in range(2000)]
+    assert db.tagFiles(files, ["python", "project"]).result()
+    assert set(db.getTagsForFile(files[1234])) == {"python", "project"}
+    assert len(db.getFilesForTag("python")) == 2000
+
+    db.retag(files[0], ["main"])
+    assert db.getTagsForFile(files[0]) == ["main"]
+    db.importTags({files[1]: ["a", "b"], files[2]: ["a"]}, replace=True)
+    assert db.getTagsForFile(files[2]) == ["a"]
+    assert db.exportTags()[files[1]] == ["a", "b"]
+    assert len(db.getFilesForTag("python")) == 1997 and len(db.exportTags()) == 2000
+
+    db.addTag(files[3], "python")
+    assert db.getTagsForFile(files[3]).count("python") == 1
+    assert db.getTagsForFile("/project/missing.py") == []
+    assert db.addFile("/project/missing.py").result() == db.addFile("/project/missing.py").result()
+
+def test_tag_query(main_window, tag_service, monkeypatch):
+    """Тестируем запросы по тегам: AND/OR/NOT, префиксы, количество и сброс кеша по сигналу."""
+    db = tag_service
+    monkeypatch.setattr(main_window, "tagBase", db)
+    window = main_window.api.activeWindow
+    window.signals.fileTagAdded.connect(db.invalidate)
+    window.newFile()
+    view = window.activeView
+    assert view.tagBase is db
+    db.importTags({"/q/a.py": ["qpython", "qtest"], "/q/b.py": ["qpython"], "/q/c.md": ["qdocs", "qdraft"]}, replace=True)
+
+    assert view.findTagFiles("qpython AND qtest") == ["/q/a.py"]
+    assert view.findTagFiles("#qpython & !qtest") == ["/q/b.py"]
+    assert view.findTagFiles("qtest OR (qdocs NOT qdraft)") == ["/q/a.py"]
+    assert window.findTagFiles("qp* | qdocs") == ["/q/a.py", "/q/b.py", "/q/c.md"]
+    assert "/q/a.py" not in window.findTagFiles("NOT qpython")
+    assert window.countTagFiles("qpython") == 2
+    assert window.tagCounts("qd") == {"qdocs": 1, "qdraft": 1}
+    with pytest.raises(ValueError):
+        window.findTagFiles("qpython AND (qtest")
+
+    # Изменения в обход TagDB видны после сигнала fileTagAdded
+    db.submit(lambda tagDB: tagDB._exec("DELETE FROM file_tags WHERE file_id = (SELECT id FROM files WHERE filename = '/q/b.py')")).result()
+    assert window.countTagFiles("qpython") == 2
+    window.signals.fileTagAdded.emit(view, "qpython")
+    assert window.countTagFiles("qpython") == 1
+
+    # Файл с двумя тегами на один префикс считается один раз
+    db.addTag("/q/a.py", "qpyqt").result()
+    assert window.countTagFiles("qpy*") == 1 and window.findTagFiles("qpy*") == ["/q/a.py"]
+
+def test_tag_service_thread(main_window, qtbot):
+    """Тестируем работу с базой тегов в отдельном потоке: объединение записи и асинхронное чтение."""
+    import threading
+    db = main_window.tagBase
+    view = main_window.api.activeWindow.activeView
+    assert db.submit(lambda tagDB: threading.current_thread().name).result().startswith("vt-tagdb")
+
+    futures = [db.addTag("/s/file.py", f"s{i}") for i in range(20)]
+    assert not any(f.done() for f in futures)
+    qtbot.waitUntil(lambda: all(f.done() for f in futures), timeout=5000)
+
+    # result() не ждет таймер, ошибка одной операции в пакете не откатывает остальные
+    bad, good = db.addTag(None, "broken"), db.addTag("/s/other.py", "s0")
+    assert good.result(5) is None
+    with pytest.raises(RuntimeError):
+        bad.result(5)
+    assert db.getTagsForFile("/s/other.py") == ["s0"]
+
+    results = []
+    view.addTag("/s/file.py", "s20")
+    assert view.getTags("/s/file.py", callback=results.append) == []
+    qtbot.waitUntil(lambda: bool(results), timeout=5000)
+    assert sorted(results[0]) == sorted(f"s{i}" for i in range(21))
+    view.countTagFiles("s0", callback=results.append)
+    qtbot.waitUntil(lambda: len(results) == 2, timeout=5000)
+    assert results[1] == 2
+
+def test_tag_service_closed(tag_service):
+    """Тестируем базу тегов после закрытия: запись и чтение сразу завершаются ошибкой, а не ждут вечно."""
+    tag_service.close()
+    future = tag_service.addTag("/c/file.py", "late")
+    assert future.done()
+    with pytest.raises(RuntimeError):
+        future.result(1)
+    with pytest.raises(RuntimeError):
+        tag_service.submit(lambda db: None).result(1)
+    with pytest.raises(RuntimeError):
+        tag_service.getTagsForFile("/c/file.py")
+
+def test_view_edits(main_window):
+    """Тестируем правки вида: без перезаписи документа, пакетом одним шагом отмены и с проверкой пересечений."""
+    from api import VtAPI
+    view = main_window.api.activeWindow.activeView
+    document = main_window.tabWidget.currentWidget().textEdit.document()
+    view.setText("alpha beta\ngamma delta\n")
+    first = document.firstBlock()
+
+    view.replace(VtAPI.Region(0, 5), "ALPHA")
+    view.erase(VtAPI.Region(5, 10))
+    view.insert("!", VtAPI.Point(1, 5))
+    assert view.getText() == "ALPHA\ngamma! delta\n"
+    assert document.firstBlock() == first
+    assert view.substr(VtAPI.Region(6, 12)) == "gamma!"
+
+    with view.edit() as edit:
+        edit.replace(VtAPI.Region(6, 11), "G")
+        edit.insert(0, "> ")
+        edit.erase(VtAPI.Region(12, 13))
+        with pytest.raises(ValueError):
+            edit.replace(VtAPI.Region(8, 12), "x")
+    assert view.getText() == "> ALPHA\nG!delta\n"
+    view.undo()
+    assert view.getText() == "ALPHA\ngamma! delta\n"
+    view.undo()
+    assert view.getText() == "ALPHA\ngamma delta\n"
+
+    view.setText("0123456789")
+    view.replace(VtAPI.Region(5, 1000), "X")
+    assert view.getText() == "01234X"
+    view.erase(VtAPI.Region(3, 1000))
+    assert view.getText() == "012"
+
+def test_view_line_index(main_window):
+    """Тестируем перевод позиций в (строка, столбец) и обратно, и регион строки."""
+    from api import VtAPI
+    view = main_window.api.activeWindow.activeView
+    view.setText("first\nsecond line\n\nlast")
+    assert view.rowcol(0) == (0, 0)
+    assert view.rowcol(8) == (1, 2)
+    assert view.rowcol(18) == (2, 0)
+    assert view.rowcol(1000) == (3, 4)
+    assert view.textPoint(1, 2) == 8
+    assert view.textPoint(1, 100) == 17
+    assert view.textPoint(10) == len(view.getText())
+    line = view.line(8)
+    assert view.substr(line) == "second line"
+    region = view.line(VtAPI.Region(2, 8))
+    assert (region.begin(), region.end()) == (0, 17)
+    view.insert("X", VtAPI.Point(3, 2))
+    assert view.getText().endswith("laXst")
+
+def test_selection_regions(main_window):
+    """Тестируем выделение как набор регионов: слияние, вычитание, поиск, объединение, пересечение и текст."""
+    from api import VtAPI
+    sel = VtAPI.Selection([VtAPI.Region(10, 20), (0, 5), VtAPI.Region(18, 25)])
+    assert sel.pairs() == [(0, 5), (10, 25)]
+    sel.add(VtAPI.Region(5, 7))
+    sel.addAll([(40, 41), (30, 35), (33, 38)])
+    assert sel.pairs() == [(0, 7), (10, 25), (30, 38), (40, 41)]
+    assert sel.contains(12) and sel.contains(38) and not sel.contains(8)
+
+    sel.subtract(VtAPI.Region(12, 15))
+    sel.subtract((32, 50))
+    assert sel.pairs() == [(0, 7), (10, 12), (15, 25), (30, 32)]
+
+    other = VtAPI.Selection([(5, 11), (20, 31)])
+    assert sel.intersection(other).pairs() == [(5, 7), (10, 11), (20, 25), (30, 31)]
+    assert sel.union(other).pairs() == [(0, 12), (15, 32)]
+
+    view = main_window.api.activeWindow.activeView
+    view.setText("0123456789" * 4)
+    assert sel.texts(view) == ["0123456", "01", "5678901234", "01"]
+    assert sel.text(view, sel[1]) == "01"
+
+def test_region_array(main_window):
+    """Тестируем RegionArray: буфер без копирования, срезы, сдвиг при правке, поиск, выделение и подсветку."""
+    from api import VtAPI
+    from array import array
+    flat = array("q", [0, 3, 10, 14, 20, 22])
+    regions = VtAPI.RegionArray(flat)
+    assert len(regions) == 3 and regions[1].begin() == 10 and regions[-1].end() == 22
+    tail = regions[1:]
+    tail.shift(5)
+    assert flat.tolist() == [0, 3, 15, 19, 25, 27]
+    regions.adjust(1, 16, 2)
+    assert regions.pairs() == [(0, 1), (1, 6), (12, 14)]
+    copy = regions.copy()
+    copy.shift(100)
+    assert regions.pairs()[0] == (0, 1) and bytes(regions.buffer()) == flat.tobytes()
+
+    # Буфер (N, 2) оборачивается без копии, буфер только для чтения копируется
+    pairs = memoryview(array("q", [1, 2, 5, 9])).cast("B").cast("q", shape=[2, 2])
+    wrapped = VtAPI.RegionArray(pairs)
+    wrapped.shift(1)
+    assert wrapped.pairs() == [(2, 3), (6, 10)] and pairs.tolist() == [[2, 3], [6, 10]]
+    readonly = VtAPI.RegionArray(array("q", [1, 2]).tobytes())
+    readonly.adjust(0, 0, 3)
+    assert readonly.pairs() == [(4, 5)]
+    with pytest.raises(ValueError):
+        VtAPI.RegionArray(memoryview(array("i", [1, 2])).toreadonly())
+
+    view = main_window.api.activeWindow.activeView
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    view.setText("foo bar\nbar foo\nfoobar")
+    found = view.findAll("foo")
+    assert found.pairs() == [(0, 3), (12, 15), (16, 19)]
+    assert VtAPI.Selection(found).pairs() == found.pairs()
+    assert VtAPI.Selection(found).regionArray().pairs() == found.pairs()
+
+    view.setAddititionalHL(VtAPI.RegionArray([(4, 11)]), {"color": "#ff0000"})
+    formats = lambda line: [(r.start, r.length) for r in textEdit.document().findBlockByNumber(line).layout().formats()]
+    assert formats(0) == [(4, 3)] and formats(1) == [(0, 3)]
+    view.clearAdditionalHL()
+
+def test_view_find_replace(main_window):
+    """Тестируем поиск в документе: кэш шаблонов, поиск по мере набора, индекс при правках и замену всего одним шагом отмены."""
+    from api import VtAPI, compilePattern
+    view = main_window.api.activeWindow.activeView
+    textEdit = main_window.tabWidget.currentWidget().textEdit
+    view.setText("alpha beta\nalphabet\ngamma alpha")
+    finder = view.finder()
+    assert finder is view.finder()
+    assert view.find("al", literal=True).pairs() == [(0, 2), (11, 13), (26, 28)]
+    assert finder.find("alph", literal=True).pairs() == [(0, 4), (11, 15), (26, 30)]
+    assert finder.find("alphab", literal=True).pairs() == [(11, 17)]
+    assert compilePattern("alphab", 0, True) is compilePattern("alphab", 0, True)
+
+    finder.find(r"a(l)pha")
+    assert finder.next(0).begin() == 0 and finder.next().begin() == 11
+    assert finder.next(forward=False).begin() == 0
+
+    view.insert("alpha ", VtAPI.Point(1, 0))
+    assert finder.regions().pairs() == [(0, 5), (11, 16), (17, 22), (32, 37)]
+    view.applyEdits([(6, 10, "alpha")])
+    assert finder.regions().pairs() == [(0, 5), (6, 11), (12, 17), (18, 23), (33, 38)]
+    assert finder.regions().pairs() == view.findAll(r"a(l)pha").pairs()
+
+    assert finder.replaceAll(r"<\1>") == 5
+    assert view.getText() == "<l> <l>\n<l> <l>bet\ngamma <l>"
+    assert finder.count() == 0
+    textEdit.undo()
+    assert view.getText() == "alpha alpha\nalpha alphabet\ngamma alpha"
+
+    view.setText("x " * 100000)
+    assert view.replaceAll("x", "yy", literal=True) == 100000
+    assert textEdit.document().characterCount() == 300001
+
+    view.setText("aaab")
+    finder.find("aa", literal=True)
+    assert finder.find("aab", literal=True).pairs() == [(1, 4)]
+    view.setText("aaa")
+    finder.find("a", literal=True)
+    assert finder.find("aa", literal=True).pairs() == [(0, 2)]
+
+    view.setText("foo bar")
+    finder.find("bar", literal=True)
+    view.erase(VtAPI.Region(4, 7))
+    assert finder.count() == 0 and finder.next() is None
+    # Индексированный регион, которого нет в тексте
+    finder.find("b+")
+    with pytest.raises(ValueError):
+        finder._match("foo", 0, 1)
+
+    view.setText("ab ac")
+    assert view.replaceAll(r"a(?=b)", "X") == 1 and view.getText() == "Xb ac"
+
+def test_view_find_index_fuzz(main_window):
+    """Тестируем индекс совпадений при случайных правках: он всегда совпадает с полным поиском."""
+    import random
+    from api import VtAPI
+    view = main_window.api.activeWindow.activeView
+    rnd = random.Random(7)
+    for pattern, literal in [("ab", True), ("a\nb", True), (r"a\nb", False), (r"\w+", False), (r"b*", False), (r"^", False), (r"a(?=b)", False), (r"a[\t-\r]b", False), (r"$", False), (r"(?<=a )b", False), (r"a\s*b", False)]:
+        view.setText("".join(rnd.choice("ab \n") for _ in range(200)))
+        finder = view.finder()
+        finder.find(pattern, literal=literal)
+        for _ in range(60):
+            length = len(view.getText())
+            begin = rnd.randint(0, length)
+            end = min(length, begin + rnd.randint(0, 4))
+            view.replace(VtAPI.Region(begin, end), "".join(rnd.choice("ab \n") for _ in range(rnd.randint(0, 4))))
+            assert finder.regions().pairs() == view.findAll(pattern, literal=literal).pairs(), (pattern, _)
+
+def test_large_file_buffer_truncated(tmp_path):
+    """Тестируем индекс большого файла, который укоротили во время индексации: чтение не зацикливается."""
+    from addit import LargeFileBuffer
+    path = tmp_path / "rotated.log"
+    path.write_text("".join(f"log line {i}\n" for i in range(1000)), encoding="utf-8", newline="")
+    buffer = LargeFileBuffer(str(path))
+    buffer.indexStep = 1024
+    assert buffer.indexMore()
+    with open(path, "r+b") as file:
+        file.truncate(2000)
+    assert buffer.lines(100000, 100001) == []
+    assert buffer.isIndexed() and not buffer.indexMore()
+    assert buffer.text() == path.read_text(encoding="utf-8")
+    buffer.close()
+
+def test_tag_double_click(main_window, tag_service, monkeypatch, qtbot):
+    """Тестируем двойной клик по тегу: файлы ищутся запросом к базе тегов и передаются команде."""
+    from addit import Tag
+    from api import VtAPI
+    monkeypatch.setattr(main_window, "tagBase", tag_service)
+    window = main_window.api.activeWindow
+    tag_service.importTags({"/d/a.py": ["dtag"], "/d/b.py": ["dtag", "dother"]}, replace=True).result()
+    found = []
+
+    class GetFilesForTagCommand(VtAPI.Plugin.ApplicationCommand):
+        def run(self, tag, files):
+            found.append((tag, files))
+
+    window.registerCommandClass({"command": GetFilesForTagCommand})
+    queries = []
+    queryFiles = tag_service.queryFiles
+    monkeypatch.setattr(tag_service, "queryFiles", lambda expression, callback=None: queries.append(expression) or queryFiles(expression, callback=callback))
+    with qtbot.waitSignal(window.signals.tagFilesFound, timeout=5000) as blocker:
+        Tag("dtag", lambda *a: None, api=main_window.api).mouseDoubleClickEvent(None)
+    assert queries == ['"dtag"']
+    assert blocker.args == ["dtag", ["/d/a.py", "/d/b.py"]]
+    assert found == [("dtag", ["/d/a.py", "/d/b.py"])]
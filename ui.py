@@ -1,10 +1,10 @@
-from PySide6 import QtCore, QtWidgets
+from PySide6 import QtCore, QtWidgets, QtGui
 
 from addit import *
 from api2 import PluginManager
 from api import VtAPI
 
-import sys, uuid, os
+import sys, uuid, os, threading
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow, argv=[], api=None):
@@ -15,7 +15,11 @@ class Ui_MainWindow(object):
         self.themeFile = ""
         self.localeDirs = []
         self.translators = []
-        self.settings()
+        self.translationCache = {}
+        self.translationHits = self.translationMisses = 0
+        with tracer.span("settings"):
+            self.settings()
+        self.setupTracer(argv)
 
         self.MainWindow.setObjectName("MainWindow")
         self.MainWindow.resize(1000, 700)
@@ -46,7 +50,8 @@ class Ui_MainWindow(object):
         self.MainWindow.setStatusBar(self.statusbar)
         self.tagBasePath = self.api.Path.joinPath(self.api.getFolder("packages"), ".ft")
         print(self.tagBasePath)
-        self.tagBase = TagDB(self.tagBasePath)
+        with tracer.span("TagDB open"):
+            self.tagBase = TagService(self.tagBasePath, self.MainWindow)
         self.logger = self.MainWindow.logger
         self.MainWindow.logStdout = self.settData.get("logStdout")
 
@@ -54,16 +59,36 @@ class Ui_MainWindow(object):
 
     def addTab(self): self.tabWidget.cAddTab()
 
+    def setupTracer(self, argv):
+        """Включает запись трассировки запуска флагом --trace-startup[=путь] или настройкой traceStartup"""
+        arg = next((a for a in argv[1:] if a.startswith("--trace-startup")), None)
+        path = arg.partition("=")[2] if arg else self.settData.get("traceStartup")
+        if arg or path:
+            if not isinstance(path, str) or not path:
+                path = self.api.Path.joinPath(self.api.getFolder("cache"), "startup-trace.json")
+            tracer.enable(path)
+
     def getCommand(self, name): return getattr(sys.modules[__name__], name, None)
 
     def defineLocale(self): return QtCore.QLocale.system().name().split("_")[0]
 
     def translate(self, context, source_text):
+        key = (context, source_text, getattr(self, "locale", None))
+        if key in self.translationCache:
+            self.translationHits += 1
+            return self.translationCache[key]
+        self.translationMisses += 1
+        result = source_text
         for tr in self.translators:
-            QtCore.QCoreApplication.installTranslator(tr)
-            if QtCore.QCoreApplication.translate(context, source_text) != source_text:
-                return QtCore.QCoreApplication.translate(context, source_text)
-        return source_text
+            text = tr.translate(context, source_text)
+            if text:
+                result = text
+                break
+        self.translationCache[key] = result
+        return result
+
+    def clearTranslationCache(self):
+        self.translationCache.clear()
 
     def addTranslation(self, d):
         if self.api.isDir(d) and self.api.File(self.api.Path.joinPath(d, f"{self.locale}.vt-locale")).exists():
@@ -71,6 +96,7 @@ class Ui_MainWindow(object):
             if translator.load(self.api.Path.joinPath(d, f"{self.locale}.vt-locale")):
                 self.translators.append(translator)
                 QtCore.QCoreApplication.installTranslator(translator)
+                self.clearTranslationCache()
 
     def settings(self):
         try:
@@ -99,6 +125,8 @@ class Ui_MainWindow(object):
         self.api.setAppName(self.settData.get("appName") or "VT2")
         # self.api.__version__ = self.settData.get("apiVersion") or "1.0"
         self.MainWindow.logStdout = self.settData.get("logStdout") or False
+        self.logger.setCapacity(self.settData.get("logCapacity") or Logger.capacity)
+        if self.settData.get("commandWorkers"): self.api.setTaskWorkers(self.settData.get("commandWorkers"))
         self.saveState = self.settData.get("saveState") or True
         self.MainWindow.remindOnClose = self.settData.get("remindOnClose")
         self.themeFile = ""
@@ -114,55 +142,64 @@ class NewWindowCommand(VtAPI.Plugin.ApplicationCommand):
         MainWindow(self.api)
 
 class LoadBasicCommand(VtAPI.Plugin.WindowCommand):
+    background = True
     def __init__(self, api, window):
         super().__init__(api, window)
         self.api: VtAPI
     def run(self, url):
-        thread = DownloadThread(self.api, self.window)
-        thread.start()
-        thread.wait()
-
-class DownloadThread(VtAPI.Widgets.Thread):
-    def __init__(self, api, window):
-        super().__init__()
-        self.api: VtAPI = api
-        self.window: VtAPI.Window = window
-        self.requests = self.api.importModule("urllib.request")
-        self.zipfile = self.api.importModule("zipfile")
-        self.shutil = self.api.importModule("shutil")
-    def run(self):
-        url = "https://github.com/VT2-1/Basic"
-        self.api.activeWindow.setLogMsg(self.api.activeWindow.translate("Plugin 'Basic' not found. Trying to install last version from '{}'".format(url)), self.api.Color.WARNING)
-        tempdirName = "vt-basic-install"
+        downloadBasic(self)
+
+# Одна установка Basic на все окна: каждое окно без Basic запускает LoadBasicCommand
+basicInstallLock = threading.Lock()
+
+def downloadBasic(command):
+    """Скачивает плагин Basic в папку плагинов. Выполняется в фоновой задаче команды, окно трогаем только через runOnGui"""
+    api: VtAPI = command.api
+    window: VtAPI.Window = command.window
+    requests = api.importModule("urllib.request")
+    zipfile = api.importModule("zipfile")
+    shutil = api.importModule("shutil")
+    tempfile = api.importModule("tempfile")
+    def log(text, color):
+        command.runOnGui(lambda: window.setLogMsg(window.translate(text).format(url), color))
+    url = "https://github.com/VT2-1/Basic"
+    finalPackageDir = api.Path.joinPath(api.getFolder("packages"), "Plugins", url.split("/")[-1])
+    if not basicInstallLock.acquire(blocking=False):
+        return
+    try:
+        if api.Path(finalPackageDir).exists():
+            return
+        log("Plugin 'Basic' not found. Trying to install last version from '{}'", api.Color.WARNING)
+        path = tempfile.mkdtemp(prefix="vt-basic-install-")
         try:
-            path = self.api.Path.joinPath(self.api.replacePaths("%TEMP%") or self.api.Path(__file__).dirName(), tempdirName)
-            self.api.Path(path).create()
-
-            filePath = self.api.Path.joinPath(path, "package.zip")
-            self.requests.urlretrieve(url + "/zipball/master", filePath)
-            with self.zipfile.ZipFile(filePath, 'r') as f:
+            filePath = api.Path.joinPath(path, "package.zip")
+            requests.urlretrieve(url + "/zipball/master", filePath)
+            with zipfile.ZipFile(filePath, 'r') as f:
                 f.extractall(path)
-            self.api.Path(filePath).remove()
+            api.Path(filePath).remove()
 
             extracted_dir = next(
-                self.api.Path.joinPath(path, d) for d in self.api.Path(path).dir()
-                if self.api.Path(self.api.Path.joinPath(path, d)).isDir()
+                api.Path.joinPath(path, d) for d in api.Path(path).dir()
+                if api.Path(api.Path.joinPath(path, d)).isDir()
             )
-            finalPackageDir = self.api.Path.joinPath(self.api.getFolder("packages"), "Plugins", url.split("/")[-1])
-            if not self.api.Path(self.api.getFolder("packages")).exists(): self.api.Path(self.api.getFolder("packages")).create()
+            if not api.Path(api.getFolder("packages")).exists(): api.Path(api.getFolder("packages")).create()
 
-            self.shutil.move(extracted_dir, finalPackageDir)
+            shutil.move(extracted_dir, finalPackageDir)
         except Exception as e:
-            self.api.activeWindow.setLogMsg(self.window.translate("Error when loading plugin from '{}'".format(url)), self.api.Color.ERROR)
+            log("Error when loading plugin from '{}'", api.Color.ERROR)
+        else:
+            log("'Basic' plugin succesfully installed. Reboot the app", api.Color.INFO)
         finally:
-            self.shutil.rmtree(path)
-            self.window.setLogMsg(self.window.translate("'Basic' plugin succesfully installed. Reboot the app"), self.api.Color.INFO)
+            shutil.rmtree(path, ignore_errors=True)
+    finally:
+        basicInstallLock.release()
 
 class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     def __init__(self, api=None, restoreState=True):
         super().__init__()
         self.dirsLoaded = False
         self.wId = f"window-{str(uuid.uuid4())[:4]}"
+        self._chords = []
 
         self.api = api
 
@@ -178,6 +215,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # Signals register area
 
         self.tabWidget.currentChanged.connect(self.api.activeWindow.signals.tabChngd)
+        self.api.activeWindow.signals.fileTagAdded.connect(self.tagBase.invalidate)
+        self.api.activeWindow.signals.fileTagRemoved.connect(self.tagBase.invalidate)
         self.tabWidget.tabCloseRequested.connect(lambda i: self.api.activeWindow.runCommand({"command": "CloseTabCommand", "kwargs": {"view": self.api.View(self.api, self.api.activeWindow, self.tabWidget.widget(i))}}))
 
         #####################################
@@ -185,8 +224,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # self.dirsLoaded = False # Отладка (проверка независимости приложения от PluginManager и на правильную загрузку настроек)
 
         if self.dirsLoaded:
-            self.pl = PluginManager(self.api.getFolder("plugins"), self)
-            if self.api.Path(self.api.Path.joinPath(self.api.getFolder("ui"), "locale")).isDir(): self.addTranslation(self.api.Path.joinPath(self.api.getFolder("ui"), "locale"))
+            with tracer.span("PluginManager init"):
+                self.pl = PluginManager(self.api.getFolder("plugins"), self)
+            with tracer.span("addTranslation"):
+                if self.api.Path(self.api.Path.joinPath(self.api.getFolder("ui"), "locale")).isDir(): self.addTranslation(self.api.Path.joinPath(self.api.getFolder("ui"), "locale"))
             if self.menuFile and self.api.Path(self.menuFile).isFile(): self.pl.loadMenu(self.menuFile)
             
             # Commands registering area
@@ -195,18 +236,24 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
             ####################################
 
-            self.pl.loadPlugins()
+            with tracer.span("loadPlugins"):
+                self.pl.loadPlugins()
 
-        if restoreState: self.api.activeWindow.signals.windowStateRestoring.emit()
-        self.processArgv()
-        self.show()
+        with tracer.span("state restore"):
+            if restoreState: self.api.activeWindow.signals.windowStateRestoring.emit()
+        with tracer.span("processArgv"):
+            self.processArgv()
+        with tracer.span("show"):
+            self.show()
 
         self.statusbar.startAnimation()
         # self.statusbar.showStatusMessage("Hello")
-        self.w.signals.windowStarted.emit()
+        with tracer.span("windowStarted"):
+            self.w.signals.windowStarted.emit()
+        tracer.finish()
 
     def processArgv(self):
-        self.api.activeWindow.openFiles([arg for arg in sys.argv[1:] if not arg.startswith("--log")])
+        self.api.activeWindow.openFiles([arg for arg in sys.argv[1:] if not arg.startswith(("--log", "--trace-startup"))])
 
     def argvParse(self):
         return sys.argv
@@ -222,28 +269,25 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def keyPressEvent(self, event):
         key_code = event.key()
-        modifiers = event.modifiers()
-
-        key_text = event.text()
-        if key_text == '': return
-        modifier_string = ""
-        if modifiers & Qt.KeyboardModifier.ControlModifier: modifier_string += "Ctrl+"
-        if modifiers & Qt.KeyboardModifier.ShiftModifier: modifier_string += "Shift+"
-        if modifiers & Qt.KeyboardModifier.AltModifier: modifier_string += "Alt+"
-        if key_code in range(Qt.Key.Key_A, Qt.Key.Key_Z + 1): key_text = chr(ord('A') + key_code - Qt.Key.Key_A)
-        elif key_code in range(Qt.Key.Key_0, Qt.Key.Key_9 + 1): key_text = chr(ord('0') + key_code - Qt.Key.Key_0)
-        elif key_code == Qt.Key.Key_Space: key_text = "Space"
-        elif key_code == Qt.Key.Key_Return: key_text = "Return"
-        elif key_code == Qt.Key.Key_Escape: key_text = "Esc"
-        elif key_code == Qt.Key.Key_Backspace: key_text = "Backspace"
-        elif key_code == Qt.Key.Key_Tab: key_text = "Tab"
+        if key_code in (Qt.Key.Key_Control, Qt.Key.Key_Shift, Qt.Key.Key_Alt, Qt.Key.Key_Meta, Qt.Key.Key_unknown): return
 
         if hasattr(self, "pl"):
             if type(getattr(self, "pl")) == PluginManager:
-                action = self.pl.findActionShortcut(modifier_string + key_text)
-                if action:
-                    action.trigger()
-                    return action
+                chord = PluginManager.normalizeShortcut(QtGui.QKeySequence(event.keyCombination()))
+                while True:
+                    sequence = ", ".join(self._chords + [chord])
+                    action = self.pl.findActionShortcut(sequence)
+                    if action:
+                        self._chords = []
+                        action.trigger()
+                        return action
+                    if self.pl.isShortcutPrefix(sequence):
+                        self._chords.append(chord)
+                        return
+                    if not self._chords:
+                        return
+                    # Аккорд не продолжает набранное сочетание - пробуем его как начало нового
+                    self._chords = []
 
     def dragEnterEvent(self, event): [event.acceptProposedAction() if event.mimeData().hasUrls() else ""]
 
@@ -256,4 +300,6 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     def closeEvent(self, e: QtCore.QEvent):
         if self.saveState: self.api.activeWindow.signals.windowStateSaving.emit()
         self.api.activeWindow.signals.windowClosed.emit()
+        self.w.cancelAsyncTasks()
+        self.tagBase.close()
         e.accept()
\ No newline at end of file